@@ -0,0 +1,60 @@
+"""
+Cache hit path vs fresh evaluation.
+
+Compares, per individual:
+  - fresh evaluation in a Pool worker (mapping + RMSE over the training set)
+  - a cache hit through multiprocessing.Manager dict proxies (the old layout)
+  - a cache hit in evaluate_population's parent-side dict caches
+
+Run from the repo root:  python -m benchmarks.cache_benchmark
+"""
+import argparse, random, time
+from multiprocessing import Manager, Pool, cpu_count
+from src.data_preprocessing import load_and_preprocess
+from src.evaluation import evaluate_population, eval_individual
+from src.models import EvolutionConfig
+from src.population import initialise_population
+from src.shared_data import SharedDataset, init_worker
+
+def run(population_size=500, csv_path='data/houses.csv', config_path='config.json'):
+    cfg = EvolutionConfig(config_path)
+    cfg.population_size = population_size
+    X, _, y, _ = load_and_preprocess(csv_path)
+    random.seed(0)
+    population = initialise_population(cfg)
+
+    with SharedDataset(X, y) as shared, \
+         Pool(processes=cpu_count(), initializer=init_worker, initargs=(shared.spec, cfg)) as pool:
+        fitness_cache, expression_cache = {}, {}
+        start = time.perf_counter()
+        population = evaluate_population(population, X, y, cfg, pool, fitness_cache, expression_cache)
+        fresh = time.perf_counter() - start
+
+        start = time.perf_counter()
+        evaluate_population(population, X, y, cfg, pool, fitness_cache, expression_cache)
+        local_hit = time.perf_counter() - start
+
+    with Manager() as manager:
+        fit_proxy, expr_proxy = manager.dict(), manager.dict()
+        for ind in population: # warm the proxies so every lookup below is a hit
+            eval_individual(ind, X, y, cfg, fit_proxy, expr_proxy)
+        start = time.perf_counter()
+        for ind in population:
+            eval_individual(ind, X, y, cfg, fit_proxy, expr_proxy)
+        proxy_hit = time.perf_counter() - start
+
+    n = len(population)
+    results = {
+        'fresh_eval_us': fresh / n * 1e6,
+        'manager_proxy_hit_us': proxy_hit / n * 1e6,
+        'local_cache_hit_us': local_hit / n * 1e6,
+    }
+    for name, us in results.items():
+        print(f"{name:>22}: {us:10.1f} us/individual")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--population-size", type=int, default=500)
+    args = parser.parse_args()
+    run(args.population_size)
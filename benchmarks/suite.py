@@ -0,0 +1,221 @@
+"""
+Micro and scaling benchmarks for the GE hot paths.
+
+Covers eval_tree per row vs predict per dataset, map_genotype throughput, crossover and
+mutation rates, evaluate_population across worker counts, and end-to-end generations per
+second. Results are written as JSON and can be compared against a stored baseline; any
+metric worse than the baseline by more than the threshold counts as a regression.
+
+Run from the repo root:
+  python -m benchmarks.suite --profile quick --out bench.json --baseline benchmarks/baseline.json
+  python -m benchmarks.suite --profile full --rows 1000000 --update-baseline
+"""
+import argparse, json, logging, os, platform, random, re, sys, time
+from multiprocessing import Pool
+from benchmarks.synthetic import synthetic_xy
+from src.evaluation import eval_tree, predict, evaluate_population
+from src.genetic_operators import crossover_individuals, mutate_genotype
+from src.models import EvolutionConfig
+from src.population import GRAMMAR, initialise_individual, initialise_population, map_genotype, genotype_key
+from src.shared_data import SharedDataset, init_worker
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+PROFILES = {
+    # rows: dataset size, eval_rows: rows for the per-row eval_tree loop, n: genotypes/pairs per
+    # micro benchmark, population/workers/generations for the scaling benchmarks
+    'tiny':  dict(rows=2_000, eval_rows=200, n=200, population=50, workers=[1, 2], gen_populations=[50], generations=2),
+    'quick': dict(rows=20_000, eval_rows=2_000, n=2_000, population=200, workers=[1, 2, 4], gen_populations=[200], generations=3),
+    'full':  dict(rows=1_000_000, eval_rows=5_000, n=20_000, population=1000, workers=[1, 2, 4, 8],
+                  gen_populations=[500, 1000, 2000], generations=5),
+}
+
+def _timed(fn, repeat=5):
+    """Best-of-repeat wall time of fn() in seconds (the least noisy estimate)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _metric(value, unit, better):
+    return {'value': value, 'unit': unit, 'better': better}
+
+def _bench_cfg(population_size, generations=1):
+    cfg = EvolutionConfig('config.json')
+    cfg.population_size = population_size
+    cfg.generations = generations
+    cfg.fitness_store_path = None # measure the evaluator, not a warm disk cache
+    cfg.checkpoint_every = 0
+    cfg.telemetry_path = None
+    return cfg
+
+def _genotypes(n, max_depth, seed=0):
+    random.seed(seed)
+    return [initialise_individual(GRAMMAR, 'start', max_depth) for _ in range(n)]
+
+def bench_eval_tree(X, cfg, eval_rows, n_trees=20):
+    """eval_tree row by row vs predict over the whole dataset, in microseconds per row."""
+    trees = [map_genotype(GRAMMAR, g, 'start', cfg.max_depth) for g in _genotypes(n_trees, cfg.max_depth, seed=1)]
+    rows = [dict(zip(cfg.feature_names, r)) for r in X[:eval_rows].tolist()]
+    per_row = _timed(lambda: [eval_tree(t, r) for t in trees for r in rows], repeat=1)
+    per_dataset = _timed(lambda: [predict(t, X, cfg.feature_names) for t in trees])
+    return {
+        'eval_tree_per_row_us': _metric(per_row / (n_trees * len(rows)) * 1e6, 'us/row', 'lower'),
+        'predict_per_dataset_us': _metric(per_dataset / (n_trees * len(X)) * 1e6, 'us/row', 'lower'),
+    }
+
+def bench_map_genotype(cfg, n):
+    """Genotype -> tree and genotype -> bytecode mappings per second (no expression cache)."""
+    genotypes = [genotype_key(g) for g in _genotypes(n, cfg.max_depth, seed=2)]
+    tree = _timed(lambda: [map_genotype(GRAMMAR, g, 'start', cfg.max_depth) for g in genotypes])
+    flat = _timed(lambda: [map_genotype(GRAMMAR, g, 'start', cfg.max_depth, flat=True,
+                                        feature_names=cfg.feature_names) for g in genotypes])
+    return {
+        'map_genotype_tree_per_s': _metric(n / tree, 'genotypes/s', 'higher'),
+        'map_genotype_flat_per_s': _metric(n / flat, 'genotypes/s', 'higher'),
+    }
+
+def bench_operators(cfg, n):
+    """crossover_individuals (pairs/s) and mutate_genotype (genotypes/s) on packed genotypes."""
+    genotypes = [genotype_key(g) for g in _genotypes(n, cfg.max_depth, seed=3)]
+    individuals = [{'genotype': g, 'phenotype': None, 'fitness': None} for g in genotypes]
+    rng = random.Random(0)
+    pairs = [(rng.choice(individuals), rng.choice(individuals)) for _ in range(n)]
+    cross = _timed(lambda: [crossover_individuals(a, b, rng=rng) for a, b in pairs])
+    mutate = _timed(lambda: [mutate_genotype(g, max_depth=cfg.max_depth, rng=rng) for g in genotypes])
+    return {
+        'crossover_per_s': _metric(n / cross, 'pairs/s', 'higher'),
+        'mutate_per_s': _metric(n / mutate, 'genotypes/s', 'higher'),
+    }
+
+def scaling_workers(workers, cpus):
+    """
+    The worker counts worth timing on a machine with this many CPUs: more processes than
+    cores only time-slice, so their timings say nothing about scaling. One worker always runs.
+    """
+    return [w for w in workers if w <= (cpus or 1)] or [1]
+
+def bench_evaluate_population(X, y, population_size, workers):
+    """
+    Fresh (uncached) evaluate_population calls per worker count, in seconds. Worker subtree
+    caches are disabled so repeats do not get faster by reusing the previous repeat's work.
+    """
+    results = {}
+    for n_workers in workers:
+        cfg = _bench_cfg(population_size)
+        cfg.subtree_cache_mb = 0
+        random.seed(4)
+        population = initialise_population(cfg)
+        with SharedDataset(X, y) as shared, \
+             Pool(processes=n_workers, initializer=init_worker, initargs=(shared.spec, cfg)) as pool:
+            fresh = lambda: {} if cfg.dedup_probe_rows else None
+            seconds = _timed(lambda: evaluate_population(population, X, y, cfg, pool, {}, {},
+                                                         fingerprint_cache=fresh()), repeat=3)
+        results[f'evaluate_population_{n_workers}w_s'] = _metric(seconds, 's', 'lower')
+    return results
+
+def bench_generations(X, y, populations, generations):
+    """End-to-end run_ge throughput in generations per second for each population size."""
+    from src.ge_main import run_ge
+    results = {}
+    for population_size in populations:
+        cfg = _bench_cfg(population_size, generations)
+        random.seed(5)
+        seconds = _timed(lambda: run_ge(X, y, cfg), repeat=1)
+        results[f'generations_pop{population_size}_per_s'] = _metric(generations / seconds, 'gen/s', 'higher')
+    return results
+
+def run(profile='quick', rows=None):
+    """Run every benchmark for a profile and return the JSON-ready result document."""
+    p = dict(PROFILES[profile])
+    if rows:
+        p['rows'] = rows
+    p['workers'] = scaling_workers(p['workers'], os.cpu_count())
+    cfg = _bench_cfg(p['population'])
+    X, y = synthetic_xy(p['rows'])
+    level = logging.getLogger().level
+    logging.getLogger().setLevel(logging.WARNING) # keep per-generation logs out of the timings
+    try:
+        metrics = {}
+        metrics.update(bench_eval_tree(X, cfg, p['eval_rows']))
+        metrics.update(bench_map_genotype(cfg, p['n']))
+        metrics.update(bench_operators(cfg, p['n']))
+        metrics.update(bench_evaluate_population(X, y, p['population'], p['workers']))
+        metrics.update(bench_generations(X, y, p['gen_populations'], p['generations']))
+    finally:
+        logging.getLogger().setLevel(level)
+    return {
+        'profile': profile,
+        'params': p,
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'metrics': metrics,
+    }
+
+def compare(results, baseline, threshold=0.3):
+    """
+    Regressions of results against baseline: metrics (present in both) that are worse by
+    more than threshold, as a relative change. Returns [(name, baseline, current, change)].
+    Worker-scaling timings are only compared if both machines have the CPUs to run them.
+    """
+    cpus = min((doc['machine']['cpus'] for doc in (results, baseline) if doc.get('machine', {}).get('cpus')),
+               default=None)
+    regressions = []
+    for name, base in baseline['metrics'].items():
+        current = results['metrics'].get(name)
+        if current is None or not base['value']:
+            continue
+        scaling = re.fullmatch(r'evaluate_population_(\d+)w_s', name)
+        if scaling and cpus and int(scaling.group(1)) > cpus:
+            continue
+        change = (current['value'] - base['value']) / base['value']
+        worse = -change if base['better'] == 'higher' else change
+        if worse > threshold:
+            regressions.append((name, base['value'], current['value'], change))
+    return regressions
+
+def print_results(results, baseline=None):
+    base = baseline['metrics'] if baseline else {}
+    for name, m in results['metrics'].items():
+        line = f"{name:>36}: {m['value']:14.3f} {m['unit']}"
+        if name in base and base[name]['value']:
+            line += f"  ({100.0 * (m['value'] - base[name]['value']) / base[name]['value']:+.1f}% vs baseline)"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--rows", type=int, help="override the profile's dataset size")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed relative slowdown per metric")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.profile, args.rows)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('profile') != args.profile:
+            print(f"baseline is for profile {baseline.get('profile')!r}, not comparing")
+            baseline = None
+    print_results(results, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.3f} -> {new:.3f} ({100.0 * change:+.1f}%)")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Synthetic houses.csv-shaped data at any size.
+
+Rows are bootstrapped from data/houses.csv and jittered, so column types, ranges and
+category codes look like the real data, and the price is a noisy function of the
+features. Produces either the preprocessed (X, y) arrays directly or a CSV with the
+original columns (for exercising the loading path).
+
+Run from the repo root:  python -m benchmarks.synthetic --rows 1000000 --out data/houses_1m.csv
+"""
+import argparse, csv, os
+import numpy as np
+
+CSV_PATH = 'data/houses.csv'
+FEATURES = [
+    'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors',
+    'view', 'condition', 'sqft_above', 'sqft_basement',
+    'yr_built', 'yr_renovated', 'city_num', 'statezip_num', 'country_num'
+]
+JITTER = {'sqft_living': 0.05, 'sqft_lot': 0.10, 'sqft_above': 0.05, 'sqft_basement': 0.05} # relative noise
+
+_seed_rows = {}
+
+def seed_rows(csv_path=CSV_PATH):
+    """The raw CSV rows (header excluded) that synthetic rows are drawn from."""
+    if csv_path not in _seed_rows:
+        with open(csv_path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            _seed_rows[csv_path] = (header, [row for row in reader])
+    return _seed_rows[csv_path]
+
+def synthetic_xy(n_rows, seed=0, csv_path=CSV_PATH):
+    """(X, y) with the same 14 feature columns load_and_preprocess produces, n_rows long."""
+    header, rows = seed_rows(csv_path)
+    col = {name: i for i, name in enumerate(header)}
+    numeric = [f for f in FEATURES if f in col]
+    base = np.array([[float(r[col[f]]) for f in numeric] for r in rows])
+    codes = {name: np.unique([r[col[name]] for r in rows], return_inverse=True)[1]
+             for name in ('city', 'statezip', 'country')}
+    price = np.array([float(r[col['price']]) for r in rows])
+    keep = (price > 0) & (price <= 1_500_000)
+
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(np.flatnonzero(keep), size=n_rows)
+    X = np.empty((n_rows, len(FEATURES)))
+    for j, name in enumerate(FEATURES):
+        if name in numeric:
+            X[:, j] = base[idx, numeric.index(name)]
+        else:
+            X[:, j] = codes[name[:-len('_num')]][idx]
+        if name in JITTER:
+            X[:, j] = np.round(X[:, j] * rng.normal(1.0, JITTER[name], n_rows))
+    # price: the seed row's price, scaled with the jittered living area
+    sqft = FEATURES.index('sqft_living')
+    y = price[idx] * (X[:, sqft] / np.maximum(base[idx, numeric.index('sqft_living')], 1.0))
+    y *= rng.normal(1.0, 0.03, n_rows)
+    return X, y
+
+def write_csv(path, n_rows, seed=0, csv_path=CSV_PATH, chunk_rows=100_000):
+    """Write n_rows bootstrapped (unjittered) rows of the original CSV to path."""
+    header, rows = seed_rows(csv_path)
+    rng = np.random.default_rng(seed)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for start in range(0, n_rows, chunk_rows):
+            for i in rng.integers(0, len(rows), size=min(chunk_rows, n_rows - start)):
+                writer.writerow(rows[i])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--out", default="data/houses_synthetic.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.out, args.rows, args.seed)
+    print(f"wrote {args.rows} rows to {args.out}")
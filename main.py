@@ -1,37 +1,43 @@
-import numpy as np, time, logging, multiprocessing
+import numpy as np, time, logging, multiprocessing, argparse
 from src.data_preprocessing import load_and_preprocess
 from src.ge_main import run_ge
-from src.visualisation import plot_results
 from src.models import EvolutionConfig
-from src.evaluation import eval_tree, evaluate_top_individuals_on_test
+from src.evaluation import predict_individual, evaluate_top_individuals_on_test
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Grammatical evolution for house price regression")
+    parser.add_argument("--resume", nargs="?", const="", default=None, metavar="CHECKPOINT",
+                        help="resume from a checkpoint (default: checkpoint.path in config.json)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    cfg = EvolutionConfig("config.json")
     logger.info("Loading and preprocessing data...")
-    X_train, X_test, y_train, y_test = load_and_preprocess('data/houses.csv')
+    X_train, X_test, y_train, y_test = load_and_preprocess(
+        'data/houses.csv', cache_dir=cfg.dataset_cache_dir, chunk_rows=cfg.dataset_chunk_rows, dtype=cfg.dataset_dtype)
 
     start = time.perf_counter()
-    cfg = EvolutionConfig("config.json")
+
+    resume = None
+    if args.resume is not None:
+        resume = args.resume or cfg.checkpoint_path
 
     # we want this to return the best 10 genomes and their trees so we can validate on test set
-    best_ten = run_ge(X_train, y_train, cfg)
+    best_ten = run_ge(X_train, y_train, cfg, resume=resume)
 
     # Evaluate all top 10 individuals on test dataset
     test_results = evaluate_top_individuals_on_test(best_ten, X_test, y_test, cfg)
 
     # Use best expression for prediction (for visualization)
-    y_pred = [
-        eval_tree(
-            best_ten[0]['phenotype'],
-            {k: row[i] for i, k in enumerate(cfg.feature_names)}
-        )
-        for row in X_test
-    ]
+    y_pred = predict_individual(best_ten[0], X_test, cfg.feature_names)
     logger.info("\nPredictions (first 5): %s", y_pred[:5])
 
+    from src.visualisation import plot_results # matplotlib is only needed once there is something to plot
     plot_results(y_test, y_pred)
 
 
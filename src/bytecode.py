@@ -0,0 +1,325 @@
+import logging
+import numpy as np
+from src.models import TreeNode
+from src.ops import VEC_PRE_OPS, safe_div_vec
+
+logger = logging.getLogger(__name__)
+
+# Opcodes of the flat postfix form. Operands live in a parallel float array:
+# the literal value for CONST, the feature (column) index for VAR, the index into
+# run_program's slots for SLOT (a precomputed subtree, see residual_program), unused otherwise.
+CONST, VAR, ADD, SUB, MUL, DIV, SIN, COS, EXP, LOG, INV, SLOT = range(12)
+NOP = 255 # padding used by the batched VM
+
+BINARY_OPS = {'+': ADD, '-': SUB, '*': MUL, '/': DIV}
+UNARY_OPS = {'sin': SIN, 'cos': COS, 'exp': EXP, 'log': LOG, 'inv': INV}
+OP_SYMBOLS = {v: k for k, v in {**BINARY_OPS, **UNARY_OPS}.items()}
+
+class Program:
+    """
+    A phenotype flattened into postfix order: `ops` (uint8 opcodes) and `args`
+    (float64 operands). Pickles as two raw byte strings, so it is cheap to ship
+    to Pool workers and to keep in caches.
+    """
+    __slots__ = ('ops', 'args', 'depth')
+
+    def __init__(self, ops, args, depth=None):
+        self.ops = np.asarray(ops, dtype=np.uint8)
+        self.args = np.asarray(args, dtype=np.float64)
+        self.depth = stack_depth(self.ops) if depth is None else depth
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __eq__(self, other):
+        return (isinstance(other, Program) and np.array_equal(self.ops, other.ops)
+                and np.array_equal(self.args, other.args))
+
+    def __hash__(self):
+        return hash((self.ops.tobytes(), self.args.tobytes()))
+
+    def __reduce__(self):
+        return (_program_from_bytes, (self.ops.tobytes(), self.args.tobytes(), self.depth))
+
+    def __repr__(self):
+        return f"Program({len(self)} ops)"
+
+    def to_tree(self, feature_names):
+        """Rebuild a TreeNode (e.g. for to_infix logging)."""
+        stack = []
+        for op, arg in zip(self.ops.tolist(), self.args.tolist()):
+            if op == CONST:
+                stack.append(TreeNode(repr(arg)))
+            elif op == VAR:
+                stack.append(TreeNode(feature_names[int(arg)]))
+            elif op in (ADD, SUB, MUL, DIV):
+                b = stack.pop()
+                a = stack.pop()
+                stack.append(TreeNode(OP_SYMBOLS[op], [a, b]))
+            else:
+                stack.append(TreeNode(OP_SYMBOLS[op], [stack.pop()]))
+        return stack[0]
+
+def _program_from_bytes(ops, args, depth):
+    return Program(np.frombuffer(ops, dtype=np.uint8), np.frombuffer(args, dtype=np.float64), depth)
+
+def stack_depth(ops):
+    """Maximum stack height reached while running ops."""
+    height = peak = 0
+    for op in ops.tolist():
+        if op in (CONST, VAR, SLOT):
+            height += 1
+        elif op in (ADD, SUB, MUL, DIV):
+            height -= 1
+        peak = max(peak, height)
+    return peak
+
+def tree_to_program(node, feature_names, positions=None):
+    """
+    Flatten a TreeNode into a Program, resolving variables to column indices.
+    A positions dict, if given, receives {id(node): postfix position of the op that
+    produces that node's value} for every node (see program_outputs).
+    """
+    ops, args = [], []
+    _emit(node, {name: i for i, name in enumerate(feature_names)}, ops, args, positions=positions)
+    return Program(ops, args)
+
+def residual_program(node, feature_names, shared):
+    """
+    Flatten a TreeNode like tree_to_program, except that every operator subtree whose root
+    is in `shared` (a set of node ids, e.g. a parent's nodes) becomes a SLOT op. Returns
+    (Program, slot nodes): run it with run_program(..., slots=[output of each slot node]).
+    """
+    ops, args, slot_nodes, slot_index = [], [], [], {}
+    def slot(n):
+        if id(n) not in shared or (n.symbol not in UNARY_OPS and n.symbol not in BINARY_OPS):
+            return None
+        if id(n) not in slot_index:
+            slot_index[id(n)] = len(slot_nodes)
+            slot_nodes.append(n)
+        return slot_index[id(n)]
+    _emit(node, {name: i for i, name in enumerate(feature_names)}, ops, args, slot)
+    return Program(ops, args), slot_nodes
+
+def _emit(node, index, ops, args, slot=None, positions=None):
+    """
+    Append node's postfix ops/operands; slot(n) may turn a subtree into a SLOT op, and
+    positions records where each node's value is produced. Walks the tree with an explicit
+    stack, so deep trees never hit the recursion limit.
+    """
+    stack = [node] # a node to emit, or (node, opcode or None) to finish once its operands are out
+    while stack:
+        n = stack.pop()
+        if n.__class__ is tuple:
+            n, op = n
+            if op is not None:
+                ops.append(op); args.append(0.0)
+        elif not isinstance(n, TreeNode):
+            ops.append(CONST); args.append(float(n))
+        elif slot is not None and slot(n) is not None:
+            ops.append(SLOT); args.append(float(slot(n)))
+        else:
+            sym = n.symbol
+            if sym in UNARY_OPS:
+                stack.append((n, UNARY_OPS[sym]))
+                stack.append(n.children[0])
+                continue
+            if sym in BINARY_OPS:
+                stack.append((n, BINARY_OPS[sym]))
+                stack.append(n.children[1])
+                stack.append(n.children[0])
+                continue
+            if sym in ('(', ')', 'start', 'seq'):
+                # structural wrappers evaluate to their first child ('seq': its last), or 0.0 when empty
+                if n.children:
+                    stack.append((n, None))
+                    stack.append(n.children[-1] if sym == 'seq' else n.children[0])
+                    continue
+                ops.append(CONST); args.append(0.0)
+            elif sym in index:
+                ops.append(VAR); args.append(float(index[sym]))
+            else:
+                try:
+                    value = float(sym)
+                except ValueError:
+                    logger.error("Failed to parse tree %s", n)
+                    value = 0.0 # fallback
+                ops.append(CONST); args.append(value)
+        if positions is not None:
+            positions[id(n)] = len(ops) - 1
+
+_BINARY_FUNCS = {ADD: np.add, SUB: np.subtract, MUL: np.multiply, DIV: safe_div_vec}
+_UNARY_FUNCS = {op: VEC_PRE_OPS[sym] for sym, op in UNARY_OPS.items()}
+
+def _apply(op, a, b=None):
+    if b is None:
+        return _UNARY_FUNCS[op](a)
+    return _BINARY_FUNCS[op](a, b)
+
+def subtree_starts(ops):
+    """starts[i] is the position where the subtree ending at postfix position i begins."""
+    starts, stack = [], []
+    for i, op in enumerate(ops.tolist()):
+        if op in (CONST, VAR):
+            start = i
+        elif op in (ADD, SUB, MUL, DIV):
+            stack.pop()
+            start = stack.pop()
+        else:
+            start = stack.pop()
+        stack.append(start)
+        starts.append(start)
+    return starts
+
+def run_program(program, X, cache=None, slots=None):
+    """
+    Evaluate one Program over every row of X; returns a float array of len(X).
+    With a SubtreeCache, every operator subtree is looked up by its structural key
+    (root first), so subtrees shared across the population are computed once.
+    slots are the precomputed outputs a residual_program's SLOT ops refer to.
+    """
+    X = np.asarray(X, dtype=float)
+    if cache is not None:
+        with np.errstate(all='ignore'):
+            out = _run_cached(program, X, cache)
+        return np.broadcast_to(np.asarray(out, dtype=float), (len(X),))
+    stack = []
+    with np.errstate(all='ignore'):
+        for op, arg in zip(program.ops.tolist(), program.args.tolist()):
+            if op == CONST:
+                stack.append(arg)
+            elif op == VAR:
+                stack.append(X[:, int(arg)])
+            elif op in (ADD, SUB, MUL, DIV):
+                b = stack.pop()
+                stack.append(_apply(op, stack.pop(), b))
+            elif op == SLOT:
+                stack.append(slots[int(arg)])
+            else:
+                stack.append(_apply(op, stack.pop()))
+    return np.broadcast_to(np.asarray(stack[0], dtype=float), (len(X),))
+
+def program_outputs(program, X):
+    """
+    Run a Program over X keeping the output of every op: outputs[i] is the value of the
+    subtree ending at postfix position i, exactly as run_program computes it.
+    """
+    X = np.asarray(X, dtype=float)
+    stack, outputs = [], []
+    with np.errstate(all='ignore'):
+        for op, arg in zip(program.ops.tolist(), program.args.tolist()):
+            if op == CONST:
+                stack.append(arg)
+            elif op == VAR:
+                stack.append(X[:, int(arg)])
+            elif op in (ADD, SUB, MUL, DIV):
+                b = stack.pop()
+                stack.append(_apply(op, stack.pop(), b))
+            else:
+                stack.append(_apply(op, stack.pop()))
+            outputs.append(stack[-1])
+    return outputs
+
+def _run_cached(program, X, cache):
+    ops, args = program.ops.tolist(), program.args.tolist()
+    ops_b, args_b = program.ops.tobytes(), program.args.tobytes()
+    starts = subtree_starts(program.ops)
+
+    # values of subtrees by the position they end at, computed with an explicit stack
+    # (no recursion limit): i to look subtree i up, ~i to compute it once its operands are in
+    values, keys = {}, {}
+    stack = [len(ops) - 1]
+    while stack:
+        i = stack.pop()
+        if i >= 0:
+            op = ops[i]
+            if op == CONST:
+                values[i] = args[i]
+                continue
+            if op == VAR:
+                values[i] = X[:, int(args[i])]
+                continue
+            s = starts[i]
+            key = ops_b[s:i + 1] + args_b[8 * s:8 * (i + 1)]
+            val = cache.get(key)
+            if val is not None:
+                values[i] = val
+                continue
+            keys[i] = key
+            stack.append(~i)
+            if op in (ADD, SUB, MUL, DIV):
+                stack.append(i - 1)
+                stack.append(starts[i - 1] - 1)
+            else:
+                stack.append(i - 1)
+            continue
+        i = ~i
+        op = ops[i]
+        if op in (ADD, SUB, MUL, DIV):
+            right = values.pop(i - 1)
+            val = _apply(op, values.pop(starts[i - 1] - 1), right)
+        else:
+            val = _apply(op, values.pop(i - 1))
+        if isinstance(val, np.ndarray): # constant subtrees stay scalars and are cheap anyway
+            cache.put(keys.pop(i), val)
+        values[i] = val
+    return values[len(ops) - 1]
+
+# Memory cap for one lock-step batch of stacks in eval_programs
+VM_BATCH_BYTES = 8 * 1024 * 1024
+
+def eval_programs(programs, X):
+    """
+    Batched stack VM: evaluate many Programs over X in one call.
+    Programs run in lock-step, one instruction column at a time; at each step every
+    program sharing an opcode is advanced by a single NumPy operation, so the number
+    of Python-level steps depends on program length, not on how many programs there are.
+    Returns an array of shape (len(programs), len(X)).
+    """
+    X = np.asarray(X, dtype=float)
+    n = len(X)
+    Xt = np.ascontiguousarray(X.T)
+    out = np.empty((len(programs), n))
+    if not programs:
+        return out
+
+    # similar lengths run together so little of each chunk is padding
+    order = sorted(range(len(programs)), key=lambda i: len(programs[i]))
+    max_depth = max(p.depth for p in programs)
+    batch = max(1, VM_BATCH_BYTES // max(1, max_depth * n * 8))
+    for start in range(0, len(order), batch):
+        idx = order[start:start + batch]
+        out[idx] = _eval_chunk([programs[i] for i in idx], Xt, n)
+    return out
+
+def _eval_chunk(programs, Xt, n):
+    P = len(programs)
+    L = max(len(p) for p in programs)
+    ops = np.full((P, L), NOP, dtype=np.uint8)
+    args = np.zeros((P, L))
+    for i, p in enumerate(programs):
+        ops[i, :len(p)] = p.ops
+        args[i, :len(p)] = p.args
+
+    stack = np.empty((P, max(p.depth for p in programs), n))
+    sp = np.zeros(P, dtype=np.intp)
+    with np.errstate(all='ignore'):
+        for t in range(L):
+            col = ops[:, t]
+            for op in np.unique(col).tolist():
+                if op == NOP:
+                    continue
+                idx = np.flatnonzero(col == op)
+                top = sp[idx]
+                if op == CONST:
+                    stack[idx, top] = args[idx, t][:, None]
+                    sp[idx] += 1
+                elif op == VAR:
+                    stack[idx, top] = Xt[args[idx, t].astype(np.intp)]
+                    sp[idx] += 1
+                elif op in (ADD, SUB, MUL, DIV):
+                    stack[idx, top - 2] = _apply(op, stack[idx, top - 2], stack[idx, top - 1])
+                    sp[idx] -= 1
+                else:
+                    stack[idx, top - 1] = _apply(op, stack[idx, top - 1])
+    return stack[:, 0]
@@ -0,0 +1,85 @@
+import logging, os, pickle, random, tempfile, time, zlib
+from src.bytecode import Program, tree_to_program
+from src.fitness_store import dataset_fingerprint, grammar_fingerprint, fitness_kind
+from src.population import GRAMMAR
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GECKPT\x00\x01" # format name + version
+
+def write_checkpoint(path, state):
+    """
+    Atomically write a checkpoint: a magic header followed by the zlib-compressed
+    pickle of state. The file is written to a temp file in the same directory and
+    renamed over path, so a crash mid-write never leaves a truncated checkpoint.
+    """
+    start = time.perf_counter()
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    data = MAGIC + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+    fd, tmp = tempfile.mkstemp(prefix=".checkpoint-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    logger.info("Checkpoint: generation %d written to %s (%d bytes, %.3fs)",
+                state["generation"], path, len(data), time.perf_counter() - start)
+
+def read_checkpoint(path):
+    """Load a checkpoint written by write_checkpoint."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a checkpoint (or was written by another version)")
+    return pickle.loads(zlib.decompress(data[len(MAGIC):]))
+
+def scope(X, y, cfg):
+    """
+    Fingerprints a checkpoint is only valid for: training data, grammar and feature order,
+    max_depth (cached phenotypes depend on how genotypes were extended), and the fitness
+    kind when it is not the plain RMSE.
+    """
+    fps = dataset_fingerprint(X, y), grammar_fingerprint(GRAMMAR, cfg.feature_names), cfg.max_depth
+    kind = fitness_kind(cfg)
+    return fps if kind == "rmse" else fps + (kind,)
+
+def capture_state(generation, population, cutoff, breed_rng, fingerprint_cache, run_scope, cfg,
+                  fitness_cache=None, expression_cache=None):
+    """
+    Everything run_ge needs to continue from the start of `generation` exactly as an
+    uninterrupted run would: the (already reproduced) population, the random streams,
+    the early-abort cutoff and the behaviour fingerprints. The fitness/expression caches
+    only save work, so they are included only when given.
+    """
+    individuals = []
+    for ind in population:
+        phenotype = ind["phenotype"]
+        if phenotype is not None and not isinstance(phenotype, Program):
+            phenotype = tree_to_program(phenotype, cfg.feature_names) # compact form
+        individuals.append({**ind, "phenotype": phenotype})
+    return {
+        "generation": generation,
+        "scope": run_scope,
+        "population": individuals,
+        "cutoff": cutoff,
+        "random_state": random.getstate(),
+        "breed_rng_state": breed_rng.bit_generator.state,
+        "fingerprint_cache": fingerprint_cache,
+        "fitness_cache": fitness_cache,
+        "expression_cache": expression_cache,
+    }
+
+def restore_population(state, cfg):
+    """The checkpointed population, with phenotypes rebuilt as trees."""
+    population = []
+    for ind in state["population"]:
+        phenotype = ind["phenotype"]
+        if isinstance(phenotype, Program):
+            phenotype = phenotype.to_tree(cfg.feature_names)
+        population.append({**ind, "phenotype": phenotype})
+    return population
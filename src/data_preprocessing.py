@@ -1,24 +1,125 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
-
-def load_and_preprocess(csv_path):
-    df = pd.read_csv(csv_path)
-
-    df = df.dropna()
-
-    # remove where price == 0 or price > 1.5 million
-    df = df[(df['price'] > 0) & (df['price'] <= 1_500_000)]
-
-    # encode categorical features
-    df['city_num'] = df['city'].astype('category').cat.codes
-    df['statezip_num'] = df['statezip'].astype('category').cat.codes
-    df['country_num'] = df['country'].astype('category').cat.codes
-
-    features = [
-        'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors',
-        'view', 'condition', 'sqft_above', 'sqft_basement',
-        'yr_built', 'yr_renovated', 'city_num', 'statezip_num', 'country_num'
-    ]
-    X = df[features].values
-    y = df['price'].values
-    return train_test_split(X, y, test_size=0.2, random_state=1) # 80% train, 20% test
+import hashlib, json, logging, math, os, time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURES = [
+    'bedrooms', 'bathrooms', 'sqft_living', 'sqft_lot', 'floors',
+    'view', 'condition', 'sqft_above', 'sqft_basement',
+    'yr_built', 'yr_renovated', 'city_num', 'statezip_num', 'country_num'
+]
+CATEGORICAL = ['city', 'statezip', 'country'] # encoded as <name>_num
+MAX_PRICE = 1_500_000
+TEST_SIZE, RANDOM_STATE = 0.2, 1
+CACHE_VERSION = 1 # bump when the preprocessing below changes
+SPLITS = ('X_train', 'X_test', 'y_train', 'y_test')
+
+def load_and_preprocess(csv_path, cache_dir=None, chunk_rows=100_000, dtype='float64'):
+    """
+    Load houses.csv-style data and return (X_train, X_test, y_train, y_test).
+    Rows with missing values, price == 0 or price > 1.5 million are dropped, city/statezip/
+    country are category-encoded and the data is split 80/20 (same split as
+    sklearn's train_test_split(test_size=0.2, random_state=1)).
+    With a cache_dir, the result is stored as column-major .npy files keyed by the CSV's
+    hash and the preprocessing parameters, and later calls memory-map those instead.
+    """
+    if cache_dir is None:
+        return _preprocess(csv_path, chunk_rows, dtype)
+
+    key = _cache_key(csv_path, cache_dir, dtype)
+    entry = os.path.join(cache_dir, key)
+    if all(os.path.exists(os.path.join(entry, f"{name}.npy")) for name in SPLITS):
+        start = time.perf_counter()
+        arrays = tuple(np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in SPLITS)
+        logger.info("Dataset cache hit: %s (%d train rows, %.4fs)", entry, len(arrays[0]), time.perf_counter() - start)
+        return arrays
+
+    start = time.perf_counter()
+    arrays = _preprocess(csv_path, chunk_rows, dtype)
+    tmp = f"{entry}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    for name, arr in zip(SPLITS, arrays):
+        np.save(os.path.join(tmp, f"{name}.npy"), np.asfortranarray(arr))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"csv": os.path.abspath(csv_path), "dtype": dtype, "features": FEATURES,
+                   "rows": [len(a) for a in arrays[:2]]}, f)
+    try:
+        os.replace(tmp, entry) # another process may have finished first; either copy is valid
+    except OSError:
+        pass
+    logger.info("Dataset cache miss: preprocessed %s in %.2fs, stored in %s", csv_path, time.perf_counter() - start, entry)
+    return tuple(np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in SPLITS)
+
+def _preprocess(csv_path, chunk_rows, dtype):
+    """Chunked read, filter and encode; the category codes are fixed up once all chunks are seen."""
+    import pandas as pd # only needed on a cache miss
+
+    numeric = [f for f in FEATURES if not f.endswith('_num')]
+    seen = {name: {} for name in CATEGORICAL} # value -> first-seen id
+    X_parts, y_parts, code_parts = [], [], []
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        chunk = chunk.dropna()
+        chunk = chunk[(chunk['price'] > 0) & (chunk['price'] <= MAX_PRICE)]
+        X_parts.append(chunk[numeric].to_numpy(dtype=np.float64))
+        y_parts.append(chunk['price'].to_numpy(dtype=np.float64))
+        codes = []
+        for name in CATEGORICAL:
+            ids = seen[name]
+            codes.append(np.array([ids.setdefault(v, len(ids)) for v in chunk[name].astype(str)], dtype=np.int64))
+        code_parts.append(codes)
+
+    n = sum(len(part) for part in y_parts)
+    X = np.empty((n, len(FEATURES)), dtype=np.float64)
+    y = np.concatenate(y_parts) if y_parts else np.empty(0)
+    numeric_cols = [FEATURES.index(f) for f in numeric]
+    row = 0
+    for part, codes in zip(X_parts, code_parts):
+        X[row:row + len(part), numeric_cols] = part
+        for name, ids in zip(CATEGORICAL, codes):
+            X[row:row + len(part), FEATURES.index(f"{name}_num")] = ids
+        row += len(part)
+    for name in CATEGORICAL: # first-seen ids -> codes in sorted category order, as pandas assigns them
+        values = list(seen[name])
+        rank = np.empty(len(values), dtype=np.int64)
+        rank[np.argsort(np.array(values, dtype=object))] = np.arange(len(values))
+        col = FEATURES.index(f"{name}_num")
+        if len(values):
+            X[:, col] = rank[X[:, col].astype(np.int64)]
+
+    # 80/20 split, identical to sklearn's train_test_split(test_size=0.2, random_state=1)
+    perm = np.random.RandomState(RANDOM_STATE).permutation(n)
+    n_test = math.ceil(TEST_SIZE * n)
+    test, train = perm[:n_test], perm[n_test:]
+    X, y = X.astype(dtype, copy=False), y.astype(dtype, copy=False)
+    return X[train], X[test], y[train], y[test]
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _cache_key(csv_path, cache_dir, dtype):
+    """
+    Cache entry name: hash of the CSV contents plus every preprocessing parameter.
+    The CSV hash is remembered per (path, size, mtime) in cache_dir/index.json, so an
+    unchanged file is not re-read on every start.
+    """
+    stat = os.stat(csv_path)
+    ident = f"{os.path.abspath(csv_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    index_path = os.path.join(cache_dir, "index.json")
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if ident not in index:
+        index[ident] = _file_sha1(csv_path)
+        tmp = f"{index_path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path)
+    params = json.dumps([CACHE_VERSION, FEATURES, CATEGORICAL, MAX_PRICE, TEST_SIZE, RANDOM_STATE, dtype])
+    return hashlib.sha1(f"{index[ident]}:{params}".encode()).hexdigest()[:20]
@@ -0,0 +1,282 @@
+import logging, math, os, queue, socket, threading, time, traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from src.fitness_store import dataset_fingerprint, grammar_fingerprint
+from src.population import GRAMMAR
+from src.shared_data import set_worker_data
+
+logger = logging.getLogger(__name__)
+
+AUTHKEY_ENV = "GE_CLUSTER_KEY" # overrides cfg.cluster_authkey
+MAX_ATTEMPTS = 3 # a batch that takes down this many workers fails the map instead of being resubmitted again
+
+def cluster_authkey(cfg):
+    """
+    The shared secret workers authenticate with: $GE_CLUSTER_KEY if set, else
+    cfg.cluster_authkey. There is no default, since knowing the key is enough to run
+    code on the coordinator or its workers (every message is a pickle).
+    """
+    key = os.environ.get(AUTHKEY_ENV) or getattr(cfg, 'cluster_authkey', None)
+    return _require_key(key.encode() if isinstance(key, str) else key)
+
+def _require_key(authkey):
+    if not authkey:
+        raise ValueError(f"Distributed evaluation needs an authkey: set distributed.authkey in config.json "
+                         f"or ${AUTHKEY_ENV}, e.g. to the output of "
+                         f"python -c 'import secrets; print(secrets.token_hex(32))'")
+    return authkey
+
+def parse_address(text):
+    """'host:port' -> (host, port)."""
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+class _Job:
+    """The results of one map() call, filled in batch by batch from the worker threads."""
+
+    def __init__(self, n_batches):
+        self.parts = [None] * n_batches
+        self.left = n_batches
+        self.error = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def finish(self, index, results):
+        with self._lock:
+            self.parts[index] = results
+            self.left -= 1
+            if self.left == 0:
+                self.done.set()
+
+    def fail(self, error):
+        with self._lock:
+            if self.error is None:
+                self.error = error
+            self.done.set()
+
+class _Batch:
+    __slots__ = ('job', 'index', 'fn', 'items', 'attempts')
+
+    def __init__(self, job, index, fn, items):
+        self.job, self.index, self.fn, self.items, self.attempts = job, index, fn, items, 0
+
+class ClusterPool:
+    """
+    Coordinator side of distributed evaluation: stands in for the local Pool in run_ge,
+    with tasks run by worker processes that connect over TCP (see run_worker and worker.py).
+    map() puts its tasks on a shared queue in batches of cfg.cluster_batch_size, and one
+    thread per connected worker sends it one batch at a time. A joining worker receives
+    the config and, unless it already holds the same training data, the data itself.
+    Workers may join and leave at any time: a batch in flight on a worker that disconnects
+    or does not answer within cfg.cluster_task_timeout goes back on the queue.
+    Messages are pickles, so the listener only accepts peers that know the authkey.
+    """
+
+    def __init__(self, X, y, cfg, address=None, authkey=None):
+        self._X, self._y, self._cfg = X, y, cfg
+        self._fingerprint = dataset_fingerprint(X, y)
+        self._grammar = grammar_fingerprint(GRAMMAR, cfg.feature_names)
+        self._batches = queue.Queue()
+        self._workers = {} # name -> serving thread
+        self._lock = threading.Lock()
+        self._closed = False
+        authkey = _require_key(authkey) if authkey is not None else cluster_authkey(cfg)
+        self._listener = Listener(address or (cfg.cluster_host, cfg.cluster_port), authkey=authkey)
+        self.address = self._listener.address
+        threading.Thread(target=self._accept, name="cluster-accept", daemon=True).start()
+        logger.info("Cluster coordinator listening on %s:%d", *self.address)
+
+    @property
+    def workers(self):
+        """Number of connected workers."""
+        with self._lock:
+            return len(self._workers)
+
+    def map(self, fn, args):
+        """Like Pool.map: [fn(a) for a in args], run on the workers; blocks until all are done."""
+        items = list(args)
+        if not items:
+            return []
+        size = max(1, self._cfg.cluster_batch_size)
+        job = _Job(math.ceil(len(items) / size))
+        for index, lo in enumerate(range(0, len(items), size)):
+            self._batches.put(_Batch(job, index, fn, items[lo:lo + size]))
+        while not job.done.wait(10.0):
+            if not self.workers:
+                logger.warning("Cluster: no workers connected, %d batches waiting", self._batches.qsize())
+        if job.error is not None:
+            raise job.error
+        return [result for part in job.parts for result in part]
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError) as exc: # closed listener, or a bad peer
+                if not self._closed:
+                    logger.warning("Cluster: rejected a connection: %r", exc)
+                continue
+            if self._closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), name="cluster-worker", daemon=True).start()
+
+    def _handshake(self, conn):
+        """Install the config (and data, unless the worker has it) on a new worker; returns its name."""
+        _, hello = conn.recv()
+        name = f"{hello['host']}:{hello['pid']}"
+        cached = self._fingerprint in hello['datasets']
+        data = None if cached else (self._X, self._y)
+        conn.send(("setup", self._fingerprint, data, self._cfg, self._grammar))
+        kind, detail = conn.recv()
+        if kind != "ready":
+            raise ValueError(f"worker {name} refused: {detail}")
+        with self._lock:
+            self._workers[name] = threading.current_thread()
+            joined = len(self._workers)
+        logger.info("Cluster: worker %s joined (%d connected, data %s)", name, joined,
+                    "already loaded" if cached else "sent")
+        return name
+
+    def _serve(self, conn):
+        """Per-worker thread: hand out batches until the pool closes or the worker is lost."""
+        name, batch = None, None
+        try:
+            name = self._handshake(conn)
+            while not self._closed:
+                try:
+                    batch = self._batches.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if batch.job.error is not None:
+                    batch = None # another batch of this map already failed
+                    continue
+                try:
+                    conn.send(("batch", batch.fn, batch.items))
+                    kind, payload = self._reply(conn)
+                except (EOFError, OSError, TimeoutError):
+                    raise # the worker is lost: resubmitted below
+                except Exception as exc: # e.g. a task or reply that does not (un)pickle
+                    done, batch = batch, None
+                    logger.error("Cluster: batch on worker %s failed: %r", name, exc)
+                    done.job.fail(exc) # the map raises it instead of waiting for the batch
+                    continue # messages are framed whole, so the connection is still in step
+                done, batch = batch, None
+                if kind == "error":
+                    done.job.fail(payload)
+                else:
+                    done.job.finish(done.index, payload)
+            conn.send(("stop", None))
+        except (EOFError, OSError, TimeoutError) as exc:
+            if batch is not None:
+                self._resubmit(batch, name, exc)
+            elif name is None:
+                logger.warning("Cluster: worker handshake failed: %r", exc)
+            else:
+                logger.info("Cluster: worker %s left", name)
+        except Exception as exc: # a refused or malformed handshake
+            logger.warning("Cluster: worker handshake failed: %r", exc)
+        finally:
+            with self._lock:
+                self._workers.pop(name, None)
+            conn.close()
+
+    def _reply(self, conn):
+        deadline = time.monotonic() + self._cfg.cluster_task_timeout
+        while not conn.poll(0.5):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"no reply within {self._cfg.cluster_task_timeout}s")
+        return conn.recv()
+
+    def _resubmit(self, batch, name, exc):
+        batch.attempts += 1
+        if batch.attempts >= MAX_ATTEMPTS:
+            logger.error("Cluster: worker %s lost (%r); batch failed on %d workers, giving up", name, exc, batch.attempts)
+            batch.job.fail(RuntimeError(f"batch of {len(batch.items)} tasks lost {batch.attempts} workers: {exc!r}"))
+            return
+        logger.warning("Cluster: worker %s lost (%r), resubmitting %d in-flight tasks", name, exc, len(batch.items))
+        self._batches.put(batch)
+
+    def close(self):
+        """Stop accepting workers; connected workers are told to stop once idle."""
+        if not self._closed:
+            self._closed = True
+            self._listener.close()
+
+    def join(self, timeout=5.0):
+        """Wait for the worker threads to say goodbye (after close)."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            threads = list(self._workers.values())
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.join()
+
+# Worker side: training sets this process holds, by dataset fingerprint, so a worker that
+# reconnects (or loaded the data itself) is not sent them again
+_datasets = {}
+
+def run_worker(address, authkey, data=None, retry=0.0):
+    """
+    Worker entry point: connect to a coordinator at address (retrying for up to `retry`
+    seconds while it is not up yet), install its config and training data, then run the
+    batches it sends until it says stop. A locally loaded (X, y) passed as data is
+    offered to the coordinator, which then skips sending it. Returns the number of tasks run.
+    """
+    _require_key(authkey)
+    if data is not None:
+        _datasets[dataset_fingerprint(*data)] = data
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+    tasks = 0
+    with conn:
+        conn.send(("hello", {"host": socket.gethostname(), "pid": os.getpid(), "datasets": list(_datasets)}))
+        _, fingerprint, data, cfg, grammar = conn.recv()
+        if grammar != grammar_fingerprint(GRAMMAR, cfg.feature_names):
+            conn.send(("refused", "grammar or feature order differs from the coordinator's"))
+            raise ValueError(f"Coordinator {address} runs a different grammar")
+        if data is not None:
+            _datasets[fingerprint] = data
+        X, y = _datasets[fingerprint]
+        set_worker_data(X, y, cfg)
+        conn.send(("ready", None))
+        logger.info("Worker %d: joined %s:%d (%d training rows)", os.getpid(), *address, len(X))
+
+        while True:
+            try:
+                kind, fn, *rest = conn.recv()
+            except (EOFError, OSError): # closed, or reset after dropping us (e.g. a timed-out batch)
+                logger.warning("Worker %d: coordinator went away", os.getpid())
+                return tasks
+            if kind == "stop":
+                return tasks
+            items = rest[0]
+            try:
+                results = [fn(a) for a in items]
+                reply = ("done", results)
+                tasks += len(items)
+            except Exception as exc:
+                reply = ("error", RuntimeError(f"Task {fn.__name__} failed on worker {os.getpid()}: "
+                                               f"{exc!r}\n{traceback.format_exc()}"))
+            try:
+                conn.send(reply)
+            except OSError: # e.g. the coordinator timed this batch out and dropped us
+                logger.warning("Worker %d: coordinator closed the connection", os.getpid())
+                return tasks
+            except Exception as exc: # results that do not pickle; nothing was sent yet
+                conn.send(("error", RuntimeError(f"Task {fn.__name__} on worker {os.getpid()} "
+                                                 f"returned an unsendable result: {exc!r}")))
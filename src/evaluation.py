@@ -1,74 +1,598 @@
-import random, numpy as np, time, math, logging, os
+import random, numpy as np, time, math, logging, os, hashlib
+from collections import OrderedDict
 from multiprocessing import Pool, cpu_count
 from src.models import TreeNode
-from src.population import map_genotype, GRAMMAR
+from src.population import map_genotype, map_genotypes, genotype_key, seeded_extension, derive_tree, extend_genotype, Derivation, GRAMMAR
+from src.ops import PRE_OPS, safe_div, VEC_PRE_OPS, safe_div_vec
+from src.bytecode import Program, run_program, eval_programs, residual_program, tree_to_program, program_outputs
+from src.shared_data import worker_data, worker_subtree_cache, task_report
 
 logger = logging.getLogger(__name__)
 
-EPS = 1e-10
-MAX_MAG = 1e6
+def _eval_individual_wrapper(genotype):
+    """Pool task: tasks carry only the genotype, the data comes from the worker initializer."""
+    start = time.perf_counter()
+    X, y, cfg = worker_data()
+    # caches live in the parent, so workers never pay an IPC round trip per lookup
+    individual = {"genotype": genotype, "phenotype": None, "fitness": None}
+    result = eval_individual(individual, X, y, cfg, None, None, subtree_cache=worker_subtree_cache())
+    return result, task_report(start)
 
-def clamp(v, m=MAX_MAG): # max magnitude in either direction
-    return max(min(v, m), -m)
+def _eval_bounded_wrapper(args):
+    """Pool task: like _eval_individual_wrapper, aborting once the RMSE must exceed the cutoff."""
+    start = time.perf_counter()
+    genotype, cutoff = args
+    X, y, cfg = worker_data()
+    individual = {"genotype": genotype, "phenotype": None, "fitness": None}
+    result = eval_individual(individual, X, y, cfg, None, None, subtree_cache=worker_subtree_cache(), cutoff=cutoff)
+    return result, task_report(start)
 
-PRE_OPS = {
-    'sin': lambda x: math.sin(x),
-    'cos': lambda x: math.cos(x),
-    'exp': lambda x: clamp(math.exp(min(x, 70))), # min x, 70 to avoid overflow
-    'log': lambda x: math.log(max(x, EPS)), # log undefined for <=0, use EPS
-    'inv': lambda x: clamp(1.0 / max(abs(x), EPS) * (1 if x >= 0 else -1)) # safe inverse (avoid div by 0, but maintain sign)
-}
+def _map_fingerprint_wrapper(genotypes):
+    """
+    Pool task: map a batch of genotypes and fingerprint their behaviour on the probe rows,
+    running all of their Programs together on the batched VM (see eval_programs).
+    """
+    start = time.perf_counter()
+    X, y, cfg = worker_data()
+    mapped = map_genotypes(GRAMMAR, genotypes, "start", cfg.max_depth, flat=True, feature_names=cfg.feature_names)
+    probe = probe_rows(X, cfg.dedup_probe_rows)
+    fingerprints = behaviour_fingerprints([program for program, _ in mapped], probe, cfg.dedup_digits)
+    return [(g, p, fp) for (p, g), fp in zip(mapped, fingerprints)], task_report(start)
 
-def safe_div(a, b):
-    return clamp(a / max(abs(b), EPS) * (1 if b >= 0 else -1))
+def _program_fitness_wrapper(program):
+    """Pool task: full-dataset RMSE of an already mapped Program."""
+    start = time.perf_counter()
+    X, y, cfg = worker_data()
+    return score(run_program(program, X, worker_subtree_cache()), y, cfg.linear_scaling), task_report(start)
+
+def _race_map_wrapper(args):
+    """Pool task: map a genotype and score it on the first racing subset."""
+    start = time.perf_counter()
+    genotype, n_rows, seed = args
+    X, y, cfg = worker_data()
+    with seeded_extension(genotype):
+        program, genotype = map_genotype(GRAMMAR, genotype, "start", cfg.max_depth, flat=True,
+                                         feature_names=cfg.feature_names, return_genotype=True)
+    idx = race_rows(len(X), n_rows, seed)
+    return (genotype, program, score(run_program(program, X[idx]), y[idx], cfg.linear_scaling)), task_report(start)
 
-def _eval_individual_wrapper(args):
-    """Wrapper function for multiprocessing that unpacks arguments."""
-    individual, X, y, cfg, fit_cache, expr_cache = args
-    return eval_individual(individual, X, y, cfg, fit_cache, expr_cache)
+def _subset_fitness_wrapper(args):
+    """Pool task: RMSE of a mapped Program on a racing subset (no subtree cache, it is keyed to full X)."""
+    start = time.perf_counter()
+    program, n_rows, seed = args
+    X, y, cfg = worker_data()
+    idx = race_rows(len(X), n_rows, seed)
+    return score(run_program(program, X[idx]), y[idx], cfg.linear_scaling), task_report(start)
 
-def evaluate_population(population, X, y, cfg, pool, fitness_cache, expression_cache):
+def _bounded_fitness_wrapper(args):
+    """Pool task: bounded_rmse of an already mapped Program, as (fitness, exact)."""
     start = time.perf_counter()
-    args_list = [
-        (ind, X, y, cfg, fitness_cache, expression_cache) 
-        for ind in population
-    ]
-    results = pool.map(_eval_individual_wrapper, args_list)
-    logger.info("Evaluation time: %.4fs", time.perf_counter() - start)
+    program, cutoff = args
+    X, y, cfg = worker_data()
+    return bounded_rmse(program, X, y, cutoff, cfg.early_abort_chunk_rows, worker_subtree_cache(),
+                        cfg.linear_scaling), task_report(start)
+
+def _eval_family_wrapper(args):
+    """
+    Pool task: score a parent's offspring incrementally. Each child is derived from the
+    parent's Derivation, sharing every subtree that reads no changed gene, and compiled to
+    a residual_program in which those subtrees are SLOTs. Over each row chunk the parent's
+    node outputs are computed once for the whole family (program_outputs) and each child
+    only runs the ops its changes touch. With a cutoff, children are rejected as in
+    bounded_rmse and drop out of later chunks.
+    Returns ([individuals], ops run, ops a from-scratch evaluation would have run).
+    """
+    start = time.perf_counter()
+    parent, children, cutoff = args
+    X, y, cfg = worker_data()
+    names = cfg.feature_names
+    with seeded_extension(parent):
+        base = Derivation(GRAMMAR, parent, "start", cfg.max_depth)
+    positions = {} # id of each parent node -> where the parent's program produces its value
+    parent_program = tree_to_program(base.tree, names, positions)
+    mapped = []
+    for child in children:
+        with seeded_extension(child):
+            tree, extensions = derive_tree(GRAMMAR, child, "start", cfg.max_depth, base=base)
+        residual, slot_nodes = residual_program(tree, names, positions)
+        mapped.append((extend_genotype(child, extensions), tree_to_program(tree, names),
+                       residual, [positions[id(node)] for node in slot_nodes]))
+
+    n, step = len(X), cfg.early_abort_chunk_rows
+    bounded = cutoff is not None and np.isfinite(cutoff) and step > 0 and n > step
+    if not bounded:
+        step = n
+    errors = [SquaredError(cfg.linear_scaling) for _ in mapped]
+    scores = [None] * len(mapped)
+    alive = list(range(len(mapped)))
+    ops_run = ops_full = 0
+    for lo in range(0, n, step):
+        X_rows, y_rows = X[lo:lo + step], y[lo:lo + step]
+        outputs = None # the parent's node outputs on these rows, once a child needs them
+        for j in alive:
+            _, program, residual, slots = mapped[j]
+            if slots and outputs is None:
+                outputs = program_outputs(parent_program, X_rows)
+                ops_run += len(parent_program)
+            preds = run_program(residual, X_rows, slots=[outputs[pos] for pos in slots])
+            ops_run += len(residual)
+            ops_full += len(program)
+            if not bounded:
+                scores[j] = (score(preds, y_rows, cfg.linear_scaling), True)
+                continue
+            sse = errors[j].add(preds, y_rows) # same accumulation as bounded_rmse, so the same fitness
+            if math.isnan(sse):
+                scores[j] = (math.nan, True)
+            elif math.sqrt(sse / n) > cutoff:
+                scores[j] = (math.sqrt(sse / n), False)
+        alive = [j for j in alive if scores[j] is None]
+        if not alive:
+            break
+    for j in alive:
+        scores[j] = (math.sqrt(errors[j].sse / n), True)
+
+    results = []
+    for (genotype, program, _, _), (fit, exact) in zip(mapped, scores):
+        ind = {"genotype": genotype, "phenotype": program, "fitness": fit}
+        if not exact:
+            ind["estimate"] = True # rejected: fitness is only a lower bound above the cutoff
+        results.append(ind)
+    return (results, ops_run, ops_full), task_report(start)
+
+def rmse(preds, y):
+    return np.sqrt(np.mean((preds - y) ** 2))
+
+def scaled_rmse(preds, y):
+    """RMSE of the least-squares linear scaling a*preds + b (see linear_scaling)."""
+    return math.sqrt(SquaredError(scaled=True).add(preds, y) / len(y))
+
+def score(preds, y, scaled=False):
+    """The fitness of preds: rmse, or scaled_rmse in the linear scaling mode."""
+    return scaled_rmse(preds, y) if scaled else rmse(preds, y)
+
+def linear_scaling(preds, y):
+    """The (a, b) minimising the squared error of a*preds + b against y."""
+    errors = SquaredError(scaled=True)
+    errors.add(preds, y)
+    return errors.coefficients()
+
+class SquaredError:
+    """
+    Squared error accumulated over row chunks: the plain SSE of the predictions or, with
+    scaled=True, the SSE of their least-squares scaling a*preds + b on the rows seen so far,
+    from per-chunk centred moments merged pairwise (Chan et al.), so large targets do not
+    cancel. Neither can shrink as rows are added, which is what makes the early abort of
+    bounded_rmse valid for both.
+    """
+    __slots__ = ('scaled', 'sse', 'n', 'mean_f', 'mean_y', 'sff', 'sfy', 'syy')
+
+    def __init__(self, scaled=False):
+        self.scaled = scaled
+        self.sse = 0.0
+        self.n = 0
+        self.mean_f = self.mean_y = self.sff = self.sfy = self.syy = 0.0
+
+    def add(self, preds, y):
+        """Add a chunk of predictions and targets; returns the SSE so far."""
+        if not self.scaled:
+            err = preds - y
+            self.sse += float(np.dot(err, err))
+            return self.sse
+        f = np.broadcast_to(np.asarray(preds, dtype=float), np.shape(y))
+        m = len(f)
+        if m == 0:
+            return self.sse
+        with np.errstate(all='ignore'):
+            mean_f, mean_y = float(f.mean()), float(np.mean(y))
+            df, dy = f - mean_f, y - mean_y
+            sff, sfy, syy = float(np.dot(df, df)), float(np.dot(df, dy)), float(np.dot(dy, dy))
+            n = self.n + m
+            d_f, d_y, w = mean_f - self.mean_f, mean_y - self.mean_y, self.n * m / n
+            self.sff += sff + d_f * d_f * w
+            self.sfy += sfy + d_f * d_y * w
+            self.syy += syy + d_y * d_y * w
+            self.mean_f += d_f * m / n
+            self.mean_y += d_y * m / n
+            self.n = n
+            if not math.isfinite(self.sff) or not math.isfinite(self.sfy):
+                self.sse = math.nan # like the plain RMSE of non-finite predictions
+            elif self.sff > 0:
+                self.sse = max(self.syy - self.sfy * self.sfy / self.sff, 0.0)
+            else:
+                self.sse = self.syy # constant predictions: the best fit is the mean of y
+        return self.sse
+
+    def coefficients(self):
+        """(a, b) of the least-squares scaling of the rows added so far."""
+        a = self.sfy / self.sff if self.sff > 0 and math.isfinite(self.sff) else 0.0
+        return a, self.mean_y - a * self.mean_f
+
+def bounded_rmse(program, X, y, cutoff, chunk_rows, subtree_cache=None, scaled=False):
+    """
+    RMSE of a Program with early abort. Squared error is accumulated over row chunks;
+    since the final RMSE is at least sqrt(partial SSE / n), evaluation stops as soon as
+    that lower bound exceeds cutoff. Returns (fitness, exact): the exact RMSE, or the
+    lower bound (> cutoff) with exact=False for a rejected individual.
+    With scaled=True the RMSE is that of the linearly scaled predictions (see SquaredError).
+    """
+    fit, exact, _ = _bounded_error(program, X, y, cutoff, chunk_rows, subtree_cache, scaled)
+    return fit, exact
+
+def _bounded_error(program, X, y, cutoff, chunk_rows, subtree_cache, scaled):
+    """bounded_rmse, also returning its SquaredError (None for an unbounded plain RMSE)."""
+    n = len(X)
+    if cutoff is None or not np.isfinite(cutoff) or chunk_rows <= 0 or n <= chunk_rows:
+        preds = run_program(program, X, subtree_cache)
+        if not scaled:
+            return rmse(preds, y), True, None
+        errors = SquaredError(scaled)
+        return math.sqrt(errors.add(preds, y) / n), True, errors
+    errors = SquaredError(scaled)
+    for lo in range(0, n, chunk_rows):
+        # the subtree cache is keyed to full X
+        sse = errors.add(run_program(program, X[lo:lo + chunk_rows]), y[lo:lo + chunk_rows])
+        if math.isnan(sse):
+            return math.nan, True, errors # the full RMSE would be NaN too
+        bound = math.sqrt(sse / n)
+        if bound > cutoff:
+            return bound, False, errors
+    return math.sqrt(sse / n), True, errors
+
+_probe_cache = {}
+
+def probe_rows(X, k):
+    """A fixed random subset of k rows of X, identical in every process."""
+    key = (id(X), len(X), k)
+    if key not in _probe_cache:
+        idx = np.sort(np.random.default_rng(0).choice(len(X), size=min(k, len(X)), replace=False))
+        _probe_cache.clear() # only one dataset is live per process
+        _probe_cache[key] = np.asarray(X, dtype=float)[idx]
+    return _probe_cache[key]
+
+# Genotypes per fingerprinting task: on the few probe rows, per-Program interpreter overhead
+# dominates, which the batched VM amortises over the whole batch
+FINGERPRINT_BATCH = 64
+
+def behaviour_fingerprints(programs, X_probe, digits=9):
+    """Hash of each phenotype's outputs on the probe rows, rounded to `digits` significant digits."""
+    preds = eval_programs(programs, X_probe) + 0.0 # + 0.0 folds -0.0 into 0.0
+    return [hashlib.sha1(",".join(f"{v:.{digits}g}" for v in row).encode()).digest() for row in preds.tolist()]
+
+def _evaluate_deduplicated(genotypes, pool, fingerprint_cache, cutoff=None):
+    """
+    Two-phase evaluation: workers map the genotypes in batches and fingerprint them on the
+    probe rows, then only behaviours not seen before in this run get a full-dataset pass.
+    Semantically equivalent phenotypes (e.g. exp(log(x)) vs x) share one evaluation.
+    With a cutoff the full pass may abort early (see bounded_rmse); rejected behaviours
+    are returned as estimates and not remembered. A fitness borrowed from another phenotype
+    through its fingerprint is flagged "reused": the probe rows only suggest it is equal.
+    """
+    size = max(1, min(FINGERPRINT_BATCH, math.ceil(len(genotypes) / cpu_count())))
+    batches = [genotypes[lo:lo + size] for lo in range(0, len(genotypes), size)]
+    returned = pool.map(_map_fingerprint_wrapper, batches) if batches else []
+    mapped = [m for batch, _ in returned for m in batch]
+    todo = {} # fingerprint -> program, for behaviours not scored yet
+    scored_as = {} # fingerprint -> index of the genotype whose own program is scored
+    for j, (_, program, fp) in enumerate(mapped):
+        if fp not in fingerprint_cache and fp not in todo:
+            todo[fp] = program
+            scored_as[fp] = j
+    if cutoff is None:
+        scored = pool.map(_program_fitness_wrapper, list(todo.values())) if todo else []
+        fresh = {fp: (fit, True) for fp, (fit, _) in zip(todo, scored)}
+    else:
+        scored = pool.map(_bounded_fitness_wrapper, [(p, cutoff) for p in todo.values()]) if todo else []
+        fresh = dict(zip(todo, (out for out, _ in scored)))
+    fingerprint_cache.update((fp, fit) for fp, (fit, exact) in fresh.items() if exact)
+
+    if mapped:
+        reused = len(mapped) - len(todo)
+        logger.info("Behaviour dedup: %d/%d reused (%.1f%%), %d fingerprints seen",
+                    reused, len(mapped), 100.0 * reused / len(mapped), len(fingerprint_cache))
+    results = []
+    for j, (g, p, fp) in enumerate(mapped):
+        if fp in fingerprint_cache:
+            results.append({"genotype": g, "phenotype": p, "fitness": fingerprint_cache[fp]})
+            if scored_as.get(fp) != j:
+                results[-1]["reused"] = True
+        else:
+            results.append({"genotype": g, "phenotype": p, "fitness": fresh[fp][0], "estimate": True})
+    return results, [r for _, r in returned] + [r for _, r in scored]
+
+def _evaluate_incremental(genotypes, parents, pool, cutoff=None):
+    """
+    Offspring grouped by parent, one _eval_family_wrapper task per family. Fitness is the
+    same as scoring each child from scratch (bounded by the cutoff, if given).
+    """
+    families = {} # parent -> indices of its offspring
+    for j, parent in enumerate(parents):
+        families.setdefault(genotype_key(parent), []).append(j)
+    tasks = [(parent, [genotypes[j] for j in idxs], cutoff) for parent, idxs in families.items()]
+    returned = pool.map(_eval_family_wrapper, tasks) if tasks else []
+    results = [None] * len(genotypes)
+    ops_run = ops_full = 0
+    for idxs, ((inds, run, full), _) in zip(families.values(), returned):
+        for j, ind in zip(idxs, inds):
+            results[j] = ind
+        ops_run += run
+        ops_full += full
+    if ops_full:
+        logger.info("Incremental evaluation: %d offspring of %d parents, ran %d of %d ops (%.1f%%)",
+                    len(genotypes), len(families), ops_run, ops_full, 100.0 * ops_run / ops_full)
+    return results, [r for _, r in returned]
+
+def _evaluate_fresh(genotypes, pool, fingerprint_cache=None, cutoff=None):
+    """Map and score genotypes from scratch: deduplicated, bounded by a cutoff, or plain."""
+    if fingerprint_cache is not None:
+        return _evaluate_deduplicated(genotypes, pool, fingerprint_cache, cutoff)
+    if cutoff is not None:
+        returned = pool.map(_eval_bounded_wrapper, [(g, cutoff) for g in genotypes]) if genotypes else []
+    else:
+        returned = pool.map(_eval_individual_wrapper, genotypes) if genotypes else []
+    return [ind for ind, _ in returned], [r for _, r in returned]
+
+_race_rows_cache = {}
+
+def race_rows(n_total, n_rows, seed):
+    """
+    Row indices of a racing subset: the first n_rows of a permutation drawn from seed,
+    so every rung's subset contains the previous one and all processes agree.
+    """
+    key = (n_total, seed)
+    if key not in _race_rows_cache:
+        _race_rows_cache.clear() # one racing seed is live per generation
+        _race_rows_cache[key] = np.random.default_rng(seed).permutation(n_total)
+    return np.sort(_race_rows_cache[key][:n_rows])
+
+def race_schedule(n_total, cfg):
+    """Subset sizes (rows) for cfg.racing_subsets, dropping rungs that would not be smaller than the data."""
+    sizes = []
+    for frac in cfg.racing_subsets:
+        n = max(1, int(round(frac * n_total)))
+        if n < n_total and (not sizes or n > sizes[-1]):
+            sizes.append(n)
+    return sizes
+
+def _evaluate_racing(genotypes, pool, n_total, cfg, seed):
+    """
+    Successive halving: all genotypes are mapped and scored on the smallest subset; the best
+    cfg.racing_keep fraction (never fewer than cfg.top_parents_count) moves on to each larger
+    subset, and only the survivors of the last rung get a full-data RMSE. Eliminated
+    individuals keep their last subset RMSE and are flagged with "estimate": True.
+    """
+    sizes = race_schedule(n_total, cfg)
+    if not genotypes or not sizes:
+        returned = pool.map(_eval_individual_wrapper, genotypes) if genotypes else []
+        return [ind for ind, _ in returned], [r for _, r in returned]
+
+    returned = pool.map(_race_map_wrapper, [(g, sizes[0], seed) for g in genotypes])
+    reports = [r for _, r in returned]
+    mapped = [m for m, _ in returned]
+    scores = [fit for _, _, fit in mapped]
+    alive = list(range(len(mapped)))
+    rungs = []
+    for next_size in sizes[1:] + [None]:
+        keep = max(math.ceil(cfg.racing_keep * len(alive)), cfg.top_parents_count)
+        alive = sorted(alive, key=lambda i: math.inf if math.isnan(scores[i]) else scores[i])[:keep]
+        rungs.append(len(alive))
+        if next_size is None:
+            out = pool.map(_program_fitness_wrapper, [mapped[i][1] for i in alive])
+        else:
+            out = pool.map(_subset_fitness_wrapper, [(mapped[i][1], next_size, seed) for i in alive])
+        for i, (fit, report) in zip(alive, out):
+            scores[i] = fit
+            reports.append(report)
+
+    exact = set(alive)
+    logger.info("Racing: %d candidates, subsets %s rows -> survivors %s, %d exact",
+                len(mapped), sizes, rungs, len(exact))
+    results = [{"genotype": g, "phenotype": p, "fitness": scores[i]} for i, (g, p, _) in enumerate(mapped)]
+    for i, ind in enumerate(results):
+        if i not in exact:
+            ind["estimate"] = True
+    return results, reports
+
+def summarise_reports(reports):
+    """
+    Fold the task_report tuples of a batch of pool tasks into
+    ({pid: [tasks, busy seconds]}, subtree cache hits, subtree cache misses).
+    """
+    workers, hits, misses = {}, 0, 0
+    for pid, busy, h, m in reports:
+        usage = workers.setdefault(pid, [0, 0.0])
+        usage[0] += 1
+        usage[1] += busy
+        hits += h
+        misses += m
+    return workers, hits, misses
+
+def log_task_reports(reports, wall):
+    """Log subtree cache hit rate and per-worker task counts / utilization over `wall` seconds."""
+    workers, hits, misses = summarise_reports(reports)
+    if hits + misses:
+        logger.info("Subtree cache: %d/%d hits (%.1f%%)", hits, hits + misses, 100.0 * hits / (hits + misses))
+    if not workers or wall <= 0:
+        return
+    util = [100.0 * busy / wall for _, busy in workers.values()]
+    logger.info("Worker utilization: %d workers, min %.1f%% / mean %.1f%% / max %.1f%%",
+                len(util), min(util), sum(util) / len(util), max(util))
+    for pid, (tasks, busy) in sorted(workers.items()):
+        logger.debug("Worker %d: %d tasks, busy %.3fs (%.1f%% of %.3fs)", pid, tasks, busy, 100.0 * busy / wall, wall)
+
+def evaluate_population(population, X, y, cfg, pool, fitness_cache, expression_cache, store=None,
+                        fingerprint_cache=None, race=True, cutoff=None, stats=None):
+    """
+    Score a population. fitness_cache/expression_cache are plain dicts owned by the
+    parent: hits are answered locally, only unseen genotypes are sent to the pool, and
+    worker results are merged back into both caches at the end of the call.
+    The pool must have been started with src.shared_data.init_worker for X, y and cfg.
+    If a persistent FitnessStore is given, it is checked in bulk before dispatching
+    and receives every newly evaluated genotype. If a fingerprint_cache dict is given,
+    behaviourally identical phenotypes are deduplicated (see _evaluate_deduplicated);
+    fitness reused that way is cached for this run but never written to the store.
+    With cfg.racing_subsets set (and race=True), new genotypes are raced on growing data
+    subsets instead (see _evaluate_racing); estimated fitnesses are never cached.
+    A cutoff (the previous generation's worst-parent fitness) lets the full-data pass
+    abort early for individuals that cannot reach it (see bounded_rmse); their fitness
+    is the lower bound at the point of abort, flagged as an estimate.
+    With cfg.incremental, offspring that carry a 'parent' genotype (set by breeding) are
+    scored exactly from their parent's derivation instead (see _evaluate_incremental).
+    If a stats dict is given, fitness/expression cache and store hit counts, evaluations,
+    estimates and the pool task reports are accumulated into it (see src.telemetry).
+    """
+    start = time.perf_counter()
+    results = [None] * len(population)
+    pending = {} # genotype key -> indices of individuals waiting on it
+    expression_hits = 0 # individuals whose phenotype was already mapped
+
+    for i, ind in enumerate(population):
+        key = genotype_key(ind['genotype'])
+        expression_hits += key in expression_cache
+        fit = fitness_cache.get(key)
+        if fit is not None:
+            results[i] = {
+                "genotype": ind["genotype"],
+                "phenotype": expression_cache[key],
+                "fitness": fit,
+            }
+            if "scaling" in ind: # same genotype, same coefficients
+                results[i]["scaling"] = ind["scaling"]
+        else:
+            pending.setdefault(key, []).append(i)
+    cache_misses = sum(map(len, pending.values()))
+
+    if store is not None and pending:
+        for key, (fit, program) in store.get_many(list(pending)).items():
+            fitness_cache[key] = fit
+            expression_cache[key] = program
+            for i in pending.pop(key):
+                results[i] = {"genotype": population[i]["genotype"], "phenotype": program, "fitness": fit}
+
+    args_list = [population[idxs[0]]['genotype'] for idxs in pending.values()]
+    pool_start = time.perf_counter()
+    if race and cfg.racing_subsets:
+        evaluated, reports = _evaluate_racing(args_list, pool, len(X), cfg, random.getrandbits(32))
+    else:
+        lineage = [population[idxs[0]].get('parent') if cfg.incremental else None for idxs in pending.values()]
+        family = [j for j, parent in enumerate(lineage) if parent is not None]
+        fresh = [j for j, parent in enumerate(lineage) if parent is None]
+        evaluated = [None] * len(args_list)
+        inc, reports = _evaluate_incremental([args_list[j] for j in family], [lineage[j] for j in family], pool, cutoff)
+        new, new_reports = _evaluate_fresh([args_list[j] for j in fresh], pool, fingerprint_cache, cutoff)
+        for j, ind in zip(family + fresh, inc + new):
+            evaluated[j] = ind
+        reports += new_reports
+    log_task_reports(reports, time.perf_counter() - pool_start)
+
+    # merge worker results; store under the submitted key and, if mapping extended
+    # the genotype, under the extended key too, so both caches stay one-to-one
+    new_entries = {}
+    for (key, idxs), ind in zip(pending.items(), evaluated):
+        for i in idxs:
+            results[i] = dict(ind)
+        if ind.get('estimate'):
+            continue # subset scores must not be served as exact fitness later
+        for k in {key, genotype_key(ind['genotype'])}:
+            fitness_cache[k] = ind['fitness']
+            expression_cache[k] = ind['phenotype']
+            if not ind.get('reused'): # fingerprint matches are only trusted within this run
+                new_entries[k] = (ind['fitness'], ind['phenotype'])
+    if store is not None:
+        store.put_many(new_entries)
+    estimates = sum(1 for ind in evaluated if ind.get('estimate'))
+    if cutoff is not None and evaluated:
+        logger.info("Early abort: %d/%d rejected above cutoff %.4f", estimates, len(evaluated), cutoff)
+    if stats is not None:
+        uncached = sum(map(len, pending.values()))
+        for name, value in (("fitness_cache_hits", len(population) - cache_misses),
+                            ("fitness_cache_misses", cache_misses),
+                            ("expression_cache_hits", expression_hits),
+                            ("expression_cache_misses", len(population) - expression_hits),
+                            ("store_hits", cache_misses - uncached),
+                            ("evaluated", len(args_list)),
+                            ("estimates", estimates)):
+            stats[name] = stats.get(name, 0) + value
+        stats.setdefault("reports", []).extend(reports)
+
+    # workers ship compact Programs back; rebuild trees for logging and test-set scoring
+    for ind in results:
+        if isinstance(ind['phenotype'], Program):
+            ind['phenotype'] = ind['phenotype'].to_tree(cfg.feature_names)
+    logger.info("Evaluation time: %.4fs (%d cached, %d evaluated)",
+                time.perf_counter() - start, len(population) - sum(map(len, pending.values())), len(args_list))
     return results
 
-def eval_individual(individual, X, y, cfg, fit_cache, expr_cache):
-    phenotype = map_genotype(
-        grammar=GRAMMAR,
-        genotype=individual['genotype'],
-        start_nt="start",
-        max_depth=cfg.max_depth,
-        expression_cache=expr_cache 
-    )
+def exact_top(population, n, X, y, cfg, pool, fitness_cache, expression_cache, store=None,
+              fingerprint_cache=None, stats=None):
+    """
+    Sort the population best-first and make sure its top n individuals carry exact
+    full-data fitness, re-scoring racing estimates that sorted into the top until none are left.
+    In the linear scaling mode the top n also get their coefficients (see fit_scaling).
+    """
+    population.sort(key=lambda g: g['fitness'])
+    while True:
+        idx = [i for i, ind in enumerate(population[:n]) if ind.get('estimate')]
+        if not idx:
+            fit_scaling(population[:n], X, y, cfg)
+            return population
+        exact = evaluate_population([population[i] for i in idx], X, y, cfg, pool, fitness_cache,
+                                    expression_cache, store, fingerprint_cache, race=False, cutoff=None,
+                                    stats=stats)
+        for i, ind in zip(idx, exact):
+            population[i] = ind
+        population.sort(key=lambda g: g['fitness'])
+
+def fit_scaling(individuals, X, y, cfg):
+    """
+    In the linear scaling mode, fit the 'scaling' (a, b) on (X, y) of every exactly scored
+    individual that lacks one: only fresh evaluations carry it, not cache or store hits.
+    """
+    if not cfg.linear_scaling:
+        return
+    for ind in individuals:
+        if 'scaling' not in ind and not ind.get('estimate'):
+            ind['scaling'] = linear_scaling(predict(ind['phenotype'], X, cfg.feature_names), y)
 
-    # cache key
-    key = tuple((nt, tuple(individual['genotype'].get(nt, []))) 
-                for nt in sorted(GRAMMAR.keys()))
+def eval_individual(individual, X, y, cfg, fit_cache, expr_cache, subtree_cache=None, cutoff=None):
+    with seeded_extension(individual['genotype']):
+        phenotype, genotype = map_genotype(
+            grammar=GRAMMAR,
+            genotype=individual['genotype'],
+            start_nt="start",
+            max_depth=cfg.max_depth,
+            expression_cache=expr_cache,
+            flat=True,
+            feature_names=cfg.feature_names,
+            return_genotype=True
+        )
 
-    fit = fit_cache.get(key) # check if already evaluated
+    key = genotype_key(genotype)
+
+    exact, errors = True, None
+    fit = fit_cache.get(key) if fit_cache is not None else None # check if already evaluated
     if fit is None:
-        preds = np.array([
-            eval_tree(phenotype, {k: s[i] for i, k in enumerate(cfg.feature_names)})
-            for s in X
-        ])
-        fit = np.sqrt(np.mean((preds - y) ** 2))
-        fit_cache[key] = fit
-
-    return {
-        "genotype": individual["genotype"],
+        fit, exact, errors = _bounded_error(phenotype, X, y, cutoff, cfg.early_abort_chunk_rows,
+                                            subtree_cache, cfg.linear_scaling)
+        if fit_cache is not None and exact:
+            fit_cache[key] = fit
+
+    result = {
+        "genotype": genotype,
         "phenotype": phenotype,
         "fitness": fit,
     }
+    if not exact:
+        result["estimate"] = True # rejected: fitness is only a lower bound above the cutoff
+    elif errors is not None and errors.scaled and not math.isnan(fit):
+        result["scaling"] = errors.coefficients()
+    return result
 
 def eval_tree(node, sample):
     """
     Recursively evaluate a TreeNode using a sample row.
     Handles pre_ops, safe division, arithmetic, and variables/literals.
+    This is the reference semantics that compiled phenotypes (predict) and the bytecode
+    VM (src.bytecode) are tested against.
     """
     if isinstance(node, TreeNode):
         sym = node.symbol
@@ -115,6 +639,112 @@ def eval_tree(node, sample):
     else:
         return float(node)  # node is already terminal
 
+def feature_columns(X, feature_names):
+    """Map each feature name to its column of X (views, no copies)."""
+    X = np.asarray(X, dtype=float)
+    return {k: X[:, i] for i, k in enumerate(feature_names)}
+
+# --- Phenotype compilation ---
+# Phenotypes are turned into straight-line Python source over NumPy (one assignment per
+# node, so deep trees never hit parser nesting limits), compiled once and kept in a
+# bounded LRU cache keyed by the expression's infix string.
+CODE_CACHE_SIZE = 4096
+_code_cache = OrderedDict()
+
+_COMPILE_NS = {
+    '_pre': VEC_PRE_OPS,
+    '_div': safe_div_vec,
+}
+
+def phenotype_source(node):
+    """
+    Generate the source of a function `_expr(c)` evaluating node over columns c.
+    The tree is walked with an explicit stack, so deep trees never hit the recursion limit.
+    """
+    lines = []
+    results = [] # the expression (a literal or a t<k> name) of each finished subtree
+    stack = [node] # a node to emit, or (node, operand count) to assign once its operands are done
+    while stack:
+        n = stack.pop()
+        if n.__class__ is tuple:
+            n, k = n
+            operands = results[-k:]
+            del results[-k:]
+            sym = n.symbol
+            if k == 1:
+                lines.append(f"t{len(lines)} = _pre[{sym!r}]({operands[0]})")
+            else:
+                a, b = operands
+                expr = f"_div({a}, {b})" if sym == '/' else f"{a} {sym} {b}"
+                lines.append(f"t{len(lines)} = {expr}")
+            results.append(f"t{len(lines) - 1}")
+            continue
+        if not isinstance(n, TreeNode):
+            results.append(repr(float(n)))
+            continue
+        sym = n.symbol
+        if sym in VEC_PRE_OPS:
+            stack.append((n, 1))
+            stack.append(n.children[0])
+        elif sym in ('+', '-', '*', '/'):
+            stack.append((n, 2))
+            stack.append(n.children[1])
+            stack.append(n.children[0])
+        elif sym in ('(', ')', 'start', 'seq'):
+            if n.children:
+                stack.append(n.children[-1] if sym == 'seq' else n.children[0])
+            else:
+                results.append('0.0')
+        else:
+            try:
+                results.append(repr(float(sym)))
+            except ValueError:
+                # variables are looked up by name; unknown names fail like eval_tree
+                lines.append(f"t{len(lines)} = c[{sym!r}] if {sym!r} in c else _bad({sym!r})")
+                results.append(f"t{len(lines) - 1}")
+
+    body = "".join(f"    {line}\n" for line in lines)
+    return f"def _expr(c):\n{body}    return {results[0]}\n"
+
+def _bad(sym):
+    logger.error("Failed to parse tree %s", sym)
+    return 0.0
+
+def compile_phenotype(node):
+    """Compile a phenotype into a callable f(columns), reusing the code cache."""
+    key = node.to_infix() if isinstance(node, TreeNode) else str(node)
+    fn = _code_cache.get(key)
+    if fn is not None:
+        _code_cache.move_to_end(key)
+        return fn
+
+    src = phenotype_source(node)
+    ns = dict(_COMPILE_NS, _bad=_bad)
+    exec(compile(src, f"<phenotype {key[:60]}>", "exec"), ns)
+    fn = ns['_expr']
+
+    _code_cache[key] = fn
+    if len(_code_cache) > CODE_CACHE_SIZE:
+        _code_cache.popitem(last=False) # evict least recently used
+    return fn
+
+def predict(phenotype, X, feature_names):
+    """Predictions of a phenotype (TreeNode or Program) for every row of X, as a float array of len(X)."""
+    if isinstance(phenotype, Program):
+        return run_program(phenotype, X)
+    columns = feature_columns(X, feature_names)
+    with np.errstate(all='ignore'): # overflow/nan propagate exactly as in the scalar path
+        preds = compile_phenotype(phenotype)(columns)
+    return np.broadcast_to(np.asarray(preds, dtype=float), (len(X),))
+
+def predict_individual(individual, X, feature_names):
+    """predict for an individual, applying its linear 'scaling' (a, b) when it has one."""
+    preds = predict(individual['phenotype'], X, feature_names)
+    if individual.get('scaling') is not None:
+        a, b = individual['scaling']
+        preds = a * preds + b
+    return preds
+
 def get_expr(genome, max_depth):
     key = tuple(genome)
     if key not in expr_cache: # new genome, need to build expression from scratch
@@ -130,13 +760,7 @@ def evaluate_top_individuals_on_test(best_individuals, X_test, y_test, cfg):
     
     for rank, individual in enumerate(best_individuals, 1):
         # Make predictions on test set
-        y_pred = np.array([
-            eval_tree(
-                individual['phenotype'],
-                {k: row[i] for i, k in enumerate(cfg.feature_names)}
-            )
-            for row in X_test
-        ])
+        y_pred = predict_individual(individual, X_test, cfg.feature_names)
         
         rmse = np.sqrt(np.mean((y_pred - y_test) ** 2))
         avg_absolute_error = np.mean(np.abs(y_pred - y_test)) # average prediction error
@@ -146,6 +770,7 @@ def evaluate_top_individuals_on_test(best_individuals, X_test, y_test, cfg):
             'rank': rank,
             'genotype': individual['genotype'],
             'phenotype': individual['phenotype'],
+            'scaling': individual.get('scaling'),
             'train_fitness': individual['fitness'],
             'test_rmse': rmse,
             'avg_absolute_error': avg_absolute_error
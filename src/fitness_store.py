@@ -0,0 +1,124 @@
+import hashlib, logging, os, pickle, sqlite3, time
+import numpy as np
+from src.population import GRAMMAR
+
+logger = logging.getLogger(__name__)
+
+def dataset_fingerprint(X, y):
+    """Hash of the training split, so scores are only reused on identical data."""
+    h = hashlib.sha1()
+    for arr in (X, y):
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+def grammar_fingerprint(grammar, feature_names):
+    """Hash of the grammar and the feature order that stored Programs index into."""
+    return hashlib.sha1(f"{grammar}\n{list(feature_names)}".encode()).hexdigest()
+
+def fitness_kind(cfg):
+    """What a stored fitness measures: "rmse", or "scaled_rmse" in the linear scaling mode."""
+    return "scaled_rmse" if getattr(cfg, 'linear_scaling', False) else "rmse"
+
+def genotype_hash(key):
+    """Stable hash of a canonical genotype key (see population.genotype_key)."""
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+class FitnessStore:
+    """
+    Persistent fitness cache in a local SQLite file, shared across runs.
+    Entries are scoped by (dataset fingerprint, grammar fingerprint, max_depth, fitness kind),
+    since how a genotype is extended while mapping depends on max_depth. Within a scope they
+    are keyed by the genotype hash as submitted, and each stores the fitness and the
+    phenotype Program. Lookups and writes are done in bulk once per generation. When the
+    store grows past max_entries, the least recently used rows are evicted.
+    """
+
+    def __init__(self, path, dataset_fp, grammar_fp, max_entries=1_000_000, fitness="rmse", max_depth=None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.scope = f"{dataset_fp}:{grammar_fp}"
+        if max_depth is not None:
+            self.scope += f":depth={max_depth}"
+        if fitness != "rmse": # the default kind adds nothing to the scope
+            self.scope += f":{fitness}"
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._conn = sqlite3.connect(path, timeout=30) # islands may share one file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fitness ("
+            " scope TEXT NOT NULL, genotype TEXT NOT NULL,"
+            " fitness REAL, phenotype BLOB NOT NULL, last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, genotype)) WITHOUT ROWID")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fitness_lru ON fitness (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: (fitness, phenotype)} for the genotype keys found in the store."""
+        hashes = {genotype_hash(k): k for k in keys}
+        found = {}
+        items = list(hashes)
+        for i in range(0, len(items), 500): # stay under SQLite's bound-parameter limit
+            chunk = items[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT genotype, fitness, phenotype FROM fitness"
+                f" WHERE scope = ? AND genotype IN ({','.join('?' * len(chunk))})",
+                [self.scope, *chunk]).fetchall()
+            for h, fit, blob in rows:
+                found[hashes[h]] = (float('nan') if fit is None else fit, pickle.loads(blob))
+        if found:
+            stamp = time.time_ns()
+            self._conn.executemany(
+                "UPDATE fitness SET last_used = ? WHERE scope = ? AND genotype = ?",
+                [(stamp, self.scope, genotype_hash(k)) for k in found])
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, entries):
+        """Store {key: (fitness, phenotype)} and evict beyond max_entries."""
+        if not entries:
+            return
+        stamp = time.time_ns()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO fitness VALUES (?, ?, ?, ?, ?)",
+            [(self.scope, genotype_hash(k), None if np.isnan(fit) else float(fit), pickle.dumps(ph), stamp)
+             for k, (fit, ph) in entries.items()])
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM fitness WHERE (scope, genotype) IN"
+                " (SELECT scope, genotype FROM fitness ORDER BY last_used LIMIT ?)", (excess,))
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM fitness").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_fitness_store(X, y, cfg):
+    """Open the persistent fitness store configured in cfg, or return None when disabled."""
+    if not getattr(cfg, 'fitness_store_path', None):
+        return None
+    store = FitnessStore(
+        cfg.fitness_store_path,
+        dataset_fingerprint(X, y),
+        grammar_fingerprint(GRAMMAR, cfg.feature_names),
+        max_entries=cfg.fitness_store_max_entries,
+        fitness=fitness_kind(cfg),
+        max_depth=cfg.max_depth
+    )
+    logger.info("Fitness store: %s (%d entries)", cfg.fitness_store_path, len(store))
+    return store
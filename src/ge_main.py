@@ -1,81 +1,158 @@
-import numpy as np, random, logging
-from multiprocessing import Manager, Pool, cpu_count
+import numpy as np, random, logging, time
+from multiprocessing import Pool, cpu_count
+from contextlib import contextmanager, nullcontext
 from src.population import initialise_population
-from src.evaluation import evaluate_population
-from src.genetic_operators import crossover_individuals, mutate_genotype
+from src.evaluation import evaluate_population, exact_top
+from src.genetic_operators import reproduce, breed_batch
+from src.shared_data import SharedDataset, init_worker
+from src.fitness_store import open_fitness_store
+from src.checkpoint import write_checkpoint, read_checkpoint, capture_state, restore_population, scope
+from src.telemetry import TelemetryWriter, generation_record
+from src.profiling import prepare_run, collect, profile_mode
+from src.islands import run_islands
+from src.steady_state import run_steady_state
+from src.distributed import ClusterPool
 
 logger = logging.getLogger(__name__)
 
-def genome_to_tuple(genotype):
-    """Convert genotype dict to a hashable tuple for uniqueness checking."""
-    return tuple(sorted((k, tuple(v)) for k, v in genotype.items()))
+@contextmanager
+def evaluation_pool(X, y, cfg):
+    """
+    The pool run_ge evaluates on: a ClusterPool with cfg.distributed (remote workers are
+    sent the dataset once when they join), else a local Pool whose workers attach to the
+    dataset, placed in shared memory once, in their initializer.
+    """
+    if cfg.distributed:
+        with ClusterPool(X, y, cfg) as pool:
+            yield pool
+        return
+    with SharedDataset(X, y) as shared, \
+         Pool(processes=cpu_count(), initializer=init_worker, initargs=(shared.spec, cfg)) as pool:
+        yield pool
 
-def run_ge(X, y, cfg):
-    with Manager() as manager, Pool(processes=cpu_count()) as pool:
-        # Create shared process-safe dictionaries
-        fitness_cache = manager.dict()
-        genome_to_expression_cache = manager.dict()
+def run_ge(X, y, cfg, resume=None):
+    """
+    Generational GE on (X, y). Every cfg.checkpoint_every generations the run state is
+    written to cfg.checkpoint_path; pass resume=<checkpoint path> to continue from one.
+    A per-generation metrics record is appended to cfg.telemetry_path (JSONL), if set.
+    With cfg.distributed, pool tasks go to worker.py processes over TCP (see ClusterPool).
+    The island and steady-state engines support none of resume, distributed evaluation,
+    checkpoints, telemetry or worker profiling, and refuse to start with any of them set.
+    """
+    if cfg.island_count > 1 or cfg.mode == "steady_state":
+        # the island and steady-state engines have no generation loop to hook these into
+        unsupported = [name for name, wanted in (("resume", resume), ("distributed.enabled", cfg.distributed),
+                                                 ("checkpoint.every", cfg.checkpoint_every),
+                                                 ("telemetry.path", cfg.telemetry_path),
+                                                 ("profiling.mode", profile_mode(cfg) != "off")) if wanted]
+        if unsupported:
+            raise ValueError(f"{', '.join(unsupported)}: only supported for the generational engine "
+                             f"(mode \"generational\" with islands.count 1)")
+    if cfg.island_count > 1:
+        return run_islands(X, y, cfg)
+    if cfg.mode == "steady_state":
+        return run_steady_state(X, y, cfg)
+
+    store = open_fitness_store(X, y, cfg)
+    profiling = prepare_run(cfg) != "off"
+    with (store if store is not None else nullcontext()), evaluation_pool(X, y, cfg) as pool, \
+         TelemetryWriter(cfg.telemetry_path, append=bool(resume)) as telemetry:
+        # Caches are plain dicts in this process; evaluate_population answers hits locally
+        # and merges worker results back after each generation
+        fitness_cache = {}
+        genome_to_expression_cache = {}
+        # behaviour fingerprint -> fitness, for semantically equivalent phenotypes
+        fingerprint_cache = {} if cfg.dedup_probe_rows else None
 
         generation_times = []
+        breed_rng = np.random.default_rng(random.getrandbits(64)) # follows the seeded random stream
 
         # --- Initial population ---
-        population = initialise_population(cfg)
+        run_scope = scope(X, y, cfg) if (resume or cfg.checkpoint_every) else None
+        first_gen = 0
+        if resume:
+            state = read_checkpoint(resume)
+            if state["scope"] != run_scope:
+                raise ValueError(f"Checkpoint {resume} was written for different data, grammar or max_depth")
+            first_gen = state["generation"]
+            population = restore_population(state, cfg)
+            cutoff = state["cutoff"]
+            random.setstate(state["random_state"])
+            breed_rng.bit_generator.state = state["breed_rng_state"]
+            if fingerprint_cache is not None and state["fingerprint_cache"]:
+                fingerprint_cache.update(state["fingerprint_cache"])
+            fitness_cache.update(state["fitness_cache"] or {})
+            genome_to_expression_cache.update(state["expression_cache"] or {})
+            logger.info("Resumed from %s at generation %d", resume, first_gen)
+        else:
+            population = initialise_population(cfg)
+            cutoff = None # worst-parent fitness of the previous generation, for early-abort RMSE
 
-        for gen in range(cfg.generations):
+        for gen in range(first_gen, cfg.generations):
+            gen_start = time.perf_counter()
+            eval_stats, breed_stats = {}, {}
 
             # --- Evaluate current population ---
             population = evaluate_population(
                 population, X, y, cfg, 
-                pool, fitness_cache, genome_to_expression_cache
+                pool, fitness_cache, genome_to_expression_cache, store, fingerprint_cache, cutoff=cutoff,
+                stats=eval_stats
             )
+            sort_start = time.perf_counter()
 
-            # --- Sort by fitness ---
-            population.sort(key=lambda g: g['fitness'])
+            # --- Sort by fitness (elites always carry exact, not raced, scores) ---
+            population = exact_top(population, cfg.elitism_count, X, y, cfg,
+                                   pool, fitness_cache, genome_to_expression_cache, store, fingerprint_cache,
+                                   stats=eval_stats)
+            evaluated = population
+            breed_start = time.perf_counter()
             best = population[0]
             logger.info("Gen %d: Best Fitness %.4f Expr: %s",
                         gen, best['fitness'], best['phenotype'])
 
-            # --- Elitism ---
-            new_pop = [dict(ind) for ind in population[:cfg.elitism_count]]
-            parents = population[:cfg.top_parents_count]
-        
-            # Create set to track unique genomes in new population
-            genome_set = {genome_to_tuple(ind['genotype']) for ind in new_pop}
-
-            # --- Reproduction ---
-            while len(new_pop) < cfg.population_size:
-                p1, p2 = random.choice(parents), random.choice(parents)
-
-                c1, c2 = crossover_individuals(p1, p2)
-                c1g = mutate_genotype(c1['genotype'], max_depth=cfg.max_depth)
-                c2g = mutate_genotype(c2['genotype'], max_depth=cfg.max_depth)
-
-                 # Try to find unique genome for c1, with max retries to prevent infinite loop
-                max_retries = 100
-                retries = 0
-                while genome_to_tuple(c1g) in genome_set and retries < max_retries:
-                    c1g = mutate_genotype(c1g, max_depth=cfg.max_depth)
-                    retries += 1
-                
-                genome_set.add(genome_to_tuple(c1g))
-                new_pop.append({'genotype': c1g, 'phenotype': None, 'fitness': None})
-                
-                if len(new_pop) < cfg.population_size:
-                    # Ensure c2g is unique - keep mutating until it is
-                    retries = 0
-                    while genome_to_tuple(c2g) in genome_set and retries < max_retries:
-                        c2g = mutate_genotype(c2g, max_depth=cfg.max_depth)
-                        retries += 1
-                    genome_set.add(genome_to_tuple(c2g))
-                    new_pop.append({'genotype': c2g, 'phenotype': None, 'fitness': None})
-            population = new_pop
+            if cfg.early_abort:
+                cutoff = population[min(cfg.top_parents_count, len(population)) - 1]['fitness']
+
+            # --- Elitism & reproduction ---
+            if cfg.batch_breeding:
+                population = breed_batch(population, cfg, breed_rng, pool, cfg.breeding_shards, stats=breed_stats)
+            else:
+                population = reproduce(population, cfg, stats=breed_stats)
+            checkpoint_start = time.perf_counter()
+
+            # --- Checkpoint (state at the start of the next generation) ---
+            if cfg.checkpoint_every and (gen + 1) % cfg.checkpoint_every == 0:
+                with_cache = cfg.checkpoint_include_cache
+                write_checkpoint(cfg.checkpoint_path, capture_state(
+                    gen + 1, population, cutoff, breed_rng, fingerprint_cache, run_scope, cfg,
+                    fitness_cache if with_cache else None, genome_to_expression_cache if with_cache else None))
+
+            # --- Telemetry ---
+            end = time.perf_counter()
+            generation_times.append(end - gen_start)
+            telemetry.write(generation_record(gen, evaluated, {
+                "evaluation": sort_start - gen_start,
+                "sort": breed_start - sort_start,
+                "reproduction": checkpoint_start - breed_start,
+                "checkpoint": end - checkpoint_start,
+                "total": end - gen_start,
+            }, eval_stats, breed_stats, {
+                "fitness": len(fitness_cache),
+                "expression": len(genome_to_expression_cache),
+                "fingerprint": len(fingerprint_cache) if fingerprint_cache is not None else 0,
+            }))
+
+        if generation_times:
+            logger.info("Generation time: mean %.3fs, max %.3fs over %d generations",
+                        np.mean(generation_times), max(generation_times), len(generation_times))
 
         # --- Final sort & best genome ---
         population = evaluate_population(
             population, X, y, cfg, 
-            pool, fitness_cache, genome_to_expression_cache
+            pool, fitness_cache, genome_to_expression_cache, store, fingerprint_cache, cutoff=cutoff
         )
-        population.sort(key=lambda g: g['fitness'])
+        population = exact_top(population, 10, X, y, cfg,
+                               pool, fitness_cache, genome_to_expression_cache, store, fingerprint_cache)
         best_ten = population[0:10]  # return top 10 genomes
         logger.info("Best 10 Genomes:")
         for i, genome in enumerate(best_ten):
@@ -89,5 +166,12 @@ def run_ge(X, y, cfg):
         else:
             logger.info("Fitness cache size: %d", len(fitness_cache))
             logger.info("Genome to expression cache size: %d", len(genome_to_expression_cache))
+        if store is not None:
+            logger.info("Fitness store: %d hits, %d misses, %d entries", store.hits, store.misses, len(store))
+
+        if profiling: # workers write their profiles on a clean exit, then merge them
+            pool.close()
+            pool.join()
+            collect(cfg)
 
         return best_ten
\ No newline at end of file
@@ -1,8 +1,13 @@
 import random, logging
-from src.population import choose_production, GRAMMAR
+import numpy as np
+from array import array
+from src.models import Genotype
+from src.population import choose_production_id, genotype_key, GRAMMAR
 
 logger = logging.getLogger(__name__)
 
+TABLES = GRAMMAR.compiled # production counts and choices by non-terminal id
+
 def crossover_genotypes(parent1, parent2, rng=random):
     """
     DSGE-style gene-level uniform crossover.
@@ -10,6 +15,9 @@ def crossover_genotypes(parent1, parent2, rng=random):
     - For each key, offspring take the entire gene (list of productions)
       from one parent or the other, according to the mask.
     """
+    if isinstance(parent1, Genotype) and isinstance(parent2, Genotype):
+        return _crossover_packed(parent1, parent2, rng)
+
     keys = sorted(set(parent1.keys()) | set(parent2.keys()))
 
     child1 = {}
@@ -33,6 +41,31 @@ def crossover_genotypes(parent1, parent2, rng=random):
             child2[gene] = list(g2)
     return child1, child2
 
+def _crossover_packed(parent1, parent2, rng):
+    """Gene-level uniform crossover on packed genotypes: splice whole per-nt buffer slices."""
+    if parent1.nts != parent2.nts:
+        c1, c2 = crossover_genotypes(parent1.to_dict(), parent2.to_dict(), rng=rng)
+        nts = sorted(set(parent1.nts) | set(parent2.nts))
+        return Genotype.from_dict(c1, nts), Genotype.from_dict(c2, nts)
+
+    mask = [rng.random() < 0.5 for _ in parent1.nts] # mask bit per gene
+    if not any(mask): # no gene swapped: children are the parents (immutable, safe to share)
+        return parent1, parent2
+    if all(mask):
+        return parent2, parent1
+
+    buf1, buf2 = array('B'), array('B')
+    off1, off2 = [0], [0]
+    for i, take_from_p2 in enumerate(mask):
+        a, b = parent1.offsets[i], parent1.offsets[i + 1]
+        c, d = parent2.offsets[i], parent2.offsets[i + 1]
+        g1, g2 = parent1.buf[a:b], parent2.buf[c:d]
+        buf1.extend(g2 if take_from_p2 else g1)
+        buf2.extend(g1 if take_from_p2 else g2)
+        off1.append(len(buf1))
+        off2.append(len(buf2))
+    return Genotype(parent1.nts, tuple(off1), buf1), Genotype(parent1.nts, tuple(off2), buf2)
+
 def crossover_individuals(ind1, ind2, rng=random):
     """
     Convenience wrapper to crossover two individuals with structured genotypes.
@@ -44,6 +77,9 @@ def crossover_individuals(ind1, ind2, rng=random):
     return child1, child2
 
 def mutate_genotype(genotype, max_depth, mutations=1, rng=random):
+    if isinstance(genotype, Genotype):
+        return _mutate_packed(genotype, max_depth, mutations, rng)
+
     new_genotype = {nt: list(genes) for nt, genes in genotype.items()} # deep copy
 
     # Build list of all possible (non-terminal, position) candidates
@@ -53,12 +89,235 @@ def mutate_genotype(genotype, max_depth, mutations=1, rng=random):
 
     for nt, pos in chosen: 
         genes = new_genotype[nt] # get gene list for non-terminal
-        max_choices = len(GRAMMAR[nt]) # number of possible productions
+        i = TABLES.nt_id[nt]
+        max_choices = TABLES.n_prods[i] # number of possible productions
 
         old_idx = genes[pos] # current production index
-        new_idx = choose_production(GRAMMAR, nt, 0, max_depth) # new prod index
+        new_idx = choose_production_id(TABLES, i, 0, max_depth) # new prod index
 
         if new_idx == old_idx and max_choices > 1: # ensure a different rule choice
             new_idx = (old_idx + 1) % max_choices 
         genes[pos] = new_idx
     return new_genotype
+
+def _mutate_packed(genotype, max_depth, mutations, rng):
+    """Point mutation on a packed genotype; candidates are simply the flat buffer positions."""
+    num = min(mutations, len(genotype))
+    changes = {}
+    for pos in rng.sample(range(len(genotype)), num):
+        nt, _ = genotype.locate(pos)
+        i = TABLES.nt_id[nt]
+        max_choices = TABLES.n_prods[i]
+
+        old_idx = genotype.buf[pos]
+        new_idx = choose_production_id(TABLES, i, 0, max_depth)
+
+        if new_idx == old_idx and max_choices > 1: # ensure a different rule choice
+            new_idx = (old_idx + 1) % max_choices
+        changes[pos] = new_idx
+    return genotype.replace(changes) # copies the buffer once, shares nts/offsets
+
+def unique_child(genotype, genome_set, cfg, rng=random, max_retries=100, stats=None):
+    """
+    Re-mutate genotype until it is not in genome_set (bounded retries), then add it.
+    A stats dict, if given, counts duplicates, retries and duplicates left unresolved.
+    """
+    retries = 0
+    while genotype_key(genotype) in genome_set and retries < max_retries:
+        genotype = mutate_genotype(genotype, max_depth=cfg.max_depth, rng=rng)
+        retries += 1
+    if stats is not None:
+        count_duplicates(stats, int(retries > 0), retries, int(genotype_key(genotype) in genome_set))
+    genome_set.add(genotype_key(genotype))
+    return genotype
+
+def count_duplicates(stats, duplicates, retries, unresolved):
+    """Accumulate duplicate-child counters into a telemetry stats dict."""
+    stats["duplicates"] = stats.get("duplicates", 0) + duplicates
+    stats["duplicate_retries"] = stats.get("duplicate_retries", 0) + retries
+    stats["duplicates_unresolved"] = stats.get("duplicates_unresolved", 0) + unresolved
+
+def breed_offspring(parents, genome_set, cfg, rng=random):
+    """One unique offspring genotype from two random parents (used by the steady-state engine)."""
+    p1, p2 = rng.choice(parents), rng.choice(parents)
+    child, _ = crossover_individuals(p1, p2, rng=rng)
+    genotype = mutate_genotype(child['genotype'], max_depth=cfg.max_depth, rng=rng)
+    return unique_child(genotype, genome_set, cfg, rng)
+
+def reproduce(population, cfg, rng=random, stats=None):
+    """
+    Build the next generation from a population sorted best-first:
+    elites are carried over, the rest are unique mutated offspring of the top parents,
+    each recording the parent it shares most genes with as 'parent'.
+    Duplicate-retry counters go into stats, if given.
+    """
+    # --- Elitism ---
+    new_pop = [dict(ind) for ind in population[:cfg.elitism_count]]
+    parents = population[:cfg.top_parents_count]
+
+    # Create set to track unique genomes in new population
+    genome_set = {genotype_key(ind['genotype']) for ind in new_pop}
+
+    # --- Reproduction ---
+    while len(new_pop) < cfg.population_size:
+        p1, p2 = rng.choice(parents), rng.choice(parents)
+
+        c1, c2 = crossover_individuals(p1, p2, rng=rng)
+        c1g = mutate_genotype(c1['genotype'], max_depth=cfg.max_depth, rng=rng)
+        c2g = mutate_genotype(c2['genotype'], max_depth=cfg.max_depth, rng=rng)
+
+        # Try to find unique genomes, with max retries to prevent infinite loop
+        c1g = unique_child(c1g, genome_set, cfg, rng, stats=stats)
+        new_pop.append({'genotype': c1g, 'phenotype': None, 'fitness': None,
+                        'parent': lineage_parent(c1g, p1['genotype'], p2['genotype'])})
+
+        if len(new_pop) < cfg.population_size:
+            c2g = unique_child(c2g, genome_set, cfg, rng, stats=stats)
+            new_pop.append({'genotype': c2g, 'phenotype': None, 'fitness': None,
+                            'parent': lineage_parent(c2g, p1['genotype'], p2['genotype'])})
+    return new_pop
+
+def lineage_parent(child, parent1, parent2):
+    """
+    The parent whose genes the child shares most of, position by position: the base it
+    is incrementally evaluated from (see evaluate_population).
+    """
+    def shared(parent):
+        return sum(a == b for nt in child.keys() for a, b in zip(child.get(nt) or (), parent.get(nt) or ()))
+    return parent1 if shared(parent1) >= shared(parent2) else parent2
+
+def _pack(genotypes):
+    """One flat uint8 buffer for many genotypes, plus each one's start and (n, K+1) gene offsets."""
+    lengths = np.array([len(g) for g in genotypes], dtype=np.intp)
+    base = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.intp)
+    flat = np.frombuffer(b"".join(g.buf.tobytes() for g in genotypes), dtype=np.uint8)
+    offs = np.array([g.offsets for g in genotypes], dtype=np.intp)
+    return flat, base, lengths, offs
+
+def _crossover_many(parents, n_children, rng):
+    """
+    Vectorized gene-level uniform crossover: draws all parent pairs and per-gene masks at
+    once and assembles every child by gathering segments from one concatenated parent
+    buffer. Pairs produce complementary children, as in crossover_genotypes.
+    Returns (children, donors): donors[c] indexes the parent child c took most genes from.
+    """
+    nts = parents[0].nts
+    K = len(nts)
+    n_pairs = (n_children + 1) // 2
+    flat, base, _, offs = _pack(parents)
+
+    pairs = rng.integers(0, len(parents), size=(n_pairs, 2))
+    mask = rng.random((n_pairs, K)) < 0.5 # mask bit per gene: take from p2
+    src = np.empty((2 * n_pairs, K), dtype=np.intp)
+    src[0::2] = np.where(mask, pairs[:, 1:2], pairs[:, 0:1])
+    src[1::2] = np.where(mask, pairs[:, 0:1], pairs[:, 1:2])
+    src = src[:n_children]
+
+    # every (child, gene) segment, in output order
+    k = np.arange(K)
+    seg_start = (base[src] + offs[src, k]).ravel()
+    seg_len = (offs[src, k + 1] - offs[src, k]).ravel()
+    seg_end = np.cumsum(seg_len)
+    total = int(seg_end[-1]) if len(seg_end) else 0
+    data = flat[np.repeat(seg_start - (seg_end - seg_len), seg_len) + np.arange(total)].tobytes()
+
+    child_off = np.zeros((n_children, K + 1), dtype=np.intp)
+    child_off[:, 1:] = seg_len.reshape(n_children, K).cumsum(axis=1)
+    child_base = np.concatenate(([0], child_off[:, -1].cumsum()[:-1]))
+
+    # donor: the child's own side of the pair unless it took more genes from the other
+    own = pairs.ravel()[:n_children]
+    other = pairs[:, ::-1].ravel()[:n_children]
+    from_own = np.where(src == own[:, None], seg_len.reshape(n_children, K), 0).sum(axis=1)
+    donors = np.where(2 * from_own >= child_off[:, -1], own, other)
+    children = [
+        Genotype(nts, tuple(child_off[c].tolist()), array('B', data[child_base[c]:child_base[c] + child_off[c, -1]]))
+        for c in range(n_children)
+    ]
+    return children, donors.tolist()
+
+def _mutate_many(genotypes, rng, mutations=1):
+    """
+    Vectorized counterpart of mutate_genotype for many packed genotypes: each gets
+    `mutations` random point mutations to a different production where one exists.
+    """
+    if not genotypes:
+        return []
+    nts = genotypes[0].nts
+    n_choices = np.array([TABLES.n_prods[TABLES.nt_id[nt]] for nt in nts])
+    flat, base, lengths, offs = _pack(genotypes)
+    buf = flat.copy()
+    rows = np.flatnonzero(lengths > 0)
+    for _ in range(mutations):
+        local = (rng.random(len(rows)) * lengths[rows]).astype(np.intp)
+        gene = (offs[rows, 1:] <= local[:, None]).sum(axis=1) # non-terminal of each position
+        pos = base[rows] + local
+        choices = n_choices[gene]
+        old = buf[pos].astype(np.intp)
+        new = (rng.random(len(rows)) * choices).astype(np.intp)
+        same = (new == old) & (choices > 1)
+        new[same] = (old[same] + 1) % choices[same] # ensure a different rule choice
+        buf[pos] = new
+    data = buf.tobytes()
+    return [Genotype(g.nts, g.offsets, array('B', data[b:b + n])) for g, b, n in zip(genotypes, base, lengths)]
+
+def _breed_shard_task(args):
+    """Pool task: breed one shard of offspring with its own seed."""
+    parents, n_children, seed = args
+    rng = np.random.default_rng(seed)
+    children, donors = _crossover_many(parents, n_children, rng)
+    return _mutate_many(children, rng), donors
+
+def breed_batch(population, cfg, rng, pool=None, shards=1, max_retries=100, stats=None):
+    """
+    Batch counterpart of reproduce(): elites plus all offspring for a generation in one call.
+    population must be sorted best-first with packed Genotypes; rng is a numpy Generator.
+    With a pool and shards > 1, offspring are bred across the workers in parallel.
+    Uniqueness is kept as in reproduce(): duplicates are re-mutated (in vectorized rounds,
+    at most max_retries) until they are new. Offspring record their main parent, as in reproduce().
+    """
+    new_pop = [dict(ind) for ind in population[:cfg.elitism_count]]
+    parents = [ind['genotype'] for ind in population[:cfg.top_parents_count]]
+    n_children = cfg.population_size - len(new_pop)
+    if n_children <= 0:
+        return new_pop[:cfg.population_size]
+    if not all(isinstance(g, Genotype) and g.nts == parents[0].nts for g in parents):
+        return reproduce(population, cfg, stats=stats) # dict genotypes: fall back to the serial loop
+
+    if pool is not None and shards > 1:
+        sizes = [n_children // shards + (1 if i < n_children % shards else 0) for i in range(shards)]
+        seeds = rng.integers(0, 2**63, size=shards)
+        tasks = [(parents, n, s) for n, s in zip(sizes, seeds) if n]
+        parts = pool.map(_breed_shard_task, tasks)
+        children = [g for part, _ in parts for g in part]
+        donors = [d for _, part in parts for d in part]
+    else:
+        children, donors = _crossover_many(parents, n_children, rng)
+        children = _mutate_many(children, rng)
+
+    genome_set = {genotype_key(ind['genotype']) for ind in new_pop}
+    pending = []
+    for i, g in enumerate(children):
+        if g in genome_set:
+            pending.append(i)
+        else:
+            genome_set.add(g)
+    duplicates, retries = len(pending), 0
+    for _ in range(max_retries):
+        if not pending:
+            break
+        retries += len(pending)
+        still = []
+        for i, g in zip(pending, _mutate_many([children[i] for i in pending], rng)):
+            children[i] = g
+            if g in genome_set:
+                still.append(i)
+            else:
+                genome_set.add(g)
+        pending = still
+    if stats is not None:
+        count_duplicates(stats, duplicates, retries, len(pending))
+
+    new_pop.extend({'genotype': g, 'phenotype': None, 'fitness': None, 'parent': parents[d]}
+                   for g, d in zip(children, donors))
+    return new_pop
@@ -0,0 +1,128 @@
+import copy, logging, math
+from multiprocessing import Pool, cpu_count
+from contextlib import nullcontext
+from src.population import initialise_population, genotype_key
+from src.evaluation import evaluate_population, exact_top
+from src.genetic_operators import reproduce
+from src.shared_data import SharedDataset, init_worker
+from src.fitness_store import open_fitness_store
+
+logger = logging.getLogger(__name__)
+
+class InlinePool:
+    """Runs pool tasks in the calling process, e.g. in tests."""
+    def map(self, fn, args):
+        return [fn(a) for a in args]
+
+def _portable(ind):
+    """The parts of an individual worth keeping once it leaves its island."""
+    portable = {"genotype": ind["genotype"], "phenotype": ind["phenotype"], "fitness": ind["fitness"]}
+    if "scaling" in ind: # linear scaling coefficients (see evaluation.fit_scaling)
+        portable["scaling"] = ind["scaling"]
+    return portable
+
+def island_configs(cfg):
+    """Split cfg.population_size across cfg.island_count islands (remainder to the first ones)."""
+    n = cfg.island_count
+    configs = []
+    for i in range(n):
+        island_cfg = copy.copy(cfg)
+        island_cfg.population_size = cfg.population_size // n + (1 if i < cfg.population_size % n else 0)
+        configs.append(island_cfg)
+    return configs
+
+def migrate(islands, migrants):
+    """
+    Ring migration between best-first sorted islands: island i's top `migrants` replace the
+    worst of island i + 1. A migrant whose genotype the receiving island already holds is
+    not sent, so migration never duplicates an individual within an island.
+    """
+    outgoing = [[_portable(ind) for ind in population[:migrants]] for population in islands]
+    migrated = []
+    for i, population in enumerate(islands):
+        present = {genotype_key(ind["genotype"]) for ind in population}
+        arrivals = []
+        for ind in outgoing[i - 1]:
+            key = genotype_key(ind["genotype"])
+            if key not in present:
+                present.add(key)
+                arrivals.append(ind)
+        population = population[:len(population) - len(arrivals)] + arrivals
+        population.sort(key=lambda g: g['fitness'])
+        migrated.append(population)
+    return migrated
+
+def _loosest(cutoffs):
+    """One early-abort cutoff for all islands: the largest, or None if any island has none."""
+    if any(c is None for c in cutoffs):
+        return None
+    return max(cutoffs, key=lambda c: math.inf if math.isnan(c) else c)
+
+def _evaluate_islands(islands, X, y, cfg, pool, fitness_cache, expression_cache, store, fingerprint_cache, cutoffs):
+    """
+    Score every island's population in one evaluate_population call, so all islands'
+    pending genotypes share the pool (and each other's cache hits). Early abort uses the
+    loosest island cutoff, which only ever leaves more individuals exactly scored.
+    """
+    merged = evaluate_population([ind for population in islands for ind in population], X, y, cfg, pool,
+                                 fitness_cache, expression_cache, store, fingerprint_cache, cutoff=_loosest(cutoffs))
+    split, lo = [], 0
+    for population in islands:
+        split.append(merged[lo:lo + len(population)])
+        lo += len(population)
+    return split
+
+def run_islands(X, y, cfg):
+    """
+    Island-model GE: cfg.island_count subpopulations evolve side by side, exchanging their
+    top cfg.migrants individuals along a ring every cfg.migration_interval generations.
+    Selection, migration and reproduction are per island, while every generation's
+    evaluation covers all islands at once on one shared worker pool. Returns the best ten
+    individuals over all islands, like run_ge.
+    """
+    n = cfg.island_count
+    configs = island_configs(cfg)
+    store = open_fitness_store(X, y, cfg)
+    with (store if store is not None else nullcontext()), SharedDataset(X, y) as shared, \
+         Pool(processes=cpu_count(), initializer=init_worker, initargs=(shared.spec, cfg)) as pool:
+        fitness_cache, expression_cache = {}, {}
+        fingerprint_cache = {} if cfg.dedup_probe_rows else None
+
+        def evaluate(islands):
+            return _evaluate_islands(islands, X, y, cfg, pool, fitness_cache, expression_cache, store,
+                                     fingerprint_cache, cutoffs)
+
+        def exact(population, island_cfg, count):
+            return exact_top(population, count, X, y, island_cfg, pool, fitness_cache,
+                             expression_cache, store, fingerprint_cache)
+
+        islands = [initialise_population(island_cfg) for island_cfg in configs]
+        cutoffs = [None] * n
+        for gen in range(cfg.generations):
+            islands = evaluate(islands)
+            for i, island_cfg in enumerate(configs):
+                islands[i] = exact(islands[i], island_cfg, max(island_cfg.elitism_count, cfg.migrants))
+                logger.info("Island %d Gen %d: Best Fitness %.4f Expr: %s",
+                            i, gen, islands[i][0]['fitness'], islands[i][0]['phenotype'])
+
+            # --- Migration: each island's best replace the worst of the next one ---
+            interval = cfg.migration_interval
+            if interval and (gen + 1) % interval == 0 and gen + 1 < cfg.generations:
+                islands = migrate(islands, cfg.migrants)
+
+            for i, island_cfg in enumerate(configs):
+                if cfg.early_abort:
+                    cutoffs[i] = islands[i][min(island_cfg.top_parents_count, len(islands[i])) - 1]['fitness']
+                islands[i] = reproduce(islands[i], island_cfg)
+
+        islands = evaluate(islands)
+        population = [_portable(ind) for i, island_cfg in enumerate(configs)
+                      for ind in exact(islands[i], island_cfg, 10)[:10]]
+
+    population.sort(key=lambda g: g['fitness'])
+    best_ten = population[0:10]
+    logger.info("Best 10 Genomes (%d islands):", n)
+    for i, genome in enumerate(best_ten):
+        logger.info("Rank %d: Fitness %.4f Expr: %s", i+1, genome['fitness'], genome['phenotype'])
+    logger.info("\n")
+    return best_ten
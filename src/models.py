@@ -1,4 +1,6 @@
-import json, logging, os, re
+import hashlib, json, logging, os, pickle, re
+from array import array
+from bisect import bisect_right
 from math import ceil
 from typing import List, Dict
 
@@ -21,12 +23,83 @@ class Grammar:
             bnf_filepath: Path to the .bnf grammar file. If None, creates empty grammar.
         """
         self._rules: Dict[Symbol, List[Production]] = {}
+        self._compiled = None
         
         if bnf_filepath and os.path.exists(bnf_filepath):
             self._parse_bnf(bnf_filepath)
         elif bnf_filepath:
             logger.warning(f"Grammar file not found: {bnf_filepath}")
     
+    CACHE_VERSION = 4 # bump when the cached form changes
+
+    @classmethod
+    def load(cls, bnf_filepath: str, cache_path: str = None) -> "Grammar":
+        """
+        Load a Grammar through a compiled cache (a pickle of the parsed rules next to the
+        BNF file in __pycache__, unless cache_path is given). The cache is used while
+        the BNF file's size and mtime are unchanged, or, if only the mtime moved, while
+        its SHA-1 still matches; otherwise the BNF is parsed and the cache rewritten.
+        An unwritable cache location just means parsing on every load.
+        """
+        if cache_path is None:
+            directory, name = os.path.split(os.path.abspath(bnf_filepath))
+            cache_path = os.path.join(directory, "__pycache__", f"{name}.pickle")
+        try:
+            stat = os.stat(bnf_filepath)
+        except OSError:
+            return cls(bnf_filepath) # logs the missing file
+        stamp = (stat.st_size, stat.st_mtime_ns)
+
+        cached = None
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            pass
+        if cached is not None and cached.get("version") == cls.CACHE_VERSION:
+            if cached["stamp"] == stamp:
+                return cls._from_rules(cached["rules"], cached["compiled"])
+            if cached["sha1"] == cls._file_sha1(bnf_filepath): # touched, not edited
+                cached["stamp"] = stamp
+                cls._write_cache(cache_path, cached)
+                return cls._from_rules(cached["rules"], cached["compiled"])
+
+        grammar = cls(bnf_filepath)
+        cls._write_cache(cache_path, {"version": cls.CACHE_VERSION, "stamp": stamp,
+                                      "sha1": cls._file_sha1(bnf_filepath), "rules": grammar._rules,
+                                      "compiled": grammar.compiled})
+        return grammar
+
+    @classmethod
+    def _from_rules(cls, rules, compiled=None):
+        grammar = cls()
+        grammar._rules = rules
+        grammar._compiled = compiled
+        return grammar
+
+    @property
+    def compiled(self) -> "CompiledGrammar":
+        """The grammar as dense integer tables, built on first use (and after any edit)."""
+        if self._compiled is None:
+            self._compiled = CompiledGrammar(self._rules)
+        return self._compiled
+
+    @staticmethod
+    def _file_sha1(path):
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    @staticmethod
+    def _write_cache(cache_path, payload):
+        tmp = f"{cache_path}.tmp-{os.getpid()}"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path) # atomic, concurrent workers may race here
+        except OSError as e:
+            logger.debug("Grammar cache not written (%s): %s", cache_path, e)
+
     def _parse_bnf(self, filepath: str):
         """Parse a BNF grammar file and populate the rules dictionary."""
         with open(filepath, 'r') as f:
@@ -136,6 +209,7 @@ class Grammar:
     def __setitem__(self, key: Symbol, value: List[Production]):
         """Enable dict-like assignment: grammar[key] = value"""
         self._rules[key] = value
+        self._compiled = None # tables are rebuilt on next use
     
     def __contains__(self, key: Symbol) -> bool:
         """Enable 'in' operator: key in grammar"""
@@ -167,6 +241,42 @@ class Grammar:
             lines.append(f"<{nt}> ::= {prods_str}")
         return "\n".join(lines)
 
+class CompiledGrammar:
+    """
+    A grammar compiled to dense integer tables, so mapping, initialisation and mutation
+    never look symbols up by name. Non-terminals get ids 0..n-1 in sorted order (the
+    same order as Genotype.nts); terminals are stored in productions as ~terminal_id
+    (negative), so `code >= 0` tells the two apart.
+    """
+    __slots__ = ('nts', 'nt_id', 'terminals', 'productions', 'n_prods', 'children', 'arity', 'nonrecursive')
+
+    def __init__(self, rules):
+        self.nts = tuple(sorted(rules))
+        self.nt_id = {nt: i for i, nt in enumerate(self.nts)}
+        terminal_id = {}
+        productions = []
+        for nt in self.nts:
+            prods = []
+            for prod in rules[nt]:
+                prods.append(tuple(self.nt_id[sym] if sym in self.nt_id else ~terminal_id.setdefault(sym, len(terminal_id))
+                                   for sym in prod))
+            productions.append(tuple(prods))
+        self.terminals = tuple(terminal_id) # insertion order == id order
+        self.productions = tuple(productions) # productions[nt id][prod idx] -> tuple of symbol codes
+        self.n_prods = tuple(len(prods) for prods in productions)
+        self.children = tuple(tuple(tuple(code for code in p if code >= 0) for p in prods) for prods in productions) # child nt ids
+        self.arity = tuple(tuple(len(c) for c in children) for children in self.children)
+        # productions whose own non-terminal does not appear on the right-hand side (see choose_production_id)
+        self.nonrecursive = tuple(tuple(j for j, p in enumerate(prods) if i not in p) for i, prods in enumerate(productions))
+
+    def symbol(self, code):
+        """Name of a symbol code (non-terminal id or ~terminal id)."""
+        return self.nts[code] if code >= 0 else self.terminals[~code]
+
+def compile_grammar(grammar) -> CompiledGrammar:
+    """CompiledGrammar for a Grammar (cached on it) or a plain {nt: productions} dict."""
+    return grammar.compiled if isinstance(grammar, Grammar) else CompiledGrammar(grammar)
+
 class EvolutionConfig:
     def __init__(self, filepath="./config.json"):
         with open(filepath, "r") as f:
@@ -186,6 +296,84 @@ class EvolutionConfig:
         self.parent_selection_size = opts.get("parent_selection_size", 0.1)
         self.mutations_per_genome = opts.get("muatations_per_genome", 1)
 
+        # Persistent fitness store shared across runs (disabled when path is null)
+        store = data.get("fitness_store", {})
+        self.fitness_store_path = store.get("path")
+        self.fitness_store_max_entries = store.get("max_entries", 1_000_000)
+
+        # Behavioural dedup: fingerprint phenotypes on a few probe rows (0 disables)
+        dedup = data.get("dedup", {})
+        self.dedup_probe_rows = dedup.get("probe_rows", 0)
+        self.dedup_digits = dedup.get("digits", 9)
+
+        # Per-worker memo of subtree output vectors over X_train (0 disables)
+        self.subtree_cache_mb = data.get("subtree_cache", {}).get("budget_mb", 0)
+
+        # Engine: "generational" (run_ge) or "steady_state" (asynchronous, no generation barrier)
+        self.mode = data.get("mode", "generational")
+        self.steady_state_inflight = data.get("steady_state", {}).get("inflight_per_worker", 2)
+
+        # Island model: count > 1 evolves that many subpopulations, evaluated on one shared pool
+        islands = data.get("islands", {})
+        self.island_count = islands.get("count", 1)
+        self.migration_interval = islands.get("migration_interval", 5)
+        self.migrants = islands.get("migrants", 2)
+
+        # Racing: score new individuals on growing data subsets (fractions of X_train), keeping
+        # the best keep_fraction each rung; only survivors get a full-data RMSE
+        racing = data.get("racing", {})
+        self.racing_subsets = racing.get("subset_fractions", []) if racing.get("enabled", False) else []
+        self.racing_keep = racing.get("keep_fraction", 0.5)
+
+        # Dataset loading: preprocessed splits cached as .npy under cache_dir (None disables)
+        dataset = data.get("dataset", {})
+        self.dataset_cache_dir = dataset.get("cache_dir")
+        self.dataset_chunk_rows = dataset.get("chunk_rows", 100_000)
+        self.dataset_dtype = dataset.get("dtype", "float64")
+
+        # Early abort: stop an RMSE once it provably exceeds the previous worst-parent fitness
+        early_abort = data.get("early_abort", {})
+        self.early_abort = early_abort.get("enabled", False)
+        self.early_abort_chunk_rows = early_abort.get("chunk_rows", 1024)
+
+        # Linear scaling: fitness is the RMSE of the least-squares a*f(X)+b, not of f(X) itself;
+        # (a, b) are kept on the top individuals as 'scaling' and applied to their predictions
+        self.linear_scaling = data.get("linear_scaling", {}).get("enabled", False)
+
+        # Checkpoints: run state written atomically every `every` generations (0 disables)
+        checkpoint = data.get("checkpoint", {})
+        self.checkpoint_path = checkpoint.get("path", "cache/checkpoint.bin")
+        self.checkpoint_every = checkpoint.get("every", 0)
+        self.checkpoint_include_cache = checkpoint.get("include_cache", False)
+
+        # Telemetry: per-generation metrics as JSONL (None disables)
+        self.telemetry_path = data.get("telemetry", {}).get("path")
+
+        # Worker profiling: "off", "cprofile" or "sample" (overridden by $GE_PROFILE)
+        profiling = data.get("profiling", {})
+        self.profile_mode = profiling.get("mode", "off")
+        self.profile_dir = profiling.get("dir", "cache/profile")
+        self.profile_interval_ms = profiling.get("sample_interval_ms", 5)
+        self.profile_top = profiling.get("top", 20)
+
+        # Distributed evaluation: run_ge serves its pool tasks over TCP to worker.py processes
+        # instead of a local Pool (no default authkey: set one here or in $GE_CLUSTER_KEY)
+        distributed = data.get("distributed", {})
+        self.distributed = distributed.get("enabled", False)
+        self.cluster_host = distributed.get("host", "127.0.0.1")
+        self.cluster_port = distributed.get("port", 5557)
+        self.cluster_authkey = distributed.get("authkey")
+        self.cluster_batch_size = distributed.get("batch_size", 32)
+        self.cluster_task_timeout = distributed.get("task_timeout_s", 300)
+
+        # Incremental evaluation: offspring reuse their parent's derivation and node outputs
+        self.incremental = data.get("incremental", {}).get("enabled", False)
+
+        # Offspring generation: batch breeds a whole generation with numpy; shards > 1 splits it over the pool
+        breeding = data.get("breeding", {})
+        self.batch_breeding = breeding.get("batch", False)
+        self.breeding_shards = breeding.get("shards", 0)
+
         logger.info("EvolutionConfig initialized with: generations=%d, population_size=%d, genome_length=%d, max_depth=%d",
                     self.generations, self.population_size, self.genome_length, self.max_depth)
         logger.info("EvolutionConfig options: elitism_percentage=%.2f, parent_selection_size=%.2f, mutations_per_genome=%d\n",
@@ -215,34 +403,136 @@ class TreeNode:
         Render the tree as a mathematical infix expression.
         Handles unary pre-ops (sin, cos, exp, log, inv), binary ops (+,-,*,/),
         and structural wrappers (start, seq, parentheses) gracefully.
+        Walks the tree with an explicit stack, so deep trees never hit the recursion limit.
         """
-        sym = self.symbol
-
-        # Terminals
-        if not self.children:
-            return str(sym)
-
-        # Structural wrappers
-        if sym == 'start':
-            return self.children[0].to_infix() if self.children else ''
-        if sym == 'seq':
-            return ', '.join(child.to_infix() for child in self.children)
-        if sym in ('(', ')'):
-            return self.children[0].to_infix() if self.children else ''
-
-        # Unary pre-ops
-        if sym in {'sin', 'cos', 'exp', 'log', 'inv'}:
-            arg = self.children[0].to_infix() if self.children else ''
-            return f"{sym}({arg})"
-
-        # Binary arithmetic ops
-        if sym in {'+', '-', '*', '/'} and len(self.children) >= 2:
-            left = self.children[0].to_infix()
-            right = self.children[1].to_infix()
-            return f"({left} {sym} {right})"
-
-        # Fallback: prefix-style for anything unexpected
-        return f"{sym}({', '.join(child.to_infix() for child in self.children)})"
+        rendered = [] # finished children, in order
+        stack = [(self, False)]
+        while stack:
+            node, ready = stack.pop()
+            if not ready:
+                stack.append((node, True)) # render once its children are done
+                stack.extend((child, False) for child in reversed(node.children))
+                continue
+            n = len(node.children)
+            args = rendered[len(rendered) - n:]
+            del rendered[len(rendered) - n:]
+            rendered.append(_infix(node.symbol, args))
+        return rendered[0]
+
+def _infix(sym, args):
+    """Infix text of a node with symbol sym whose children rendered as args."""
+    # Terminals
+    if not args:
+        return str(sym)
+
+    # Structural wrappers
+    if sym in ('start', '(', ')'):
+        return args[0]
+    if sym == 'seq':
+        return ', '.join(args)
+
+    # Unary pre-ops
+    if sym in {'sin', 'cos', 'exp', 'log', 'inv'}:
+        return f"{sym}({args[0]})"
+
+    # Binary arithmetic ops
+    if sym in {'+', '-', '*', '/'} and len(args) >= 2:
+        return f"({args[0]} {sym} {args[1]})"
+
+    # Fallback: prefix-style for anything unexpected
+    return f"{sym}({', '.join(args)})"
+
+class Genotype:
+    """
+    Compact, immutable DSGE genotype. All gene lists are packed into one array('B')
+    buffer, with per-non-terminal offsets into it. The hash is computed once, equality
+    is a buffer comparison, and derived genotypes (mutation, crossover, extension)
+    copy the buffer only when they actually change it.
+    Offers a read-only dict-like view (get/keys/items/[nt]) for compatibility.
+    """
+    __slots__ = ('nts', 'offsets', 'buf', '_hash')
+
+    def __init__(self, nts, offsets, buf):
+        self.nts = nts           # tuple of non-terminals, sorted
+        self.offsets = offsets   # tuple, genes of nts[i] are buf[offsets[i]:offsets[i+1]]
+        self.buf = buf           # array('B') of production indices
+        self._hash = None
+
+    @classmethod
+    def from_dict(cls, genes, nts=None):
+        nts = tuple(sorted(genes.keys())) if nts is None else tuple(nts)
+        buf = array('B')
+        offsets = [0]
+        for nt in nts:
+            buf.extend(genes.get(nt, []))
+            offsets.append(len(buf))
+        return cls(nts, tuple(offsets), buf)
+
+    def to_dict(self):
+        return {nt: self.buf[self.offsets[i]:self.offsets[i + 1]].tolist() for i, nt in enumerate(self.nts)}
+
+    def span(self, nt):
+        """(start, end) of nt's genes in buf."""
+        i = self.nts.index(nt)
+        return self.offsets[i], self.offsets[i + 1]
+
+    def locate(self, pos):
+        """Non-terminal and local gene position of flat buffer position pos."""
+        i = bisect_right(self.offsets, pos) - 1
+        return self.nts[i], pos - self.offsets[i]
+
+    def replace(self, changes):
+        """New genotype with flat positions set per changes {pos: idx}; shares nts/offsets."""
+        if not changes:
+            return self
+        buf = array('B', self.buf)
+        for pos, idx in changes.items():
+            buf[pos] = idx
+        return Genotype(self.nts, self.offsets, buf)
+
+    # read-only dict-like interface
+    def get(self, nt, default=None):
+        if nt not in self.nts:
+            return default
+        a, b = self.span(nt)
+        return self.buf[a:b].tolist()
+
+    def __getitem__(self, nt):
+        if nt not in self.nts:
+            raise KeyError(nt)
+        return self.get(nt)
+
+    def __contains__(self, nt):
+        return nt in self.nts
+
+    def keys(self):
+        return self.nts
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.nts, self.offsets, self.buf.tobytes()))
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Genotype):
+            return NotImplemented
+        return self is other or (hash(self) == hash(other) and self.offsets == other.offsets
+                                 and self.nts == other.nts and self.buf == other.buf)
+
+    def __reduce__(self):
+        return (_genotype_from_bytes, (self.nts, self.offsets, self.buf.tobytes()))
+
+    def __repr__(self):
+        return f"Genotype({self.to_dict()})"
+
+def _genotype_from_bytes(nts, offsets, data):
+    return Genotype(nts, offsets, array('B', data))
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+import math
+import numpy as np
+
+EPS = 1e-10
+MAX_MAG = 1e6
+
+def clamp(v, m=MAX_MAG): # max magnitude in either direction
+    return max(min(v, m), -m)
+
+PRE_OPS = {
+    'sin': lambda x: math.sin(x),
+    'cos': lambda x: math.cos(x),
+    'exp': lambda x: clamp(math.exp(min(x, 70))), # min x, 70 to avoid overflow
+    'log': lambda x: math.log(max(x, EPS)), # log undefined for <=0, use EPS
+    'inv': lambda x: clamp(1.0 / max(abs(x), EPS) * (1 if x >= 0 else -1)) # safe inverse (avoid div by 0, but maintain sign)
+}
+
+def safe_div(a, b):
+    return clamp(a / max(abs(b), EPS) * (1 if b >= 0 else -1))
+
+# Column-wise equivalents of clamp/PRE_OPS/safe_div, applied to whole arrays at once
+def clamp_vec(v, m=MAX_MAG):
+    return np.clip(v, -m, m)
+
+VEC_PRE_OPS = {
+    'sin': np.sin,
+    'cos': np.cos,
+    'exp': lambda x: clamp_vec(np.exp(np.minimum(x, 70))),
+    'log': lambda x: np.log(np.maximum(x, EPS)),
+    'inv': lambda x: clamp_vec(1.0 / np.maximum(np.abs(x), EPS) * np.where(x >= 0, 1.0, -1.0))
+}
+
+def safe_div_vec(a, b):
+    return clamp_vec(a / np.maximum(np.abs(b), EPS) * np.where(b >= 0, 1.0, -1.0))
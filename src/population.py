@@ -1,9 +1,33 @@
-import random, re, os
+import random, re, os, zlib
+from bisect import bisect_left
+from contextlib import contextmanager
 from typing import List, Dict
-from src.models import TreeNode, Grammar
+from src.models import TreeNode, Grammar, Genotype, compile_grammar
+from src.bytecode import Program, tree_to_program
 
-# Initialize grammar from BNF file
-GRAMMAR = Grammar(os.path.join(os.path.dirname(__file__), "grammar.bnf"))
+# Initialize grammar from BNF file (through its compiled cache, see Grammar.load)
+GRAMMAR = Grammar.load(os.path.join(os.path.dirname(__file__), "grammar.bnf"))
+
+def genotype_key(genotype, grammar=GRAMMAR):
+    """Hashable cache key: the genotype packed as a Genotype over all of the grammar's non-terminals."""
+    if isinstance(genotype, Genotype):
+        return genotype
+    return Genotype.from_dict(genotype, sorted(grammar.keys()))
+
+@contextmanager
+def seeded_extension(genotype, grammar=GRAMMAR):
+    """
+    Seed the global random stream from the genotype's genes while mapping it, then restore
+    it. Gene-list extension then gives the same result in whichever worker evaluates the
+    genotype, so runs (and resumed runs) are reproducible.
+    """
+    key = genotype_key(genotype, grammar)
+    state = random.getstate()
+    random.seed(zlib.crc32(key.buf.tobytes(), zlib.crc32(repr(key.offsets).encode())))
+    try:
+        yield
+    finally:
+        random.setstate(state)
 
 def is_recursive(nt, prod):
     return nt in prod # return true is LHS is in RHS
@@ -12,97 +36,263 @@ def choose_production(grammar, nt, depth, max_depth):
     """
     Choose a production rule index for a non-terminal
     """
-    prods = grammar[nt] # get all posible productions for this non-terminal
+    tables = compile_grammar(grammar)
+    return choose_production_id(tables, tables.nt_id[nt], depth, max_depth)
+
+def choose_production_id(tables, i, depth, max_depth):
+    """choose_production on compiled tables, for non-terminal id i."""
     if depth >= max_depth: # at max depth, avoid recursive productions
-        nonrec = [i for i,p in enumerate(prods) if not is_recursive(nt, p)]
-        return random.choice(nonrec) if nonrec else random.randrange(len(prods))
-    return random.randrange(len(prods)) # otherwise choose any production
+        nonrec = tables.nonrecursive[i]
+        return random.choice(nonrec) if nonrec else random.randrange(tables.n_prods[i])
+    return random.randrange(tables.n_prods[i]) # otherwise choose any production
 
 def initialise_individual(grammar, start_nt, max_depth, rng=random):
     """
     Create a structured genotype: dict mapping non-terminals to lists of chosen productions.
     This aligns with DSGE where each non-terminal has its own gene list.
     """
-    genotype = {nt: [] for nt in grammar.keys()}
-    def expand(nt, depth):
-        idx = choose_production(grammar, nt, depth, max_depth)
-        genotype[nt].append(idx) # append index of rule chosen
-        prod = grammar[nt][idx]
-        for sym in prod:
-            if sym in grammar: # recursively built out non-terminals
-                expand(sym, depth+1)
-    expand(start_nt, 0)
-    return genotype # genotype is dict of lists of production indices for each non-terminal
+    tables = compile_grammar(grammar)
+    productions = tables.productions
+    genes = [[] for _ in tables.nts]
+    def expand(i, depth):
+        idx = choose_production_id(tables, i, depth, max_depth)
+        genes[i].append(idx) # append index of rule chosen
+        for code in productions[i][idx]:
+            if code >= 0: # recursively built out non-terminals
+                expand(code, depth+1)
+    expand(tables.nt_id[start_nt], 0)
+    return {nt: genes[tables.nt_id[nt]] for nt in grammar.keys()} # dict of lists of production indices for each non-terminal
 
-def map_genotype(grammar, genotype, start_nt, max_depth, expression_cache=None, rng=random):
+BINARY_OPS = ('+', '-', '*', '/')
+
+def _symbol(value):
+    return value if value.__class__ is str else value.symbol
+
+def _node(value):
+    return TreeNode(value) if value.__class__ is str else value
+
+def derive_tree(grammar, genotype, start_nt, max_depth, base=None, record=None):
     """
-    Map a genotype (list of production indices) to a phenotype tree (TreeNode).
-    The grammar determines arity: 'op' is binary, 'pre_op' is unary, 'var' and literals are terminals.
+    Map a genotype to its phenotype tree with an explicit stack (no recursion limit) and
+    without modifying the genotype. Returns (tree, extensions): extensions maps each
+    non-terminal whose gene list ran out to the production indices chosen past its end
+    (see extend_genotype), and is empty when the genes sufficed.
+    Terminals are carried as plain strings until they end up in the tree, so "(" / ")" and
+    the op / pre_op / var wrappers that collapse away never allocate a TreeNode.
+    With a base Derivation (e.g. the parent's), any derivation node that starts at the
+    same gene positions as one of the base's and reads no gene that differs from the
+    base genotype is taken over from the base, subtree included, instead of being derived
+    again. A record dict is filled with this genotype's own derivation nodes (see Derivation).
     """
-    # read positions index for each non-terminal's gene list
-    cursors = {nt: 0 for nt in grammar.keys()}
+    tables = compile_grammar(grammar)
+    nts, productions, n_prods, arity, terminals = (tables.nts, tables.productions, tables.n_prods,
+                                                   tables.arity, tables.terminals)
 
-    # key for cache is tuple of all non-terminals and their production indices
-    key = tuple((nt, tuple(genotype.get(nt, []))) for nt in sorted(grammar.keys()))
-    if expression_cache is not None and key in expression_cache: # we have already mapped this genotype
-        return expression_cache[key]
-
-    def expand(nt, depth):
-        prods = grammar[nt] # get productions for this non-terminal
-        cur = cursors[nt]   # current read position in gene list for this non-terminal (this tells us what rule to choose)
-        if cur < len(genotype.get(nt, [])):
-            idx = genotype[nt][cur] % len(prods)
-            cursors[nt] += 1
+    # where each non-terminal's genes are read from: a packed Genotype straight from its buffer
+    if isinstance(genotype, Genotype) and genotype.nts == nts:
+        offsets = genotype.offsets
+        seqs, starts = [genotype.buf] * len(nts), offsets
+        lens = [offsets[i + 1] - offsets[i] for i in range(len(nts))]
+    else:
+        seqs = [genotype.get(nt) or () for nt in nts]
+        starts, lens = [0] * len(nts), [len(seq) for seq in seqs]
+    cursors = [0] * len(nts) # read position in each non-terminal's gene list
+    extensions = {}
+    if base is not None:
+        reusable, unchanged = base.nodes, base.unchanged_span(genotype, nts)
+    entries = [] # cursors at entry of each node waiting to be built, when recording
+
+    # how each non-terminal's children collapse into the phenotype
+    expr_id, start_id = tables.nt_id.get("expr"), tables.nt_id.get("start")
+    passthrough = {tables.nt_id[nt] for nt in ("op", "pre_op", "var") if nt in tables.nt_id}
+    collapsing = passthrough | {expr_id, start_id} # a lone child becomes the result itself
+    # per production: the terminal it collapses to when it is just one (else None), and its
+    # child non-terminals in stack push order (right to left, so they are expanded left to right)
+    leaves = [[terminals[~p[0]] if len(p) == 1 and p[0] < 0 and i in collapsing else None for p in prods]
+              for i, prods in enumerate(productions)]
+    pushes = [[c[::-1] for c in children] for children in tables.children]
+    # and its parts with the terminals filled in, plus the positions its children's values go to
+    templates = [[[None if code >= 0 else terminals[~code] for code in p] for p in prods] for prods in productions]
+    slots = [[[pos for pos, code in enumerate(p) if code >= 0] for p in prods] for prods in productions]
+
+    values = [] # finished subtrees, a str for a terminal not yet turned into a TreeNode
+    width = len(nts)
+    stack = [tables.nt_id[start_nt]] # nt id to expand, or ~(idx * width + nt id) to build it
+    depth = 0 # build frames on the stack, i.e. the depth of the next expansion
+    while stack:
+        frame = stack.pop()
+        if frame >= 0:
+            i = frame
+            if base is not None:
+                hit = reusable.get((i, tuple(cursors)))
+                if hit is not None and unchanged(cursors, hit[1]): # same genes, same subtree
+                    values.append(hit[0])
+                    cursors[:] = hit[1]
+                    continue
+            if record is not None:
+                entries.append(tuple(cursors))
+            cur = cursors[i]
+            cursors[i] = cur + 1
+            if cur < lens[i]:
+                idx = seqs[i][starts[i] + cur] % n_prods[i]
+            else:
+                # Gene list exhausted: choose a new production (DSGE behavior) and report it
+                idx = choose_production_id(tables, i, depth, max_depth)
+                extensions.setdefault(nts[i], []).append(idx)
+            leaf = leaves[i][idx]
+            if leaf is not None: # a single terminal, passed up as is
+                values.append(leaf)
+                if record is not None:
+                    entries.pop() # leaves are cheaper to derive than to look up
+                continue
+            stack.append(~(idx * width + i)) # build once the children below are done
+            stack.extend(pushes[i][idx])
+            depth += 1
+            continue
+
+        # Build: the production's non-terminal children are the top arity values
+        depth -= 1
+        idx, i = divmod(~frame, width)
+        n = arity[i][idx]
+        if not n:
+            parts = templates[i][idx]
+        elif n == len(productions[i][idx]):
+            parts = values[-n:]
         else:
-            # Dynamically extend gene list for this non-terminal when exhausted (DSGE behavior)
-            idx = choose_production(grammar, nt, depth, max_depth)
-            genotype.setdefault(nt, []).append(idx)
-            cursors[nt] += 1
-
-        prod = prods[idx]
-
-        # Build subtree according to the production
-        # Productions are sequences of symbols; we recursively expand non-terminals
-        nodes = []
-        for sym in prod:
-            if sym in grammar: # non-terminal
-                nodes.append(expand(sym, depth+1))
-            else: # terminal
-                nodes.append(TreeNode(sym))
+            parts = list(templates[i][idx])
+            for pos, value in zip(slots[i][idx], values[-n:]):
+                parts[pos] = value
+        if n:
+            del values[-n:]
 
         # Collapse parentheses patterns like ["(", expr, op, expr, ")"] into op node
-        if nt == "expr":
-            # Handle parenthesized binary
-            if len(nodes) == 5 and nodes[0].symbol == "(" and nodes[4].symbol == ")":
-                return TreeNode(nodes[2].symbol, [nodes[1], nodes[3]])
-            if len(nodes) == 4 and nodes[1].symbol == "(" and nodes[3].symbol == ")":
-                return TreeNode(nodes[0].symbol, [nodes[2]])
-            if len(nodes) == 3 and nodes[1].symbol in ['+', '-', '*', '/']:
-                return TreeNode(nodes[1].symbol, [nodes[0], nodes[2]])
-            if len(nodes) == 1:
-                return nodes[0]
-            return TreeNode("seq", nodes)
-
-        if nt == "op" or nt == "pre_op" or nt == "var":
-            return nodes[0]
-        if nt == "start":
-            return nodes[0] if nodes else TreeNode("seq", [])
-
-        return TreeNode(nt, nodes)
-
-    tree = expand(start_nt, 0)
-    
+        if i == expr_id:
+            k = len(parts)
+            if k == 5 and _symbol(parts[0]) == "(" and _symbol(parts[4]) == ")":
+                value = TreeNode(_symbol(parts[2]), [_node(parts[1]), _node(parts[3])])
+            elif k == 4 and _symbol(parts[1]) == "(" and _symbol(parts[3]) == ")":
+                value = TreeNode(_symbol(parts[0]), [_node(parts[2])])
+            elif k == 3 and _symbol(parts[1]) in BINARY_OPS:
+                value = TreeNode(_symbol(parts[1]), [_node(parts[0]), _node(parts[2])])
+            elif k == 1:
+                value = parts[0]
+            else:
+                value = TreeNode("seq", [_node(p) for p in parts])
+        elif i in passthrough:
+            value = parts[0]
+        elif i == start_id:
+            value = parts[0] if parts else TreeNode("seq", [])
+        else:
+            value = TreeNode(nts[i], [_node(p) for p in parts])
+        values.append(value)
+        if record is not None:
+            record[(i, entries.pop())] = (value, tuple(cursors))
+
+    return _node(values.pop()), extensions
+
+class Derivation:
+    """
+    A mapped genotype kept as the base for incrementally mapping its offspring (see
+    derive_tree): the genotype (extended as mapping needed), its phenotype tree, and its
+    non-leaf derivation nodes as {(nt id, gene cursors at entry): (phenotype value, cursors at exit)}.
+    The phenotype values are shared with every tree derived from this base, so node
+    outputs computed for them (see src.bytecode.tree_outputs) carry over too.
+    """
+    __slots__ = ('genotype', 'tree', 'nodes')
+
+    def __init__(self, grammar, genotype, start_nt, max_depth):
+        self.nodes = {}
+        self.tree, extensions = derive_tree(grammar, genotype, start_nt, max_depth, record=self.nodes)
+        self.genotype = extend_genotype(genotype, extensions)
+
+    def unchanged_span(self, genotype, nts):
+        """
+        A test unchanged(entry, exit) telling whether genotype reads exactly the base's
+        genes between two cursor vectors (per non-terminal, in nts order).
+        """
+        changed, common = [], []
+        for nt in nts:
+            ours, theirs = genotype.get(nt) or (), self.genotype.get(nt) or ()
+            n = min(len(ours), len(theirs))
+            changed.append([p for p in range(n) if ours[p] != theirs[p]])
+            common.append(n) # genes past here are missing on one side
+        def unchanged(entry, exit):
+            for k, (a, b) in enumerate(zip(entry, exit)):
+                if a < b:
+                    if b > common[k]:
+                        return False
+                    diffs = changed[k]
+                    j = bisect_left(diffs, a)
+                    if j < len(diffs) and diffs[j] < b:
+                        return False
+            return True
+        return unchanged
+
+def extend_genotype(genotype, extensions):
+    """
+    The genotype with derive_tree's extensions appended to its gene lists: a new dict or
+    Genotype (over the same non-terminals), or the genotype itself if there are none.
+    """
+    if not extensions:
+        return genotype
+    if isinstance(genotype, Genotype):
+        genes = genotype.to_dict()
+    else:
+        genes = {nt: list(seq) for nt, seq in genotype.items()}
+    for nt, extra in extensions.items():
+        genes.setdefault(nt, []).extend(extra)
+    return Genotype.from_dict(genes, genotype.nts) if isinstance(genotype, Genotype) else genes
+
+def map_genotype(grammar, genotype, start_nt, max_depth, expression_cache=None, rng=random,
+                 flat=False, feature_names=None, return_genotype=False):
+    """
+    Map a genotype (list of production indices) to a phenotype tree (TreeNode).
+    The grammar determines arity: 'op' is binary, 'pre_op' is unary, 'var' and literals are terminals.
+    With flat=True the phenotype is returned (and cached) as a postfix bytecode Program,
+    with variables resolved against feature_names.
+    The genotype is never modified; when gene lists run out they are extended with new
+    choices, so pass return_genotype=True to get (phenotype, extended genotype) back.
+    """
+    key = genotype_key(genotype, grammar)
+    if expression_cache is not None and key in expression_cache: # we have already mapped this genotype
+        cached = expression_cache[key]
+        if flat and not isinstance(cached, Program):
+            cached = tree_to_program(cached, feature_names)
+        elif not flat and isinstance(cached, Program):
+            cached = cached.to_tree(feature_names)
+        return (cached, genotype) if return_genotype else cached
+
+    tree, extensions = derive_tree(grammar, genotype, start_nt, max_depth)
+    if flat:
+        tree = tree_to_program(tree, feature_names)
+
+    if extensions: # keep the original object unless mapping had to extend it
+        genotype = extend_genotype(genotype, extensions)
+        key = genotype_key(genotype, grammar)
+
     # Update shared cache
-    final_key = tuple((nt, tuple(genotype.get(nt, []))) for nt in sorted(grammar.keys()))
     if expression_cache is not None:
-        expression_cache[final_key] = tree
-        
-    return tree
+        expression_cache[key] = tree
+
+    return (tree, genotype) if return_genotype else tree
+
+def map_genotypes(grammar, genotypes, start_nt, max_depth, expression_cache=None,
+                  flat=False, feature_names=None):
+    """
+    Map many genotypes, as [(phenotype, extended genotype)]. Each one's extension is seeded
+    from its own genes (seeded_extension), so the results do not depend on batch order.
+    """
+    results = []
+    for genotype in genotypes:
+        with seeded_extension(genotype, grammar):
+            results.append(map_genotype(grammar, genotype, start_nt, max_depth, expression_cache,
+                                        flat=flat, feature_names=feature_names, return_genotype=True))
+    return results
 
 def initialise_population(config, start_nt="start", rng=random):
     """
     Create a list of individuals, each a dict:
-        { 'genotype': [...], 'phenotype': [...], 'fitness': None }
+        { 'genotype': Genotype, 'phenotype': None, 'fitness': None }
     """
     population = []
 
@@ -115,7 +305,7 @@ def initialise_population(config, start_nt="start", rng=random):
         )
 
         individual = {
-            "genotype": genotype,
+            "genotype": genotype_key(genotype),
             "phenotype": None,
             "fitness": None
         }
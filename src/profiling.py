@@ -0,0 +1,149 @@
+import collections, cProfile, glob, io, logging, os, pstats, sys, threading
+from multiprocessing import util
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "cprofile", "sample")
+ENV_VAR = "GE_PROFILE" # overrides cfg.profile_mode, e.g. GE_PROFILE=sample
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def profile_mode(cfg):
+    """The active profiling mode: $GE_PROFILE if set, else cfg.profile_mode."""
+    mode = os.environ.get(ENV_VAR) or getattr(cfg, 'profile_mode', 'off') or 'off'
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+    return mode
+
+class StackSampler(threading.Thread):
+    """
+    Low-overhead sampling profiler: a daemon thread that records the target thread's
+    stack every `interval` seconds, keeping only stacks that run code from src/ inside
+    the Pool worker loop (so a worker idling on the task queue is not counted). Stacks are folded as
+    "outer;...;inner" strings, the input format of flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, interval, target=None):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.target = target if target is not None else threading.main_thread().ident
+        self.counts = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack, ours = [], False
+            while frame is not None:
+                code = frame.f_code
+                ours = ours or code.co_filename.startswith(SRC_DIR)
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                if code.co_name == "worker" and code.co_filename.endswith("pool.py"):
+                    break # frames below are the parent's, inherited through fork
+                frame = frame.f_back
+            if ours:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+
+def _worker_path(directory, ext):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"worker-{os.getpid()}.{ext}")
+
+def start_worker_profiler(cfg):
+    """
+    Called from the Pool initializer: start profiling this worker if enabled. The profile
+    is written to cfg.profile_dir when the worker exits cleanly (pool.close(); pool.join()).
+    """
+    mode = profile_mode(cfg)
+    if mode == "off":
+        return
+    directory = cfg.profile_dir
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        def dump():
+            profiler.disable()
+            profiler.dump_stats(_worker_path(directory, "pstats"))
+    else:
+        sampler = StackSampler(cfg.profile_interval_ms / 1000.0)
+        sampler.start()
+        def dump():
+            sampler.stop()
+            with open(_worker_path(directory, "folded"), "w") as f:
+                for stack, count in sampler.counts.items():
+                    f.write(f"{stack} {count}\n")
+    util.Finalize(None, dump, exitpriority=10) # runs in the worker's clean shutdown
+
+def prepare_run(cfg):
+    """Parent side, before the pool starts: create cfg.profile_dir and clear old worker files."""
+    mode = profile_mode(cfg)
+    if mode == "off":
+        return mode
+    os.makedirs(cfg.profile_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(cfg.profile_dir, "worker-*.*")):
+        os.remove(path)
+    logger.info("Profiling workers (%s) into %s", mode, cfg.profile_dir)
+    return mode
+
+def merge_folded(paths):
+    """Sum folded-stack files into one Counter."""
+    counts = collections.Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    counts[stack] += int(count)
+    return counts
+
+def hot_functions(counts, top=20):
+    """[(function, self samples, inclusive samples)] from folded stacks, by self samples."""
+    own, inclusive = collections.Counter(), collections.Counter()
+    for stack, count in counts.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return [(fn, n, inclusive[fn]) for fn, n in own.most_common(top)]
+
+def collect(cfg, top=None):
+    """
+    Parent side, after the workers have exited: merge the per-worker profiles into
+    profile.pstats (cprofile) or profile.folded (sample) in cfg.profile_dir, log a
+    hot-function summary and return the merged file's path (None when profiling is off
+    or no worker wrote a profile).
+    """
+    mode = profile_mode(cfg)
+    if mode == "off":
+        return None
+    top = top or cfg.profile_top
+    if mode == "cprofile":
+        paths = sorted(glob.glob(os.path.join(cfg.profile_dir, "worker-*.pstats")))
+        if not paths:
+            logger.warning("Profiling: no worker profiles found in %s", cfg.profile_dir)
+            return None
+        stats = pstats.Stats(*paths)
+        out = os.path.join(cfg.profile_dir, "profile.pstats")
+        stats.dump_stats(out)
+        buf = io.StringIO()
+        pstats.Stats(out, stream=buf).sort_stats("tottime").print_stats(top)
+        logger.info("Worker profile (%d workers, merged into %s):\n%s", len(paths), out, buf.getvalue())
+        return out
+
+    paths = sorted(glob.glob(os.path.join(cfg.profile_dir, "worker-*.folded")))
+    counts = merge_folded(paths)
+    if not counts:
+        logger.warning("Profiling: no worker samples found in %s", cfg.profile_dir)
+        return None
+    out = os.path.join(cfg.profile_dir, "profile.folded")
+    with open(out, "w") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+    total = sum(counts.values())
+    lines = [f"{'self%':>6} {'incl%':>6}  function"]
+    for fn, own, inclusive in hot_functions(counts, top):
+        lines.append(f"{100.0 * own / total:6.1f} {100.0 * inclusive / total:6.1f}  {fn}")
+    logger.info("Worker samples (%d workers, %d samples, merged into %s):\n%s",
+                len(paths), total, out, "\n".join(lines))
+    return out
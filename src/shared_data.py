@@ -0,0 +1,79 @@
+import logging, os, time
+import numpy as np
+from multiprocessing import shared_memory
+from src.subtree_cache import SubtreeCache
+from src.profiling import start_worker_profiler
+
+logger = logging.getLogger(__name__)
+
+# Per-process view of the training data, set once by init_worker (or set_worker_data)
+_worker = {}
+
+class SharedDataset:
+    """
+    Copies X and y into multiprocessing shared memory once, so Pool workers can
+    attach zero-copy NumPy views instead of receiving the arrays with every task.
+    Use as a context manager; the blocks are unlinked on exit.
+    """
+
+    def __init__(self, X, y):
+        self._blocks = []
+        self.spec = tuple(self._share(np.asarray(a, dtype=np.float64)) for a in (X, y))
+
+    def _share(self, arr):
+        # keep column-major inputs (e.g. the memory-mapped dataset cache) column-major
+        order = 'F' if arr.flags.f_contiguous and not arr.flags.c_contiguous else 'C'
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf, order=order)[...] = arr
+        self._blocks.append(shm)
+        return shm.name, arr.shape, arr.dtype.str, order
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _attach(name, shape, dtype, order='C'):
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, order=order)
+    arr.flags.writeable = False
+    return shm, arr
+
+def init_worker(spec, cfg):
+    """Pool initializer: attach the shared dataset and keep the config for every task."""
+    (shm_x, X), (shm_y, y) = (_attach(*s) for s in spec)
+    _worker['blocks'] = (shm_x, shm_y) # keep the mappings alive for the worker's lifetime
+    set_worker_data(X, y, cfg)
+    start_worker_profiler(cfg) # no-op unless profiling is enabled
+
+def set_worker_data(X, y, cfg):
+    """Install the dataset and config used by tasks running in this process."""
+    _worker['X'], _worker['y'], _worker['cfg'] = X, y, cfg
+    _worker.pop('subtree_cache', None) # cached subtree outputs belong to the old data
+
+def worker_subtree_cache():
+    """This process's SubtreeCache for the training data, or None when disabled in cfg."""
+    if 'subtree_cache' not in _worker:
+        budget = int(getattr(_worker['cfg'], 'subtree_cache_mb', 0) * 1024 * 1024)
+        _worker['subtree_cache'] = SubtreeCache(budget) if budget > 0 else None
+    return _worker['subtree_cache']
+
+def task_report(start):
+    """
+    What a pool task reports back alongside its result:
+    (worker pid, busy seconds since start, subtree cache hits, subtree cache misses).
+    """
+    cache = worker_subtree_cache()
+    hits, misses = cache.take_stats() if cache is not None else (0, 0)
+    return os.getpid(), time.perf_counter() - start, hits, misses
+
+def worker_data():
+    """Return (X, y, cfg) for the current process."""
+    return _worker['X'], _worker['y'], _worker['cfg']
@@ -0,0 +1,126 @@
+import bisect, logging, math, queue, time
+from contextlib import nullcontext
+from multiprocessing import Pool, cpu_count
+from src.population import initialise_population, genotype_key
+from src.evaluation import _eval_individual_wrapper, log_task_reports, fit_scaling
+from src.genetic_operators import breed_offspring
+from src.shared_data import SharedDataset, init_worker
+from src.fitness_store import open_fitness_store
+from src.bytecode import Program
+
+logger = logging.getLogger(__name__)
+
+def fitness_key(ind):
+    """Sort key that puts NaN fitness last, so bisect keeps a valid ordering."""
+    fit = ind['fitness']
+    return math.inf if fit is None or math.isnan(fit) else fit
+
+def run_steady_state(X, y, cfg):
+    """
+    Asynchronous steady-state GE. There is no generation barrier: a fixed number of
+    evaluations stay in flight on the pool, and whenever one finishes its individual is
+    inserted into the (sorted, size-capped) population and a replacement offspring of the
+    current top parents is bred and submitted straight away, so workers never idle
+    waiting for the slowest individual of a generation.
+    Runs cfg.generations * cfg.population_size evaluations, the same budget as run_ge,
+    and returns the best ten individuals in the same format.
+    """
+    workers = cpu_count()
+    inflight_limit = max(1, workers * cfg.steady_state_inflight)
+    budget = cfg.generations * cfg.population_size
+    store = open_fitness_store(X, y, cfg)
+
+    with (store if store is not None else nullcontext()), SharedDataset(X, y) as shared, \
+         Pool(processes=workers, initializer=init_worker, initargs=(shared.spec, cfg)) as pool:
+        fitness_cache, genome_to_expression_cache = {}, {}
+        seen = set()          # genotypes evaluated or in flight; offspring must be new
+        initial = initialise_population(cfg)[::-1]
+        population = []       # evaluated individuals, best first
+        done = queue.SimpleQueue()
+        reports, window_reports, new_entries = [], [], {}
+        submitted = completed = cached = inflight = 0
+        start = window_start = time.perf_counter()
+
+        def next_genotype():
+            if initial:
+                genotype = initial.pop()['genotype']
+                seen.add(genotype_key(genotype))
+                return genotype
+            return breed_offspring(population[:cfg.top_parents_count], seen, cfg)
+
+        def insert(ind):
+            bisect.insort(population, ind, key=fitness_key)
+            if len(population) > cfg.population_size:
+                population.pop() # steady-state replacement: drop the worst
+
+        def complete(ind):
+            nonlocal completed, window_reports, window_start, new_entries
+            insert(ind)
+            completed += 1
+            # progress once per population-size worth of offspring ("generation equivalent"),
+            # counting those answered from the cache so the windows do not stretch as it fills
+            if completed % cfg.population_size == 0:
+                best = population[0]
+                phenotype = best['phenotype']
+                if isinstance(phenotype, Program):
+                    phenotype = phenotype.to_tree(cfg.feature_names)
+                logger.info("Evals %d: Best Fitness %.4f Expr: %s", completed, best['fitness'], phenotype)
+                log_task_reports(window_reports, time.perf_counter() - window_start)
+                window_reports, window_start = [], time.perf_counter()
+                if store is not None:
+                    store.put_many(new_entries)
+                    new_entries = {}
+
+        def fill():
+            nonlocal submitted, inflight, cached
+            while submitted < budget and inflight < inflight_limit and (initial or population):
+                genotype = next_genotype()
+                submitted += 1
+                key = genotype_key(genotype)
+                if store is not None and key not in fitness_cache:
+                    for k, (fit, program) in store.get_many([key]).items():
+                        fitness_cache[k], genome_to_expression_cache[k] = fit, program
+                if key in fitness_cache: # answered without a worker
+                    cached += 1
+                    complete({'genotype': genotype, 'phenotype': genome_to_expression_cache[key],
+                              'fitness': fitness_cache[key]})
+                    continue
+                pool.apply_async(_eval_individual_wrapper, (genotype,),
+                                 callback=done.put, error_callback=done.put)
+                inflight += 1
+
+        fill()
+        while inflight:
+            item = done.get()
+            inflight -= 1
+            if isinstance(item, BaseException):
+                raise item
+            ind, report = item
+            reports.append(report)
+            window_reports.append(report)
+            key = genotype_key(ind['genotype'])
+            fitness_cache[key] = ind['fitness']
+            genome_to_expression_cache[key] = ind['phenotype']
+            new_entries[key] = (ind['fitness'], ind['phenotype'])
+            complete(ind)
+            fill()
+
+        if store is not None:
+            store.put_many(new_entries)
+        wall = time.perf_counter() - start
+        logger.info("Steady state: %d offspring (%d from the cache) in %.2fs (%.1f evals/s)", completed, cached,
+                    wall, (completed - cached) / wall if wall > 0 else 0.0)
+        log_task_reports(reports, wall)
+
+        best_ten = [dict(ind) for ind in population[0:10]]
+        for ind in best_ten:
+            if isinstance(ind['phenotype'], Program):
+                ind['phenotype'] = ind['phenotype'].to_tree(cfg.feature_names)
+        fit_scaling(best_ten, X, y, cfg)
+        logger.info("Best 10 Genomes:")
+        for i, genome in enumerate(best_ten):
+            logger.info("Rank %d: Fitness %.4f Expr: %s", i+1, genome['fitness'], genome['phenotype'])
+        logger.info("\n")
+        logger.info("Fitness cache size: %d", len(fitness_cache))
+        logger.info("Genome to expression cache size: %d", len(genome_to_expression_cache))
+        return best_ten
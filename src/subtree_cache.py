@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+class SubtreeCache:
+    """
+    LRU cache of subtree output vectors, keyed by the subtree's structural key
+    (its postfix opcode/operand bytes). Bounded by a memory budget in bytes.
+    Entries are only valid for the dataset they were computed on, so each worker
+    keeps one cache for the training data.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.nbytes = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._reported = (0, 0)
+
+    def get(self, key):
+        arr = self._entries.get(key)
+        if arr is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return arr
+
+    def put(self, key, arr):
+        if arr.nbytes > self.budget_bytes or key in self._entries:
+            return
+        self._entries[key] = arr
+        self.nbytes += arr.nbytes
+        while self.nbytes > self.budget_bytes: # evict least recently used
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def take_stats(self):
+        """(hits, misses) since the previous call; lets workers report per-task deltas."""
+        hits, misses = self.hits - self._reported[0], self.misses - self._reported[1]
+        self._reported = (self.hits, self.misses)
+        return hits, misses
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,120 @@
+import json, logging, os
+import numpy as np
+from src.evaluation import summarise_reports
+
+logger = logging.getLogger(__name__)
+
+def tree_shape(node):
+    """(node count, depth) of a phenotype tree, walked with an explicit stack (no recursion limit)."""
+    size = depth = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        size += 1
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in node.children)
+    return size, depth
+
+def distribution(values):
+    """Summary of a list of numbers: min, quartiles, max and mean."""
+    if not values:
+        return {}
+    q = np.percentile(values, [0, 25, 50, 75, 100])
+    return {"min": float(q[0]), "p25": float(q[1]), "median": float(q[2]), "p75": float(q[3]),
+            "max": float(q[4]), "mean": float(np.mean(values))}
+
+def _number(value):
+    """JSON-safe float (NaN/inf become null)."""
+    return float(value) if value is not None and np.isfinite(value) else None
+
+def generation_record(gen, population, times, eval_stats, breed_stats, caches):
+    """
+    One JSONL record for a generation.
+    times: {phase: seconds}; eval_stats / breed_stats: the stats dicts filled by
+    evaluate_population / reproduce; caches: {name: size}.
+    """
+    shapes = [tree_shape(ind["phenotype"]) for ind in population if hasattr(ind["phenotype"], "children")]
+    workers, sub_hits, sub_misses = summarise_reports(eval_stats.get("reports", []))
+    return {
+        "gen": gen,
+        "best_fitness": _number(population[0]["fitness"]) if population else None,
+        "time": {phase: round(seconds, 6) for phase, seconds in times.items()},
+        "cache": {
+            "fitness_hits": eval_stats.get("fitness_cache_hits", 0),
+            "fitness_misses": eval_stats.get("fitness_cache_misses", 0),
+            "expression_hits": eval_stats.get("expression_cache_hits", 0),
+            "expression_misses": eval_stats.get("expression_cache_misses", 0),
+            "store_hits": eval_stats.get("store_hits", 0),
+            "subtree_hits": sub_hits,
+            "subtree_misses": sub_misses,
+            "sizes": caches,
+        },
+        "evaluated": eval_stats.get("evaluated", 0),
+        "estimates": eval_stats.get("estimates", 0),
+        "duplicates": {
+            "children": breed_stats.get("duplicates", 0),
+            "retries": breed_stats.get("duplicate_retries", 0),
+            "unresolved": breed_stats.get("duplicates_unresolved", 0),
+        },
+        "tree": {
+            "size": distribution([s for s, _ in shapes]),
+            "depth": distribution([d for _, d in shapes]),
+        },
+        "workers": {str(pid): {"tasks": tasks, "busy_s": round(busy, 6)}
+                    for pid, (tasks, busy) in sorted(workers.items())},
+    }
+
+class TelemetryWriter:
+    """
+    Appends one JSON record per line to a metrics file, flushed every generation so a
+    crashed or interrupted run keeps everything up to its last generation.
+    A writer with path=None does nothing.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self._file = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._file = open(path, "a" if append else "w")
+
+    def write(self, record):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_telemetry(path):
+    """All records of a telemetry JSONL file, in order."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def generation_times(records):
+    """Total wall time per generation, as plot_generation_times expects."""
+    return [r["time"].get("total", sum(r["time"].values())) for r in records]
+
+def plot_telemetry(path):
+    """Plot a telemetry file with the existing visualisation helpers."""
+    from src.visualisation import plot_generation_times # matplotlib only when plotting
+    records = read_telemetry(path)
+    logger.info("Telemetry: %d generations from %s", len(records), path)
+    plot_generation_times(generation_times(records))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Plot a per-generation telemetry file")
+    parser.add_argument("path", nargs="?", default="cache/telemetry.jsonl")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    plot_telemetry(parser.parse_args().path)
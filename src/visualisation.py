@@ -1,6 +1,5 @@
 import matplotlib.pyplot as plt, logging
 import numpy as np
-from sklearn.metrics import mean_absolute_error
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +19,7 @@ def plot_results(y_test, y_pred, show_mae=True):
 
     # MAE
     if show_mae:
-        mae = mean_absolute_error(y_test, y_pred)
+        mae = np.mean(np.abs(y_test - y_pred)) # sklearn's mean_absolute_error, without importing sklearn
         logger.info(f"Mean Absolute Error: {mae:.2f}")
 
 
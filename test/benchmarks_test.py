@@ -0,0 +1,61 @@
+import json
+import os
+import pytest
+
+from benchmarks import suite
+from benchmarks.synthetic import FEATURES, synthetic_xy, write_csv
+from src.data_preprocessing import load_and_preprocess
+
+
+def test_synthetic_xy_shape_and_ranges():
+    X, y = synthetic_xy(5000, seed=1)
+    assert X.shape == (5000, len(FEATURES)) and y.shape == (5000,)
+    assert (y > 0).all()
+    X2, _ = synthetic_xy(5000, seed=1)
+    assert (X == X2).all() # deterministic per seed
+
+
+def test_synthetic_csv_loads_like_houses(tmp_path):
+    path = str(tmp_path / "houses.csv")
+    write_csv(path, 500, chunk_rows=128)
+    X_train, X_test, _, _ = load_and_preprocess(path)
+    assert X_train.shape[1] == len(FEATURES)
+    assert len(X_train) + len(X_test) > 400 # most rows survive the price filter
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    base = {"metrics": {"a_per_s": {"value": 100.0, "unit": "x/s", "better": "higher"},
+                        "b_s": {"value": 1.0, "unit": "s", "better": "lower"},
+                        "c_s": {"value": 1.0, "unit": "s", "better": "lower"}}}
+    now = {"metrics": {"a_per_s": {"value": 70.0, "unit": "x/s", "better": "higher"},
+                       "b_s": {"value": 1.1, "unit": "s", "better": "lower"},
+                       "c_s": {"value": 0.5, "unit": "s", "better": "lower"}}}
+    assert [r[0] for r in suite.compare(now, base, threshold=0.25)] == ["a_per_s"]
+
+
+def test_worker_scaling_is_limited_to_the_machines_cpus():
+    assert suite.scaling_workers([1, 2, 4], 2) == [1, 2]
+    assert suite.scaling_workers([2, 4], 1) == [1]
+    base = {"machine": {"cpus": 1},
+            "metrics": {"evaluate_population_1w_s": {"value": 1.0, "unit": "s", "better": "lower"},
+                        "evaluate_population_4w_s": {"value": 1.0, "unit": "s", "better": "lower"}}}
+    now = {"machine": {"cpus": 8},
+           "metrics": {"evaluate_population_1w_s": {"value": 2.0, "unit": "s", "better": "lower"},
+                       "evaluate_population_4w_s": {"value": 2.0, "unit": "s", "better": "lower"}}}
+    assert [r[0] for r in suite.compare(now, base)] == ["evaluate_population_1w_s"]
+
+
+def test_suite_tiny_profile_writes_json(tmp_path):
+    out = tmp_path / "bench.json"
+    assert suite.main(["--profile", "tiny", "--out", str(out), "--baseline", str(tmp_path / "none.json")]) == 0
+    results = json.loads(out.read_text())
+    names = set(results["metrics"])
+    assert {"eval_tree_per_row_us", "predict_per_dataset_us", "map_genotype_flat_per_s", "crossover_per_s",
+            "mutate_per_s", "evaluate_population_1w_s", "generations_pop50_per_s"} <= names
+    assert all(m["value"] > 0 for m in results["metrics"].values())
+
+
+@pytest.mark.skipif(not os.environ.get("GE_BENCHMARK"), reason="set GE_BENCHMARK=1 to check against the baseline")
+def test_no_regression_against_baseline():
+    threshold = os.environ.get("GE_BENCHMARK_THRESHOLD", "0.3") # the baseline is machine-specific
+    assert suite.main(["--profile", "quick", "--threshold", threshold]) == 0
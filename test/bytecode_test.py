@@ -0,0 +1,101 @@
+import pickle
+import random
+import numpy as np
+
+from src.bytecode import Program, tree_to_program, run_program, eval_programs, residual_program, program_outputs, CONST, VAR, ADD
+from src.evaluation import eval_tree, predict
+from src.population import GRAMMAR, derive_tree, initialise_individual, map_genotype
+from src.subtree_cache import SubtreeCache
+from src.telemetry import tree_shape
+
+FEATURES = [p[0] for p in GRAMMAR["var"] if not p[0].replace(".", "").isdigit()]
+
+
+def random_trees(n, seed=0):
+    random.seed(seed)
+    return [map_genotype(GRAMMAR, initialise_individual(GRAMMAR, "start", 5), "start", 5) for _ in range(n)]
+
+
+def test_tree_to_program_postfix_layout(node):
+    prog = tree_to_program(node("+", node("bedrooms"), node("2.0")), FEATURES)
+    assert prog.ops.tolist() == [VAR, CONST, ADD]
+    assert prog.args.tolist() == [0.0, 2.0, 0.0]
+    assert prog.depth == 2
+
+
+def test_program_round_trips_to_tree_infix():
+    for tree in random_trees(30):
+        prog = tree_to_program(tree, FEATURES)
+        assert prog.to_tree(FEATURES).to_infix() == tree.to_infix()
+
+
+def test_program_pickle_round_trip():
+    prog = tree_to_program(random_trees(1)[0], FEATURES)
+    clone = pickle.loads(pickle.dumps(prog))
+    assert clone == prog and hash(clone) == hash(prog)
+
+
+def test_run_program_matches_tree_predict():
+    X = np.random.default_rng(1).uniform(-5, 2000, size=(40, len(FEATURES)))
+    for tree in random_trees(30):
+        prog = tree_to_program(tree, FEATURES)
+        np.testing.assert_allclose(run_program(prog, X), predict(tree, X, FEATURES), rtol=1e-9)
+
+
+def test_structural_wrappers_match_scalar_eval_tree(node):
+    X = np.random.default_rng(3).uniform(1, 50, size=(5, len(FEATURES)))
+    for sym in ("(", ")", "start", "seq"):
+        tree = node(sym, node("bedrooms"), node("bathrooms"))
+        expected = [eval_tree(tree, dict(zip(FEATURES, row))) for row in X]
+        np.testing.assert_array_equal(run_program(tree_to_program(tree, FEATURES), X), expected)
+        np.testing.assert_array_equal(eval_programs([tree_to_program(tree, FEATURES)], X)[0], expected)
+
+
+def test_eval_programs_batch_matches_single(monkeypatch):
+    import src.bytecode as bytecode
+    monkeypatch.setattr(bytecode, "VM_BATCH_BYTES", 1) # force one program per chunk as well
+    X = np.random.default_rng(2).uniform(-5, 2000, size=(25, len(FEATURES)))
+    progs = [tree_to_program(t, FEATURES) for t in random_trees(40, seed=3)]
+    expected = np.array([run_program(p, X) for p in progs])
+    np.testing.assert_allclose(eval_programs(progs, X), expected, rtol=1e-9)
+    monkeypatch.undo()
+    np.testing.assert_allclose(eval_programs(progs, X), expected, rtol=1e-9)
+
+
+def test_map_genotype_flat_returns_program():
+    random.seed(4)
+    genotype = initialise_individual(GRAMMAR, "start", 5)
+    tree = map_genotype(GRAMMAR, genotype, "start", 5)
+    cache = {}
+    prog = map_genotype(GRAMMAR, genotype, "start", 5, expression_cache=cache, flat=True, feature_names=FEATURES)
+    assert isinstance(prog, Program)
+    assert prog.to_tree(FEATURES).to_infix() == tree.to_infix()
+    assert all(isinstance(v, Program) for v in cache.values())
+
+
+def test_residual_program_reads_shared_subtrees_from_parent_outputs(node):
+    X = np.random.default_rng(4).uniform(-5, 50, size=(40, len(FEATURES)))
+    for tree in random_trees(40, seed=8):
+        positions = {}
+        outputs = program_outputs(tree_to_program(tree, FEATURES, positions), X)
+        assert np.array_equal(np.broadcast_to(outputs[-1], (len(X),)), run_program(tree_to_program(tree, FEATURES), X), equal_nan=True)
+        child = node("+", tree, node("1.0"))
+        residual, slots = residual_program(child, FEATURES, positions)
+        assert len(residual) == 3 # the whole parent is one SLOT (or a plain leaf), then 1.0 and +
+        preds = run_program(residual, X, slots=[outputs[positions[id(n)]] for n in slots])
+        assert np.array_equal(preds, run_program(tree_to_program(child, FEATURES), X), equal_nan=True)
+
+
+def test_deep_phenotypes_compile_run_and_render_without_recursion():
+    grammar = {"start": [["expr"]], "expr": [["sin", "(", "expr", ")"], ["x"]]}
+    tree, _ = derive_tree(grammar, {"start": [0], "expr": [0] * 5000 + [1]}, "start", max_depth=10**6)
+    X = np.linspace(0.0, 1.0, 7).reshape(-1, 1)
+    expected = X[:, 0]
+    for _ in range(5000):
+        expected = np.sin(expected)
+    prog = tree_to_program(tree, ["x"])
+    np.testing.assert_allclose(run_program(prog, X), expected)
+    np.testing.assert_allclose(run_program(prog, X, SubtreeCache(1 << 20)), expected)
+    np.testing.assert_allclose(predict(tree, X, ["x"]), expected)
+    assert tree.to_infix() == "sin(" * 5000 + "x" + ")" * 5000
+    assert tree_shape(tree) == (5001, 5001)
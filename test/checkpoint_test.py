@@ -0,0 +1,69 @@
+import os
+import random
+import numpy as np
+import pytest
+
+from src.checkpoint import write_checkpoint, read_checkpoint
+from src.ge_main import run_ge
+
+
+@pytest.fixture
+def small_cfg(tmp_path, make_cfg):
+    def make(generations):
+        return make_cfg(generations=generations, population_size=30,
+                        checkpoint_path=str(tmp_path / "run.ckpt"), checkpoint_every=2)
+    return make
+
+
+def test_write_checkpoint_round_trip_and_atomic(tmp_path):
+    path = str(tmp_path / "sub" / "state.ckpt")
+    write_checkpoint(path, {"generation": 3, "payload": list(range(10))})
+    write_checkpoint(path, {"generation": 4, "payload": [1]}) # replaces in place
+    assert read_checkpoint(path) == {"generation": 4, "payload": [1]}
+    assert os.listdir(tmp_path / "sub") == ["state.ckpt"] # no temp files left behind
+
+
+def test_read_checkpoint_rejects_other_files(tmp_path):
+    path = tmp_path / "junk.bin"
+    path.write_bytes(b"not a checkpoint")
+    with pytest.raises(ValueError):
+        read_checkpoint(str(path))
+
+
+def test_resume_matches_uninterrupted_run(small_cfg):
+    rng = np.random.default_rng(0)
+    cfg = small_cfg(generations=4)
+    X = rng.uniform(1, 100, size=(60, len(cfg.feature_names)))
+    y = 3.0 * X[:, 2] + X[:, 0]
+
+    random.seed(7)
+    full = run_ge(X, y, cfg)
+
+    random.seed(7)
+    run_ge(X, y, small_cfg(generations=2)) # "interrupted" after generation 2
+    assert read_checkpoint(cfg.checkpoint_path)["generation"] == 2
+    random.seed(12345) # resuming must not depend on the caller's random state
+    resumed = run_ge(X, y, small_cfg(generations=4), resume=cfg.checkpoint_path)
+
+    assert [str(i["phenotype"]) for i in resumed] == [str(i["phenotype"]) for i in full]
+    assert [i["fitness"] for i in resumed] == pytest.approx([i["fitness"] for i in full], nan_ok=True)
+
+
+def test_resume_rejects_other_data(small_cfg):
+    cfg = small_cfg(generations=2)
+    X = np.random.default_rng(1).uniform(1, 100, size=(20, len(cfg.feature_names)))
+    random.seed(0)
+    run_ge(X, X[:, 0], cfg)
+    with pytest.raises(ValueError):
+        run_ge(X, X[:, 1], small_cfg(generations=4), resume=cfg.checkpoint_path)
+
+
+def test_resume_rejects_other_max_depth(small_cfg):
+    cfg = small_cfg(generations=2)
+    X = np.random.default_rng(2).uniform(1, 100, size=(20, len(cfg.feature_names)))
+    random.seed(0)
+    run_ge(X, X[:, 0], cfg)
+    deeper = small_cfg(generations=4)
+    deeper.max_depth = cfg.max_depth + 3 # cached genotypes would extend differently
+    with pytest.raises(ValueError):
+        run_ge(X, X[:, 0], deeper, resume=cfg.checkpoint_path)
@@ -0,0 +1,50 @@
+import pytest
+
+from src.islands import InlinePool
+from src.models import EvolutionConfig, TreeNode
+
+
+class CountingPool(InlinePool):
+    """An InlinePool that counts the tasks it is given."""
+    def __init__(self):
+        self.tasks = 0
+
+    def map(self, fn, args):
+        self.tasks += len(args)
+        return super().map(fn, args)
+
+
+@pytest.fixture
+def node():
+    """Builds expression trees: node("+", node("bedrooms"), node("2.0"))."""
+    def build(sym, *children):
+        return TreeNode(symbol=sym, children=list(children))
+    return build
+
+
+@pytest.fixture
+def make_cfg():
+    """
+    Fresh configs read from config.json with the persistent store, checkpoints and
+    telemetry switched off; keyword arguments override individual settings.
+    """
+    def make(**settings):
+        cfg = EvolutionConfig("config.json")
+        cfg.fitness_store_path, cfg.checkpoint_every, cfg.telemetry_path = None, 0, None
+        for name, value in settings.items():
+            if not hasattr(cfg, name):
+                raise AttributeError(f"EvolutionConfig has no setting {name!r}")
+            setattr(cfg, name, value)
+        return cfg
+    return make
+
+
+@pytest.fixture
+def cfg(make_cfg):
+    return make_cfg()
+
+
+@pytest.fixture
+def pool():
+    """A task-counting pool that runs everything in the test process."""
+    return CountingPool()
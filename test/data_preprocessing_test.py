@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from src.data_preprocessing import load_and_preprocess, FEATURES
+
+CSV = "data/houses.csv"
+
+
+def reference_split(csv_path):
+    """The original pandas + sklearn preprocessing."""
+    df = pd.read_csv(csv_path).dropna()
+    df = df[(df["price"] > 0) & (df["price"] <= 1_500_000)]
+    for name in ("city", "statezip", "country"):
+        df[f"{name}_num"] = df[name].astype("category").cat.codes
+    return train_test_split(df[FEATURES].values, df["price"].values, test_size=0.2, random_state=1)
+
+
+def assert_same(a, b):
+    assert all(np.array_equal(x, y) for x, y in zip(a, b))
+
+
+def test_chunked_load_matches_pandas_sklearn():
+    expected = reference_split(CSV)
+    assert_same(load_and_preprocess(CSV), expected)
+    assert_same(load_and_preprocess(CSV, chunk_rows=97), expected) # categories split across chunks
+
+
+def test_cache_round_trip_is_memory_mapped(tmp_path):
+    cache = str(tmp_path / "datasets")
+    first = load_and_preprocess(CSV, cache_dir=cache)
+    entries = [e for e in os.listdir(cache) if e != "index.json"]
+    assert len(entries) == 1
+    second = load_and_preprocess(CSV, cache_dir=cache)
+    assert isinstance(second[0], np.memmap) and second[0].flags.f_contiguous
+    assert_same(second, first)
+    assert_same(second, reference_split(CSV))
+
+
+def test_cache_key_follows_csv_contents_and_dtype(tmp_path):
+    cache = str(tmp_path / "datasets")
+    csv = tmp_path / "houses.csv"
+    lines = open(CSV).read().splitlines(keepends=True)
+    csv.write_text("".join(lines[:300]))
+    small = load_and_preprocess(str(csv), cache_dir=cache)
+    as_float32 = load_and_preprocess(str(csv), cache_dir=cache, dtype="float32")
+    assert as_float32[0].dtype == np.float32
+    csv.write_text("".join(lines[:400]))
+    os.utime(csv, ns=(0, 10**18)) # make sure the mtime differs too
+    larger = load_and_preprocess(str(csv), cache_dir=cache)
+    assert len(larger[0]) > len(small[0])
+    assert len([e for e in os.listdir(cache) if e != "index.json"]) == 3
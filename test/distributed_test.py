@@ -0,0 +1,172 @@
+import os, random, threading, time
+import multiprocessing as mp
+import numpy as np
+import pytest
+
+from src.distributed import ClusterPool, run_worker
+from src.evaluation import evaluate_population
+from src.islands import InlinePool
+from src.models import EvolutionConfig
+from src.population import GRAMMAR, initialise_individual
+from src.shared_data import set_worker_data
+
+AUTHKEY = b"test-cluster"
+
+
+def cluster_cfg(batch_size=4):
+    cfg = EvolutionConfig("config.json")
+    cfg.cluster_host, cfg.cluster_port = "127.0.0.1", 0 # any free port
+    cfg.cluster_batch_size = batch_size
+    return cfg
+
+
+def start_workers(pool, n, data=None):
+    procs = [mp.Process(target=run_worker, args=(pool.address, AUTHKEY, data, 5.0)) for _ in range(n)]
+    for p in procs:
+        p.start()
+    return procs
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def stop(pool, procs):
+    pool.close()
+    pool.join()
+    for p in procs:
+        p.join(5)
+        if p.is_alive():
+            p.terminate()
+
+
+def double(x):
+    return 2 * x
+
+
+def crash_once(args):
+    """Kills the worker running it the first time, before answering."""
+    marker, x = args
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return 2 * x
+    os._exit(1)
+
+
+def fail(x):
+    raise ValueError(f"bad task {x}")
+
+
+def test_cluster_evaluation_matches_a_local_pool():
+    cfg = cluster_cfg()
+    X = np.random.default_rng(1).uniform(1, 100, size=(50, len(cfg.feature_names)))
+    y = 3.0 * X[:, 2] + X[:, 0]
+    random.seed(2)
+    population = [{"genotype": initialise_individual(GRAMMAR, "start", cfg.max_depth), "phenotype": None, "fitness": None}
+                  for _ in range(30)]
+
+    set_worker_data(X, y, cfg) # reference: every task run in this process
+    local = evaluate_population(population, X, y, cfg, InlinePool(), {}, {})
+    with ClusterPool(X, y, cfg, authkey=AUTHKEY) as pool:
+        procs = start_workers(pool, 3)
+        wait_for(lambda: pool.workers == 3)
+        remote = evaluate_population(population, X, y, cfg, pool, {}, {})
+        stop(pool, procs)
+    assert [ind["fitness"] for ind in remote] == pytest.approx([ind["fitness"] for ind in local], nan_ok=True)
+    assert [str(ind["phenotype"]) for ind in remote] == [str(ind["phenotype"]) for ind in local]
+    assert all(p.exitcode == 0 for p in procs)
+
+
+def test_lost_worker_tasks_are_resubmitted(tmp_path, caplog):
+    caplog.set_level("INFO")
+    with ClusterPool(np.zeros((4, 1)), np.zeros(4), cluster_cfg(batch_size=2), authkey=AUTHKEY) as pool:
+        procs = start_workers(pool, 2)
+        marker = str(tmp_path / "crashed")
+        assert pool.map(crash_once, [(marker, x) for x in range(10)]) == [2 * x for x in range(10)]
+        wait_for(lambda: pool.workers == 1)
+        stop(pool, procs)
+    assert sorted(p.exitcode for p in procs) == [0, 1]
+    assert any("resubmitting 2 in-flight tasks" in r.message for r in caplog.records)
+
+
+def test_workers_can_join_mid_run_and_skip_known_data(caplog):
+    caplog.set_level("INFO")
+    X, y = np.arange(8.0).reshape(4, 2), np.arange(4.0)
+    with ClusterPool(X, y, cluster_cfg(), authkey=AUTHKEY) as pool:
+        out = {}
+        waiting = threading.Thread(target=lambda: out.setdefault("r", pool.map(double, range(9))))
+        waiting.start() # nobody is connected yet
+        time.sleep(0.3)
+        procs = start_workers(pool, 1, data=(X, y))
+        waiting.join(10)
+        assert out["r"] == [2 * x for x in range(9)]
+        stop(pool, procs)
+    assert any("data already loaded" in r.message for r in caplog.records)
+
+
+def test_task_errors_are_raised_by_map():
+    with ClusterPool(np.zeros((4, 1)), np.zeros(4), cluster_cfg(), authkey=AUTHKEY) as pool:
+        procs = start_workers(pool, 1)
+        with pytest.raises(RuntimeError, match="bad task"):
+            pool.map(fail, range(3))
+        assert pool.map(double, [1, 2]) == [2, 4] # the worker survives a failing task
+        stop(pool, procs)
+
+
+def test_cluster_refuses_to_start_without_an_authkey(monkeypatch):
+    monkeypatch.delenv("GE_CLUSTER_KEY", raising=False)
+    cfg = cluster_cfg()
+    assert cfg.cluster_authkey is None # no committed default
+    with pytest.raises(ValueError, match="authkey"):
+        ClusterPool(np.zeros((4, 1)), np.zeros(4), cfg)
+    with pytest.raises(ValueError, match="authkey"):
+        run_worker(("127.0.0.1", 1), None)
+    monkeypatch.setenv("GE_CLUSTER_KEY", "from-the-environment")
+    with ClusterPool(np.zeros((4, 1)), np.zeros(4), cfg) as pool:
+        assert pool.workers == 0
+
+
+def unsendable(x):
+    return lambda: x
+
+
+def sleepy(x):
+    time.sleep(1.0)
+    return x
+
+
+def test_unpicklable_tasks_and_results_fail_the_map_instead_of_hanging():
+    with ClusterPool(np.zeros((4, 1)), np.zeros(4), cluster_cfg(), authkey=AUTHKEY) as pool:
+        procs = start_workers(pool, 1)
+        with pytest.raises(Exception, match="pickle|lambda"):
+            pool.map(lambda x: x, range(3)) # the coordinator cannot send it
+        with pytest.raises(RuntimeError, match="unsendable"):
+            pool.map(unsendable, range(3)) # the worker cannot send the result back
+        assert pool.map(double, [1, 2]) == [2, 4]
+        stop(pool, procs)
+    assert procs[0].exitcode == 0
+
+
+def test_timed_out_workers_exit_cleanly():
+    cfg = cluster_cfg(batch_size=1)
+    cfg.cluster_task_timeout = 0.2
+    with ClusterPool(np.zeros((4, 1)), np.zeros(4), cfg, authkey=AUTHKEY) as pool:
+        procs = start_workers(pool, 3)
+        wait_for(lambda: pool.workers == 3)
+        with pytest.raises(RuntimeError, match="lost 3 workers"):
+            pool.map(sleepy, [1])
+        stop(pool, procs)
+    assert [p.exitcode for p in procs] == [0, 0, 0] # no BrokenPipeError once the reply is ready
+
+
+def test_distributed_runs_do_not_copy_the_data_to_shared_memory(monkeypatch):
+    import src.ge_main as ge_main
+    cfg = cluster_cfg()
+    cfg.distributed, cfg.cluster_authkey = True, AUTHKEY
+    monkeypatch.setattr(ge_main, "SharedDataset", lambda X, y: pytest.fail("no local worker attaches to it"))
+    with ge_main.evaluation_pool(np.zeros((4, 1)), np.zeros(4), cfg) as pool:
+        assert isinstance(pool, ClusterPool)
@@ -1,7 +1,14 @@
 import math
+import random
+import numpy as np
 import pytest
 
-from src.evaluation import eval_tree, TreeNode, safe_div
+import src.evaluation as evaluation
+from src.evaluation import (eval_tree, TreeNode, safe_div, feature_columns, predict, compile_phenotype,
+                            phenotype_source, evaluate_population)
+from src.islands import InlinePool
+from src.population import GRAMMAR, initialise_individual, map_genotype, genotype_key
+from src.shared_data import set_worker_data
 
 
 def node(sym, *children):
@@ -115,3 +122,328 @@ def test_eval_tree_start_wraps_expr():
 def test_eval_tree_start_empty():
     t = node("start")
     assert eval_tree(t, {}) == pytest.approx(0.0)
+
+
+# whole-dataset evaluation
+
+FEATURES = ["x", "y"]
+
+
+def scalar_preds(tree, X):
+    return np.array([eval_tree(tree, {k: row[i] for i, k in enumerate(FEATURES)}) for row in X])
+
+
+def test_predict_matches_scalar_ops():
+    X = np.array([[-2.0, 0.0], [0.0, 3.0], [1.5, -4.0], [80.0, 1e-12]])
+    for sym in ["sin", "cos", "exp", "log", "inv"]:
+        t = node(sym, node("x"))
+        np.testing.assert_allclose(predict(t, X, FEATURES), scalar_preds(t, X))
+    for sym in ["+", "-", "*", "/"]:
+        t = node(sym, node("x"), node("y"))
+        np.testing.assert_allclose(predict(t, X, FEATURES), scalar_preds(t, X))
+
+
+def test_predict_broadcasts_constant_tree():
+    X = np.zeros((4, 2))
+    t = node("start", node("*", node("2"), node("3")))
+    np.testing.assert_allclose(predict(t, X, FEATURES), [6.0] * 4)
+
+
+def test_predict_matches_scalar_on_random_phenotypes():
+    rng = np.random.default_rng(0)
+    names = [p[0] for p in GRAMMAR["var"] if not p[0].replace(".", "").isdigit()]
+    X = rng.uniform(-10, 3000, size=(50, len(names)))
+    random.seed(0)
+    for _ in range(50):
+        tree = map_genotype(GRAMMAR, initialise_individual(GRAMMAR, "start", 5), "start", 5)
+        expected = np.array([eval_tree(tree, {k: row[i] for i, k in enumerate(names)}) for row in X])
+        np.testing.assert_allclose(predict(tree, X, names), expected, rtol=1e-9)
+
+
+# compiled phenotypes
+
+
+def test_compile_phenotype_matches_interpreter():
+    X = np.array([[-2.0, 0.0], [0.0, 3.0], [1.5, -4.0]])
+    cols = feature_columns(X, FEATURES)
+    t = node("start", node("+", node("inv", node("x")), node("/", node("y"), node("7.0"))))
+    np.testing.assert_allclose(compile_phenotype(t)(cols), scalar_preds(t, X))
+
+
+def test_compile_phenotype_source_is_straight_line():
+    src = phenotype_source(node("*", node("exp", node("x")), node("2")))
+    assert "def _expr(c):" in src
+    assert "_pre['exp']" in src
+    assert src.count("\n") == 5  # def, x lookup, exp, mul, return
+
+
+def test_compile_phenotype_cached_by_infix():
+    a = compile_phenotype(node("+", node("x"), node("1.0")))
+    b = compile_phenotype(node("+", node("x"), node("1.0")))
+    assert a is b
+
+
+def test_compile_phenotype_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(evaluation, "CODE_CACHE_SIZE", 3)
+    monkeypatch.setattr(evaluation, "_code_cache", evaluation.OrderedDict())
+    for i in range(5):
+        compile_phenotype(node("+", node("x"), node(str(float(i)))))
+    assert len(evaluation._code_cache) == 3
+
+
+def test_compile_phenotype_unknown_symbol_logs(caplog):
+    caplog.set_level("ERROR")
+    fn = compile_phenotype(node("+", node("x"), node("not_a_feature")))
+    out = fn({"x": np.array([1.0, 2.0])})
+    np.testing.assert_allclose(out, [1.0, 2.0])
+    assert any("Failed to parse tree" in r.message for r in caplog.records)
+
+
+# population evaluation with parent-side caches
+
+
+def test_evaluate_population_caches_and_skips_hits(cfg, pool):
+    names = cfg.feature_names
+    X = np.random.default_rng(5).uniform(0, 100, size=(20, len(names)))
+    y = X[:, 2] * 3.0
+    random.seed(6)
+    genotypes = [initialise_individual(GRAMMAR, "start", cfg.max_depth) for _ in range(5)]
+    population = [{"genotype": g, "phenotype": None, "fitness": None} for g in genotypes + genotypes[:2]]
+
+    set_worker_data(X, y, cfg) # the pool runs tasks in this process
+    fit_cache, expr_cache = {}, {}
+    first = evaluate_population(population, X, y, cfg, pool, fit_cache, expr_cache)
+    assert pool.tasks == 5 # duplicates in one generation are evaluated once
+    assert len(fit_cache) == len(expr_cache) >= 5
+    assert first[5]["fitness"] == first[0]["fitness"]
+    for ind in first:
+        assert isinstance(ind["phenotype"], TreeNode)
+        expected = np.sqrt(np.mean((predict(ind["phenotype"], X, names) - y) ** 2))
+        assert ind["fitness"] == pytest.approx(expected)
+
+    second = evaluate_population(first, X, y, cfg, pool, fit_cache, expr_cache)
+    assert pool.tasks == 5 # everything answered from the caches
+    assert [i["fitness"] for i in second] == [i["fitness"] for i in first]
+    assert genotype_key(second[0]["genotype"]) in fit_cache
+
+
+def test_evaluate_population_uses_persistent_store(tmp_path, cfg, pool):
+    from src.fitness_store import FitnessStore
+    X = np.random.default_rng(7).uniform(0, 100, size=(20, len(cfg.feature_names)))
+    y = X[:, 0]
+    set_worker_data(X, y, cfg)
+    random.seed(8)
+    population = [{"genotype": initialise_individual(GRAMMAR, "start", cfg.max_depth), "phenotype": None, "fitness": None}
+                  for _ in range(4)]
+
+    with FitnessStore(str(tmp_path / "fit.sqlite"), "d", "g") as store:
+        first = evaluate_population(population, X, y, cfg, InlinePool(), {}, {}, store)
+    with FitnessStore(str(tmp_path / "fit.sqlite"), "d", "g") as store: # fresh run: empty in-memory caches, warm store
+        second = evaluate_population(population, X, y, cfg, pool, {}, {}, store)
+    assert pool.tasks == 0
+    assert [i["fitness"] for i in second] == [i["fitness"] for i in first]
+    assert [str(i["phenotype"]) for i in second] == [str(i["phenotype"]) for i in first]
+
+
+def test_evaluate_population_dedups_equivalent_behaviour(caplog, monkeypatch, make_cfg, pool):
+    monkeypatch.setattr(evaluation, "cpu_count", lambda: 1) # one fingerprinting batch
+    cfg = make_cfg(dedup_probe_rows=8)
+    X = np.random.default_rng(9).uniform(1, 100, size=(30, len(cfg.feature_names)))
+    y = X[:, 0] + X[:, 1]
+    set_worker_data(X, y, cfg)
+
+    def binary(op, a, b):  # expr -> expr <op> expr, both sides var
+        return {"start": [0], "expr": [0, 3, 3], "op": [op], "pre_op": [], "var": [a, b]}
+
+    population = [{"genotype": g, "phenotype": None, "fitness": None}
+                  for g in (binary(0, 0, 1), binary(0, 1, 0), binary(2, 0, 1))] # x+y, y+x, x*y
+    fingerprints = {}
+    caplog.set_level("INFO")
+    results = evaluate_population(population, X, y, cfg, pool, {}, {}, fingerprint_cache=fingerprints)
+
+    assert pool.tasks == 1 + 2 # one batch mapped, two distinct behaviours scored
+    assert len(fingerprints) == 2
+    assert results[0]["fitness"] == results[1]["fitness"] == pytest.approx(0.0)
+    assert str(results[1]["phenotype"]) == "(bathrooms + bedrooms)"
+    assert any("Behaviour dedup: 1/3 reused" in r.message for r in caplog.records)
+
+
+def test_reused_fitness_is_cached_but_not_persisted(tmp_path, make_cfg):
+    from src.fitness_store import FitnessStore
+    cfg = make_cfg(dedup_probe_rows=8)
+    X = np.random.default_rng(9).uniform(1, 100, size=(30, len(cfg.feature_names)))
+    y = X[:, 0] + X[:, 1]
+    set_worker_data(X, y, cfg)
+    xy = {"start": [0], "expr": [0, 3, 3], "op": [0], "pre_op": [], "var": [0, 1]}
+    yx = {"start": [0], "expr": [0, 3, 3], "op": [0], "pre_op": [], "var": [1, 0]}
+    population = [{"genotype": g, "phenotype": None, "fitness": None} for g in (xy, yx)]
+
+    fit_cache = {}
+    with FitnessStore(str(tmp_path / "fit.sqlite"), "d", "g") as store:
+        results = evaluate_population(population, X, y, cfg, InlinePool(), fit_cache, {}, store,
+                                      fingerprint_cache={})
+        stored = store.get_many([genotype_key(xy), genotype_key(yx)])
+    assert "reused" not in results[0] and results[1]["reused"]
+    assert genotype_key(yx) in fit_cache # served again within this run
+    assert set(stored) == {genotype_key(xy)} # only the genotype that was actually scored
+
+
+def racing_setup(cfg, n_rows=400, n_ind=40, seed=10):
+    cfg.population_size = n_ind
+    cfg.racing_subsets, cfg.racing_keep = [0.05, 0.25], 0.5
+    X = np.random.default_rng(seed).uniform(1, 100, size=(n_rows, len(cfg.feature_names)))
+    y = X[:, 2] * 3.0 + X[:, 0]
+    set_worker_data(X, y, cfg)
+    random.seed(seed)
+    population = [{"genotype": initialise_individual(GRAMMAR, "start", cfg.max_depth), "phenotype": None, "fitness": None}
+                  for _ in range(n_ind)]
+    return cfg, X, y, population
+
+
+def test_race_rows_are_nested_and_shared():
+    from src.evaluation import race_rows
+    small, large = race_rows(100, 10, 3), race_rows(100, 40, 3)
+    assert set(small) <= set(large) and len(set(large)) == 40
+    assert list(race_rows(100, 10, 3)) == list(small)
+
+
+def test_evaluate_population_racing_marks_estimates_and_skips_cache(caplog, cfg):
+    cfg, X, y, population = racing_setup(cfg)
+    fit_cache = {}
+    caplog.set_level("INFO")
+    results = evaluate_population(population, X, y, cfg, InlinePool(), fit_cache, {})
+    assert any("Racing:" in r.message for r in caplog.records)
+    estimates = [ind for ind in results if ind.get("estimate")]
+    exact = [ind for ind in results if not ind.get("estimate")]
+    assert estimates and len(exact) >= cfg.top_parents_count
+    for ind in exact:
+        full = np.sqrt(np.mean((predict(ind["phenotype"], X, cfg.feature_names) - y) ** 2))
+        assert ind["fitness"] == pytest.approx(full, nan_ok=True)
+        assert genotype_key(ind["genotype"]) in fit_cache
+    assert all(genotype_key(ind["genotype"]) not in fit_cache for ind in estimates)
+
+
+def test_exact_top_rescores_estimates(cfg, pool):
+    from src.evaluation import exact_top
+    cfg, X, y, population = racing_setup(cfg, seed=11)
+    results = evaluate_population(population, X, y, cfg, pool, {}, {})
+    for ind in results: # pretend everything was eliminated early
+        ind["estimate"] = True
+    top = exact_top(results, 10, X, y, cfg, pool, {}, {})
+    for ind in top[:10]:
+        assert not ind.get("estimate")
+        full = np.sqrt(np.mean((predict(ind["phenotype"], X, cfg.feature_names) - y) ** 2))
+        assert ind["fitness"] == pytest.approx(full, nan_ok=True)
+
+
+def test_bounded_rmse_exact_below_cutoff_and_rejects_above():
+    from src.bytecode import tree_to_program
+    from src.evaluation import bounded_rmse
+    names = ["a", "b"]
+    X = np.random.default_rng(12).uniform(0, 10, size=(1000, 2))
+    y = X[:, 0]
+    good = tree_to_program(TreeNode("a"), names)
+    bad = tree_to_program(TreeNode("b"), names)
+    full_bad = np.sqrt(np.mean((X[:, 1] - y) ** 2))
+
+    assert bounded_rmse(good, X, y, 1.0, 100) == (pytest.approx(0.0), True)
+    assert bounded_rmse(bad, X, y, None, 100) == (pytest.approx(full_bad), True)
+    fit, exact = bounded_rmse(bad, X, y, 0.5, 100)
+    assert not exact and 0.5 < fit <= full_bad + 1e-12
+    assert bounded_rmse(bad, X, y, 100.0, 100) == (pytest.approx(full_bad), True)
+
+
+def test_evaluate_population_early_abort_flags_rejected(make_cfg):
+    cfg = make_cfg(early_abort_chunk_rows=16)
+    X = np.random.default_rng(13).uniform(1, 100, size=(200, len(cfg.feature_names)))
+    y = X[:, 2] * 3.0
+    set_worker_data(X, y, cfg)
+    random.seed(14)
+    population = [{"genotype": initialise_individual(GRAMMAR, "start", cfg.max_depth), "phenotype": None, "fitness": None}
+                  for _ in range(30)]
+    exact = evaluate_population(population, X, y, cfg, InlinePool(), {}, {})
+    cutoff = float(np.nanmedian([ind["fitness"] for ind in exact]))
+
+    fit_cache = {}
+    bounded = evaluate_population(population, X, y, cfg, InlinePool(), fit_cache, {}, cutoff=cutoff)
+    assert any(ind.get("estimate") for ind in bounded)
+    for full, ind in zip(exact, bounded):
+        if ind.get("estimate"):
+            assert cutoff < ind["fitness"] <= full["fitness"] + 1e-9
+            assert genotype_key(ind["genotype"]) not in fit_cache
+        else:
+            assert ind["fitness"] == pytest.approx(full["fitness"], nan_ok=True)
+
+
+def test_incremental_evaluation_matches_scoring_from_scratch(make_cfg, pool):
+    from src.genetic_operators import breed_batch
+    cfg = make_cfg(population_size=60, dedup_probe_rows=0)
+    X = np.random.default_rng(11).uniform(1, 100, size=(50, len(cfg.feature_names)))
+    y = X[:, 2] * 2.0 + X[:, 0]
+    set_worker_data(X, y, cfg)
+    random.seed(12)
+    population = [{"genotype": genotype_key(initialise_individual(GRAMMAR, "start", cfg.max_depth)),
+                   "phenotype": None, "fitness": None} for _ in range(cfg.population_size)]
+    population = evaluate_population(population, X, y, cfg, InlinePool(), {}, {})
+    population.sort(key=lambda ind: ind["fitness"])
+    offspring = breed_batch(population, cfg, np.random.default_rng(13))[cfg.elitism_count:]
+    assert all("parent" in ind for ind in offspring)
+
+    cfg.incremental = True
+    incremental = evaluate_population(offspring, X, y, cfg, pool, {}, {})
+    assert pool.tasks <= cfg.top_parents_count # one task per family
+    cfg.incremental = False
+    fresh = evaluate_population(offspring, X, y, cfg, InlinePool(), {}, {})
+    for a, b in zip(incremental, fresh):
+        assert a["genotype"] == b["genotype"]
+        assert str(a["phenotype"]) == str(b["phenotype"])
+        assert a["fitness"] == b["fitness"] or (np.isnan(a["fitness"]) and np.isnan(b["fitness"]))
+
+
+def test_linear_scaling_matches_least_squares_and_bounds_chunks():
+    from src.bytecode import tree_to_program
+    from src.evaluation import SquaredError, bounded_rmse, linear_scaling, scaled_rmse
+    names = ["a", "b"]
+    X = np.random.default_rng(14).uniform(0, 10, size=(1000, 2))
+    y = 5e5 + 145.0 * X[:, 0] + np.random.default_rng(15).normal(0, 3, size=1000)
+    a, b = linear_scaling(X[:, 0], y)
+    assert (a, b) == pytest.approx(tuple(np.polyfit(X[:, 0], y, 1)))
+    assert scaled_rmse(X[:, 0], y) == pytest.approx(np.sqrt(np.mean((a * X[:, 0] + b - y) ** 2)))
+    assert scaled_rmse(2.0, y) == pytest.approx(np.std(y)) # constant: the best fit is the mean
+
+    errors, bounds = SquaredError(scaled=True), []
+    for lo in range(0, 1000, 100): # merged chunk moments give the one-pass fit, never shrinking on the way
+        bounds.append(errors.add(X[lo:lo + 100, 0], y[lo:lo + 100]))
+    assert bounds == sorted(bounds)
+    assert np.sqrt(bounds[-1] / 1000) == pytest.approx(scaled_rmse(X[:, 0], y))
+    assert errors.coefficients() == pytest.approx((a, b))
+
+    good = tree_to_program(TreeNode("a"), names)
+    fit, exact = bounded_rmse(good, X, y, 10.0, 100, scaled=True)
+    assert exact and fit == pytest.approx(scaled_rmse(X[:, 0], y))
+    fit, exact = bounded_rmse(tree_to_program(TreeNode("b"), names), X, y, 10.0, 100, scaled=True)
+    assert not exact and 10.0 < fit <= scaled_rmse(X[:, 1], y) + 1e-9
+
+
+def test_linear_scaling_coefficients_follow_the_top_individuals(make_cfg):
+    from src.evaluation import exact_top, evaluate_top_individuals_on_test, predict_individual
+    cfg = make_cfg(linear_scaling=True)
+    names = cfg.feature_names
+    X = np.random.default_rng(16).uniform(1, 100, size=(60, len(names)))
+    y = 2900.0 * X[:, 2] + 7.0
+    set_worker_data(X, y, cfg)
+    population = [{"genotype": {"start": [0], "expr": [3], "op": [], "pre_op": [], "var": [v]},
+                   "phenotype": None, "fitness": None} for v in (2, 0)] # sqft_living, bedrooms
+    fit_cache, expr_cache = {}, {}
+    first = evaluate_population(population, X, y, cfg, InlinePool(), fit_cache, expr_cache)
+    assert first[0]["fitness"] == pytest.approx(0.0, abs=1e-6 * np.std(y)) # up to cancellation in the moments
+    assert first[0]["scaling"] == pytest.approx((2900.0, 7.0))
+
+    # cache hits come back without coefficients; exact_top refits them for the top
+    hits = evaluate_population(population, X, y, cfg, InlinePool(), fit_cache, expr_cache)
+    assert all("scaling" not in ind for ind in hits)
+    top = exact_top(hits, 2, X, y, cfg, InlinePool(), fit_cache, expr_cache)
+    assert top[0]["scaling"] == pytest.approx((2900.0, 7.0))
+    np.testing.assert_allclose(predict_individual(top[0], X, names), y)
+    results = evaluate_top_individuals_on_test(top, X, y, cfg)
+    assert results[0]["test_rmse"] == pytest.approx(0.0, abs=1e-6 * np.std(y))
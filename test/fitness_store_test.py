@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.bytecode import Program, CONST
+from src.fitness_store import FitnessStore, dataset_fingerprint, grammar_fingerprint
+
+
+def key(i):
+    return (("expr", (i,)), ("start", (0,)))
+
+
+def prog(v):
+    return Program([CONST], [float(v)])
+
+
+def test_store_round_trip_across_connections(tmp_path):
+    path = str(tmp_path / "fit.sqlite")
+    with FitnessStore(path, "d", "g") as store:
+        store.put_many({key(1): (1.5, prog(1)), key(2): (float("nan"), prog(2))})
+    with FitnessStore(path, "d", "g") as store:
+        found = store.get_many([key(1), key(2), key(3)])
+        assert found[key(1)] == (1.5, prog(1))
+        assert np.isnan(found[key(2)][0])
+        assert key(3) not in found
+        assert (store.hits, store.misses) == (2, 1)
+
+
+def test_store_is_scoped_by_fingerprints(tmp_path):
+    path = str(tmp_path / "fit.sqlite")
+    with FitnessStore(path, "d1", "g") as store:
+        store.put_many({key(1): (1.0, prog(1))})
+    with FitnessStore(path, "d2", "g") as store:
+        assert store.get_many([key(1)]) == {}
+    with FitnessStore(path, "d1", "g", fitness="scaled_rmse") as store:
+        assert store.get_many([key(1)]) == {}
+    with FitnessStore(path, "d1", "g", max_depth=5) as store:
+        store.put_many({key(2): (2.0, prog(2))})
+    with FitnessStore(path, "d1", "g", max_depth=10) as store: # genotypes extend differently
+        assert store.get_many([key(2)]) == {}
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    with FitnessStore(str(tmp_path / "fit.sqlite"), "d", "g", max_entries=2) as store:
+        store.put_many({key(1): (1.0, prog(1))})
+        store.put_many({key(2): (2.0, prog(2))})
+        store.get_many([key(1)]) # key(2) is now the least recently used
+        store.put_many({key(3): (3.0, prog(3))})
+        assert len(store) == 2
+        assert set(store.get_many([key(1), key(2), key(3)])) == {key(1), key(3)}
+
+
+def test_fingerprints_change_with_inputs():
+    X, y = np.zeros((3, 2)), np.zeros(3)
+    assert dataset_fingerprint(X, y) == dataset_fingerprint(X.copy(), y.copy())
+    assert dataset_fingerprint(X, y) != dataset_fingerprint(X + 1, y)
+    assert grammar_fingerprint("g", ["a", "b"]) != grammar_fingerprint("g", ["b", "a"])
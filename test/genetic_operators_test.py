@@ -0,0 +1,104 @@
+import pickle
+import random
+
+import numpy as np
+
+from src.genetic_operators import crossover_genotypes, mutate_genotype, reproduce, breed_batch, lineage_parent
+from src.islands import InlinePool
+from src.models import EvolutionConfig, Genotype
+from src.population import GRAMMAR, initialise_individual, initialise_population, genotype_key
+
+
+def random_genotype(seed):
+    random.seed(seed)
+    return genotype_key(initialise_individual(GRAMMAR, "start", 5))
+
+
+def test_genotype_dict_round_trip_and_key():
+    d = {"expr": [0, 3, 3], "op": [1], "var": [2, 4]}
+    g = Genotype.from_dict(d)
+    assert g.to_dict() == d
+    assert g["var"] == [2, 4] and g.get("missing", []) == []
+    assert g.locate(3) == ("op", 0)
+    assert genotype_key(d, grammar=d) == g and hash(genotype_key(d, grammar=d)) == hash(g)
+
+
+def test_genotype_pickle_is_compact_and_equal():
+    g = random_genotype(0)
+    clone = pickle.loads(pickle.dumps(g))
+    assert clone == g and hash(clone) == hash(g)
+    assert len(pickle.dumps(g)) < len(pickle.dumps(g.to_dict())) + 100
+
+
+def test_mutate_packed_genotype_copy_on_write():
+    g = random_genotype(1)
+    before = g.to_dict()
+    child = mutate_genotype(g, max_depth=5, mutations=3, rng=random.Random(2))
+    assert g.to_dict() == before # parent untouched
+    assert child.offsets is g.offsets and child.nts is g.nts
+    diffs = sum(a != b for a, b in zip(child.buf, g.buf))
+    assert 1 <= diffs <= 3
+    for nt, genes in child.items():
+        assert all(0 <= i < len(GRAMMAR[nt]) for i in genes)
+
+
+def test_crossover_packed_matches_dict_crossover():
+    p1, p2 = random_genotype(3), random_genotype(4)
+    c1, c2 = crossover_genotypes(p1, p2, rng=random.Random(5))
+    d1, d2 = crossover_genotypes(p1.to_dict(), p2.to_dict(), rng=random.Random(5))
+    assert c1.to_dict() == d1 and c2.to_dict() == d2
+
+
+def test_crossover_dict_genotypes_unchanged():
+    c1, c2 = crossover_genotypes({"a": [1], "b": [2]}, {"a": [3], "b": [4]}, rng=random.Random(0))
+    assert sorted([c1["a"], c2["a"]]) == [[1], [3]]
+    assert isinstance(c1, dict)
+
+
+def breeding_population(n, seed=0):
+    random.seed(seed)
+    cfg = EvolutionConfig("config.json")
+    cfg.population_size = n
+    population = initialise_population(cfg)
+    for i, ind in enumerate(population):
+        ind["fitness"] = float(i)
+    return population, cfg
+
+
+def test_breed_batch_sizes_elites_and_valid_genes():
+    population, cfg = breeding_population(200)
+    new_pop = breed_batch(population, cfg, np.random.default_rng(0))
+    assert len(new_pop) == cfg.population_size
+    for elite, kept in zip(population[:cfg.elitism_count], new_pop):
+        assert kept["genotype"] == elite["genotype"] and kept["fitness"] == elite["fitness"]
+    for ind in new_pop[cfg.elitism_count:]:
+        assert ind["fitness"] is None and isinstance(ind["genotype"], Genotype)
+        for nt, genes in ind["genotype"].items():
+            assert all(0 <= i < len(GRAMMAR[nt]) for i in genes)
+
+
+def test_breed_batch_uniqueness_matches_reproduce():
+    population, cfg = breeding_population(500)
+    serial = len({ind["genotype"] for ind in reproduce(population, cfg, rng=random.Random(0))})
+    batch = len({ind["genotype"] for ind in breed_batch(population, cfg, np.random.default_rng(0))})
+    assert batch >= 0.95 * serial
+
+
+def test_breed_batch_sharded_over_pool():
+    population, cfg = breeding_population(101)
+    new_pop = breed_batch(population, cfg, np.random.default_rng(1), pool=InlinePool(), shards=4)
+    assert len(new_pop) == 101
+    assert all(isinstance(ind["genotype"], Genotype) for ind in new_pop)
+
+
+def test_offspring_record_the_parent_they_share_most_genes_with():
+    population, cfg = breeding_population(200)
+    parents = {ind["genotype"] for ind in population[:cfg.top_parents_count]}
+    for new_pop in (breed_batch(population, cfg, np.random.default_rng(2)),
+                    reproduce(population, cfg, rng=random.Random(2))):
+        children = new_pop[cfg.elitism_count:]
+        assert all(ind["parent"] in parents for ind in children)
+    p1 = Genotype.from_dict({"expr": [0, 3, 3], "op": [1], "var": [2, 4]})
+    p2 = Genotype.from_dict({"expr": [3], "op": [2], "var": [5]})
+    child = Genotype.from_dict({"expr": [0, 3, 3], "op": [2], "var": [2, 4]})
+    assert lineage_parent(child, p1, p2) is p1 and lineage_parent(p2, p1, p2) is p2
@@ -0,0 +1,59 @@
+import random
+import numpy as np
+import pytest
+
+from src.ge_main import run_ge
+from src.islands import island_configs, migrate, run_islands
+
+
+@pytest.fixture
+def small_cfg(make_cfg):
+    def make(count, population_size=20):
+        return make_cfg(generations=3, population_size=population_size, island_count=count,
+                        migration_interval=1, migrants=2)
+    return make
+
+
+def test_island_configs_split_population(small_cfg):
+    sizes = [c.population_size for c in island_configs(small_cfg(3, population_size=10))]
+    assert sizes == [4, 3, 3]
+
+
+def test_migrate_skips_genotypes_the_receiver_already_has():
+    def ind(genes, fitness):
+        return {"genotype": {"start": [0], "expr": genes}, "phenotype": None, "fitness": fitness}
+    a = [ind([1], 1.0), ind([2], 2.0), ind([3], 3.0)]
+    b = [ind([1], 1.0), ind([4], 4.0), ind([5], 5.0)]
+    new_a, new_b = migrate([a, b], migrants=2)
+    assert [i["genotype"]["expr"] for i in new_b] == [[1], [2], [4]] # [1] is already there
+    assert [i["genotype"]["expr"] for i in new_a] == [[1], [2], [4]] # b's [1] is a duplicate too
+
+
+def test_run_islands_returns_best_ten_sorted(small_cfg):
+    cfg = small_cfg(2)
+    rng = np.random.default_rng(0)
+    X = rng.uniform(1, 100, size=(40, len(cfg.feature_names)))
+    y = 3.0 * X[:, 2]
+    random.seed(1)
+    best = run_islands(X, y, cfg)
+    assert len(best) == 10
+    fits = [ind["fitness"] for ind in best]
+    assert fits == sorted(fits)
+    assert all(set(ind) == {"genotype", "phenotype", "fitness"} for ind in best)
+
+
+def test_run_islands_keeps_linear_scaling_coefficients(small_cfg):
+    cfg = small_cfg(2)
+    cfg.linear_scaling = True
+    X = np.random.default_rng(2).uniform(1, 100, size=(40, len(cfg.feature_names)))
+    y = 3.0 * X[:, 2] + 5.0
+    random.seed(3)
+    best = run_islands(X, y, cfg)
+    assert all(len(ind["scaling"]) == 2 for ind in best)
+
+
+def test_islands_refuse_checkpoints(small_cfg):
+    cfg = small_cfg(2)
+    cfg.checkpoint_every = 5
+    with pytest.raises(ValueError, match="checkpoint.every"):
+        run_ge(np.zeros((4, len(cfg.feature_names))), np.zeros(4), cfg)
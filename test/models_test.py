@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+from src.models import Grammar, CompiledGrammar
+
+BNF = "<start> ::= <expr>\n<expr> ::= <expr> \"+\" <expr> | <var>\n<var> ::= \"x\" | \"y\"\n"
+
+
+def test_grammar_load_writes_and_reuses_cache(tmp_path):
+    bnf, cache = tmp_path / "g.bnf", tmp_path / "g.pickle"
+    bnf.write_text(BNF)
+    first = Grammar.load(str(bnf), str(cache))
+    assert cache.exists()
+    assert dict(first.items()) == dict(Grammar(str(bnf)).items())
+
+    cache_mtime = cache.stat().st_mtime_ns
+    second = Grammar.load(str(bnf), str(cache))
+    assert dict(second.items()) == dict(first.items())
+    assert cache.stat().st_mtime_ns == cache_mtime # served from the cache, not rewritten
+
+
+def test_grammar_load_reparses_edited_bnf(tmp_path):
+    bnf, cache = tmp_path / "g.bnf", tmp_path / "g.pickle"
+    bnf.write_text(BNF)
+    Grammar.load(str(bnf), str(cache))
+    bnf.write_text(BNF.replace('"x" | "y"', '"x" | "y" | "z"'))
+    os.utime(bnf, ns=(0, 10**18))
+    assert Grammar.load(str(bnf), str(cache))["var"] == [["x"], ["y"], ["z"]]
+
+
+def test_grammar_load_survives_touch_and_corrupt_cache(tmp_path):
+    bnf, cache = tmp_path / "g.bnf", tmp_path / "g.pickle"
+    bnf.write_text(BNF)
+    Grammar.load(str(bnf), str(cache))
+    os.utime(bnf, ns=(0, 10**18)) # same contents, new mtime: the hash check keeps the cache
+    assert Grammar.load(str(bnf), str(cache))["var"] == [["x"], ["y"]]
+    cache.write_bytes(b"garbage")
+    assert Grammar.load(str(bnf), str(cache))["var"] == [["x"], ["y"]]
+
+
+def test_compiled_grammar_tables(tmp_path):
+    bnf = tmp_path / "g.bnf"
+    bnf.write_text(BNF)
+    tables = Grammar(str(bnf)).compiled
+    assert tables.nts == ("expr", "start", "var")
+    expr, start, var = range(3)
+    assert tables.productions[expr] == ((expr, ~0, expr), (var,))
+    assert [tables.symbol(c) for c in tables.productions[expr][0]] == ["expr", "+", "expr"]
+    assert tables.arity == ((2, 1), (1,), (0, 0))
+    assert tables.nonrecursive == ((1,), (0,), (0, 1))
+
+
+def test_compiled_grammar_is_cached_and_rebuilt_after_edit(tmp_path):
+    bnf, cache = tmp_path / "g.bnf", tmp_path / "g.pickle"
+    bnf.write_text(BNF)
+    Grammar.load(str(bnf), str(cache))
+    grammar = Grammar.load(str(bnf), str(cache)) # tables come from the cache
+    assert isinstance(grammar._compiled, CompiledGrammar)
+    grammar["var"] = [["x"], ["y"], ["z"]]
+    assert grammar.compiled.n_prods[2] == 3
+
+
+def test_main_import_does_not_load_plotting_or_sklearn():
+    code = "import sys, main; print(any(m.split('.')[0] in ('matplotlib', 'sklearn', 'pandas') for m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
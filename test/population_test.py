@@ -1,5 +1,7 @@
+import random
 import src.population as population
-from src.population import map_genotype, TreeNode, initialise_population, GRAMMAR
+from src.population import map_genotype, map_genotypes, derive_tree, Derivation, TreeNode, initialise_population, initialise_individual, genotype_key, GRAMMAR
+from src.models import Genotype
 
 
 def assert_tree_equal(a: TreeNode, b: TreeNode):
@@ -91,18 +93,19 @@ def test_map_genotype_extends_genotype_when_gene_list_exhausted(monkeypatch):
         "var": [0],
     }
 
-    def fake_choose_production(grammar_, nt, depth, max_depth):
-        assert nt == "expr"
+    def fake_choose_production_id(tables, i, depth, max_depth):
+        assert tables.nts[i] == "expr"
         return 1
 
-    monkeypatch.setattr(population, "choose_production", fake_choose_production)
+    monkeypatch.setattr(population, "choose_production_id", fake_choose_production_id)
 
-    tree = map_genotype(grammar, genotype, start_nt="start", max_depth=5)
+    tree, extended = map_genotype(grammar, genotype, start_nt="start", max_depth=5, return_genotype=True)
     expected = TreeNode("x")
     assert_tree_equal(tree, expected)
 
-    assert len(genotype["expr"]) == 1
-    assert genotype["expr"][0] == 1
+    assert genotype["expr"] == [] # the caller's dict is left alone
+    assert extended["expr"] == [1]
+    assert extended["var"] == [0]
 
 class DummyCfg:
     def __init__(self, population_size, max_depth):
@@ -118,7 +121,7 @@ def test_initialise_population_shapes():
         assert "genotype" in ind
         assert "phenotype" in ind and ind["phenotype"] is None
         assert "fitness" in ind and ind["fitness"] is None
-        assert isinstance(ind["genotype"], dict)
+        assert isinstance(ind["genotype"], Genotype)
 
 
 def test_initialise_population_size_and_keys():
@@ -141,7 +144,8 @@ def test_initialise_population_genotype_structure():
 
     for ind in pop:
         g = ind["genotype"]
-        assert isinstance(g, dict)
+        assert isinstance(g, Genotype)
+        assert set(g.keys()) == set(GRAMMAR.keys())
         # all gene lists should be lists of intgers
         for _, genes in g.items():
             assert isinstance(genes, list)
@@ -158,4 +162,91 @@ def test_initialise_population_basic_randomness():
     genos1 = [ind["genotype"] for ind in pop1]
     genos2 = [ind["genotype"] for ind in pop2]
 
-    assert genos1 != genos2
\ No newline at end of file
+    assert genos1 != genos2
+
+def test_map_genotype_packed_extension_returns_new_genotype(monkeypatch):
+    grammar = {
+        "start": [["expr"]],
+        "expr": [["var"], ["var"]],
+        "var": [["x"], ["y"]],
+    }
+    genotype = Genotype.from_dict({"start": [0], "expr": [], "var": [1]})
+    monkeypatch.setattr(population, "choose_production_id", lambda *args: 0)
+
+    tree, extended = map_genotype(grammar, genotype, start_nt="start", max_depth=5, return_genotype=True)
+    assert_tree_equal(tree, TreeNode("y"))
+    assert genotype["expr"] == [] # the input is never modified
+    assert extended["expr"] == [0]
+
+    _, same = map_genotype(grammar, extended, start_nt="start", max_depth=5, return_genotype=True)
+    assert same is extended
+
+
+def test_choose_production_avoids_recursion_at_max_depth():
+    expr = GRAMMAR.compiled.nt_id["expr"]
+    picks = {population.choose_production(GRAMMAR, "expr", 5, 5) for _ in range(50)}
+    assert picks <= set(GRAMMAR.compiled.nonrecursive[expr])
+    assert all(not population.is_recursive("expr", GRAMMAR["expr"][i]) for i in picks)
+
+
+def test_derive_tree_reports_extensions_without_side_effects(monkeypatch):
+    grammar = {
+        "start": [["expr"]],
+        "expr": [["(", "expr", ")"], ["var"]],
+        "var": [["x"], ["y"]],
+    }
+    genotype = {"start": [0], "expr": [0], "var": []}
+    monkeypatch.setattr(population, "choose_production_id", lambda tables, i, depth, max_depth: 1)
+
+    tree, extensions = derive_tree(grammar, genotype, "start", max_depth=5)
+    assert_tree_equal(tree, TreeNode("seq", [TreeNode("("), TreeNode("y"), TreeNode(")")]))
+    assert extensions == {"expr": [1], "var": [1]}
+    assert genotype == {"start": [0], "expr": [0], "var": []}
+
+
+def test_derive_tree_has_no_recursion_limit():
+    grammar = {"start": [["expr"]], "expr": [["sin", "(", "expr", ")"], ["x"]]}
+    tree, extensions = derive_tree(grammar, {"start": [0], "expr": [0] * 5000 + [1]}, "start", max_depth=10**6)
+    assert not extensions
+    depth = 0
+    while tree.children:
+        assert tree.symbol == "sin"
+        tree, depth = tree.children[0], depth + 1
+    assert (tree.symbol, depth) == ("x", 5000)
+
+
+def test_map_genotypes_batch_is_order_independent():
+    genotypes = [genotype_key({nt: genes[:1] for nt, genes in initialise_individual(GRAMMAR, "start", 6).items()})
+                 for _ in range(20)]
+    forward = map_genotypes(GRAMMAR, genotypes, "start", 6)
+    backward = map_genotypes(GRAMMAR, genotypes[::-1], "start", 6)[::-1]
+    assert [(str(t), g) for t, g in forward] == [(str(t), g) for t, g in backward]
+    for (tree, extended), genotype in zip(forward, genotypes):
+        assert str(map_genotype(GRAMMAR, extended, "start", 6)) == str(tree) # extension is complete
+
+
+def test_derive_tree_from_a_parent_base_matches_fresh_derivation():
+    from src.genetic_operators import mutate_genotype, crossover_genotypes
+    random.seed(3)
+    for _ in range(50):
+        parent = genotype_key(initialise_individual(GRAMMAR, "start", 6))
+        other = genotype_key(initialise_individual(GRAMMAR, "start", 6))
+        base = Derivation(GRAMMAR, parent, "start", 6)
+        for child in (mutate_genotype(base.genotype, 6, 2), crossover_genotypes(base.genotype, other)[0]):
+            random.seed(len(child))
+            fresh_tree, fresh_ext = derive_tree(GRAMMAR, child, "start", 6)
+            random.seed(len(child))
+            tree, ext = derive_tree(GRAMMAR, child, "start", 6, base=base)
+            assert str(tree) == str(fresh_tree) and ext == fresh_ext
+
+
+def test_derive_tree_shares_unchanged_subtrees_with_its_base():
+    grammar = {"start": [["expr"]], "expr": [["expr", "op", "expr"], ["var"]],
+               "op": [["+"], ["*"]], "var": [["x"], ["y"]]}
+    parent = {"start": [0], "expr": [0, 0, 1, 1, 1], "op": [0, 0], "var": [0, 1, 0]}
+    base = Derivation(grammar, parent, "start", 5)
+    child = dict(parent, var=[0, 1, 1]) # only the last leaf differs
+    tree, _ = derive_tree(grammar, child, "start", 5, base=base)
+    assert str(tree) == "((x + y) + y)"
+    assert tree.children[0] is base.tree.children[0] # the untouched left subtree is the parent's
+    assert tree is not base.tree
@@ -0,0 +1,55 @@
+import pstats
+import random
+import threading
+import time
+import numpy as np
+import pytest
+
+from src import profiling
+from src.ge_main import run_ge
+
+
+def test_profile_mode_env_overrides_config(monkeypatch, cfg):
+    monkeypatch.delenv(profiling.ENV_VAR, raising=False)
+    assert profiling.profile_mode(cfg) == "off"
+    monkeypatch.setenv(profiling.ENV_VAR, "sample")
+    assert profiling.profile_mode(cfg) == "sample"
+    monkeypatch.setenv(profiling.ENV_VAR, "bogus")
+    with pytest.raises(ValueError):
+        profiling.profile_mode(cfg)
+
+
+def test_merge_folded_and_hot_functions(tmp_path):
+    (tmp_path / "a.folded").write_text("main;eval;add 3\nmain;eval 1\n")
+    (tmp_path / "b.folded").write_text("main;eval;add 2\n")
+    counts = profiling.merge_folded([str(tmp_path / "a.folded"), str(tmp_path / "b.folded")])
+    assert counts == {"main;eval;add": 5, "main;eval": 1}
+    assert profiling.hot_functions(counts) == [("add", 5, 5), ("eval", 1, 6)]
+
+
+def test_stack_sampler_records_src_frames():
+    from src.evaluation import rmse
+    sampler = profiling.StackSampler(0.001, target=threading.get_ident())
+    sampler.start()
+    x = np.random.default_rng(0).random(200_000)
+    deadline = time.perf_counter() + 0.3
+    while time.perf_counter() < deadline:
+        rmse(x, x[::-1])
+    sampler.stop()
+    sampler.join()
+    assert any("rmse (evaluation.py" in stack for stack in sampler.counts)
+
+
+@pytest.mark.parametrize("mode, merged", [("cprofile", "profile.pstats"), ("sample", "profile.folded")])
+def test_run_ge_merges_worker_profiles(tmp_path, monkeypatch, make_cfg, mode, merged):
+    monkeypatch.delenv(profiling.ENV_VAR, raising=False)
+    cfg = make_cfg(generations=2, population_size=30,
+                   profile_mode=mode, profile_dir=str(tmp_path / "profile"), profile_interval_ms=1)
+    X = np.random.default_rng(0).uniform(1, 100, size=(20_000, len(cfg.feature_names)))
+    random.seed(0)
+    run_ge(X, X[:, 0], cfg)
+    out = tmp_path / "profile" / merged
+    assert out.exists()
+    if mode == "cprofile":
+        functions = {fn for _, _, fn in pstats.Stats(str(out)).stats}
+        assert "_eval_individual_wrapper" in functions or "_map_fingerprint_wrapper" in functions
@@ -0,0 +1,33 @@
+import numpy as np
+from multiprocessing import Pool
+
+from src.shared_data import SharedDataset, init_worker, worker_data
+
+
+def _column_sums(_):
+    X, y, cfg = worker_data()
+    return X.sum(axis=0).tolist(), float(y.sum()), cfg, X.flags.writeable
+
+
+def test_shared_dataset_visible_in_pool_workers():
+    X = np.arange(12, dtype=float).reshape(4, 3)
+    y = np.array([1.0, 2.0, 3.0, 4.0])
+    with SharedDataset(X, y) as shared, Pool(2, initializer=init_worker, initargs=(shared.spec, "cfg")) as pool:
+        results = pool.map(_column_sums, range(4))
+    for sums, ysum, cfg, writeable in results:
+        assert sums == X.sum(axis=0).tolist()
+        assert ysum == 10.0
+        assert cfg == "cfg"
+        assert not writeable
+
+
+def _first_column(_):
+    X, _, _ = worker_data()
+    return X[:, 0].tolist(), X.flags.f_contiguous
+
+
+def test_shared_dataset_keeps_column_major_layout():
+    X = np.asfortranarray(np.arange(12, dtype=float).reshape(4, 3))
+    with SharedDataset(X, X[:, 0]) as shared, Pool(1, initializer=init_worker, initargs=(shared.spec, "cfg")) as pool:
+        column, fortran = pool.map(_first_column, [0])[0]
+    assert column == [0.0, 3.0, 6.0, 9.0] and fortran
@@ -0,0 +1,47 @@
+import random
+import numpy as np
+import pytest
+
+from src.ge_main import run_ge
+from src.models import TreeNode
+from src.steady_state import fitness_key, run_steady_state
+
+
+def test_fitness_key_orders_nan_last():
+    inds = [{"fitness": float("nan")}, {"fitness": 2.0}, {"fitness": 1.0}]
+    assert [i["fitness"] for i in sorted(inds, key=fitness_key)][:2] == [1.0, 2.0]
+
+
+def test_run_steady_state_returns_best_ten(caplog, make_cfg):
+    cfg = make_cfg(generations=3, population_size=20)
+    X = np.random.default_rng(0).uniform(1, 100, size=(40, len(cfg.feature_names)))
+    y = 2.0 * X[:, 2]
+    random.seed(1)
+    caplog.set_level("INFO")
+    best = run_steady_state(X, y, cfg)
+    assert len(best) == 10
+    fits = [ind["fitness"] for ind in best]
+    assert fits == sorted(fits)
+    assert all(isinstance(ind["phenotype"], TreeNode) for ind in best)
+    assert any("Worker utilization" in r.message for r in caplog.records)
+
+
+def test_steady_state_refuses_telemetry_and_profiling(monkeypatch, make_cfg):
+    monkeypatch.delenv("GE_PROFILE", raising=False)
+    cfg = make_cfg(mode="steady_state", telemetry_path="metrics.jsonl", profile_mode="sample")
+    with pytest.raises(ValueError, match="telemetry.path, profiling.mode"):
+        run_ge(np.zeros((4, len(cfg.feature_names))), np.zeros(4), cfg)
+
+
+def test_cache_answered_offspring_count_towards_progress(tmp_path, caplog, make_cfg):
+    cfg = make_cfg(generations=3, population_size=20, fitness_store_path=str(tmp_path / "fit.sqlite"))
+    X = np.random.default_rng(0).uniform(1, 100, size=(40, len(cfg.feature_names)))
+    y = 2.0 * X[:, 2]
+    for _ in range(2): # the second run finds the initial population in the store
+        random.seed(1)
+        caplog.clear()
+        caplog.set_level("INFO")
+        run_steady_state(X, y, cfg)
+    messages = [r.message for r in caplog.records]
+    assert [m.split(":")[0] for m in messages if m.startswith("Evals ")] == ["Evals 20", "Evals 40", "Evals 60"]
+    assert any(m.startswith("Steady state: 60 offspring") and "(0 from the cache)" not in m for m in messages)
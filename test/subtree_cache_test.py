@@ -0,0 +1,51 @@
+import random
+import numpy as np
+
+from src.bytecode import run_program, subtree_starts, tree_to_program
+from src.population import GRAMMAR, initialise_individual, map_genotype
+from src.subtree_cache import SubtreeCache
+
+FEATURES = [p[0] for p in GRAMMAR["var"] if not p[0].replace(".", "").isdigit()]
+
+
+def test_subtree_cache_lru_budget():
+    cache = SubtreeCache(budget_bytes=3 * 80)
+    for k in "abc":
+        cache.put(k, np.zeros(10))
+    cache.get("a") # b becomes least recently used
+    cache.put("d", np.zeros(10))
+    assert len(cache) == 3 and cache.nbytes == 240
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.take_stats() == (2, 1)
+    assert cache.take_stats() == (0, 0)
+
+
+def test_subtree_starts_marks_subtree_spans(node):
+    prog = tree_to_program(node("+", node("exp", node("bedrooms")), node("2.0")), FEATURES)
+    # postfix: bedrooms exp 2.0 +
+    assert subtree_starts(prog.ops) == [0, 0, 2, 0]
+
+
+def test_run_program_with_cache_matches_and_reuses_shared_subtrees(node):
+    X = np.random.default_rng(0).uniform(1, 500, size=(30, len(FEATURES)))
+    shared = node("*", node("sqft_living"), node("log", node("bedrooms")))
+    a = tree_to_program(node("+", shared, node("view")), FEATURES)
+    b = tree_to_program(node("-", node("floors"), shared), FEATURES)
+    cache = SubtreeCache(1 << 20)
+    np.testing.assert_allclose(run_program(a, X, cache), run_program(a, X))
+    cache.take_stats()
+    np.testing.assert_allclose(run_program(b, X, cache), run_program(b, X))
+    assert cache.take_stats() == (1, 1) # root misses, the shared product hits
+
+
+def test_run_program_with_cache_matches_on_random_programs():
+    X = np.random.default_rng(1).uniform(-5, 2000, size=(40, len(FEATURES)))
+    random.seed(2)
+    cache = SubtreeCache(1 << 20)
+    for _ in range(2): # second pass is served from the cache
+        random.seed(2)
+        for _ in range(40):
+            tree = map_genotype(GRAMMAR, initialise_individual(GRAMMAR, "start", 5), "start", 5)
+            prog = tree_to_program(tree, FEATURES)
+            np.testing.assert_allclose(run_program(prog, X, cache), run_program(prog, X), rtol=1e-12)
+    assert cache.hits > 0
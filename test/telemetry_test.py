@@ -0,0 +1,55 @@
+import random
+import numpy as np
+import pytest
+
+from src import telemetry
+from src.genetic_operators import unique_child
+from src.ge_main import run_ge
+from src.models import Genotype
+
+
+def test_tree_shape_counts_nodes_and_depth(node):
+    tree = node("+", node("bedrooms"), node("sin", node("*", node("floors"), node("1.0"))))
+    assert telemetry.tree_shape(tree) == (6, 4)
+    assert telemetry.tree_shape(node("view")) == (1, 1)
+
+
+def test_distribution_summary():
+    d = telemetry.distribution([1, 2, 3, 4, 5])
+    assert (d["min"], d["median"], d["max"], d["mean"]) == (1.0, 3.0, 5.0, 3.0)
+    assert telemetry.distribution([]) == {}
+
+
+def test_unique_child_counts_retries(cfg):
+    g = Genotype.from_dict({"expr": [3], "var": [0]})
+    seen, stats = {g}, {}
+    unique_child(g, seen, cfg, rng=random.Random(0), stats=stats)
+    assert stats["duplicates"] == 1 and stats["duplicate_retries"] >= 1
+    assert stats["duplicates_unresolved"] == 0
+
+
+def test_run_ge_writes_one_record_per_generation(tmp_path, monkeypatch, make_cfg):
+    cfg = make_cfg(generations=3, population_size=30, telemetry_path=str(tmp_path / "metrics.jsonl"),
+                   incremental=False, dedup_probe_rows=0) # one pool task per evaluated genotype, as counted below
+    X = np.random.default_rng(0).uniform(1, 100, size=(50, len(cfg.feature_names)))
+    random.seed(1)
+    run_ge(X, 2.0 * X[:, 1], cfg)
+
+    records = telemetry.read_telemetry(cfg.telemetry_path)
+    assert [r["gen"] for r in records] == [0, 1, 2]
+    for r in records:
+        assert set(r["time"]) == {"evaluation", "sort", "reproduction", "checkpoint", "total"}
+        assert r["time"]["total"] >= r["time"]["evaluation"]
+        assert r["cache"]["fitness_hits"] + r["cache"]["fitness_misses"] == cfg.population_size
+        assert r["cache"]["expression_hits"] + r["cache"]["expression_misses"] == cfg.population_size
+        assert r["cache"]["sizes"]["fitness"] == r["cache"]["sizes"]["expression"]
+        assert r["tree"]["size"]["min"] >= 1 and r["tree"]["depth"]["max"] >= 1
+        assert sum(w["tasks"] for w in r["workers"].values()) >= r["evaluated"]
+        assert set(r["duplicates"]) == {"children", "retries", "unresolved"}
+    assert records[1]["cache"]["fitness_hits"] >= 1 # elites carried over
+    assert records[1]["cache"]["expression_hits"] >= records[1]["cache"]["fitness_hits"]
+
+    plotted = []
+    monkeypatch.setattr("src.visualisation.plot_generation_times", plotted.append)
+    telemetry.plot_telemetry(cfg.telemetry_path)
+    assert plotted == [[r["time"]["total"] for r in records]]
@@ -0,0 +1,44 @@
+import logging, multiprocessing, argparse
+from src.data_preprocessing import load_and_preprocess
+from src.distributed import run_worker, cluster_authkey, parse_address
+from src.models import EvolutionConfig
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluation worker for a distributed GE run (distributed.enabled in config.json)")
+    parser.add_argument("address", nargs="?", default=None, metavar="HOST:PORT",
+                        help="coordinator address (default: distributed.host/port in config.json)")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes to start on this machine (default: one per CPU)")
+    parser.add_argument("--data", default=None, metavar="CSV",
+                        help="preprocess this CSV locally instead of receiving the training data")
+    parser.add_argument("--retry", type=float, default=60.0,
+                        help="seconds to keep trying to reach the coordinator")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    cfg = EvolutionConfig("config.json")
+    address = parse_address(args.address) if args.address else (cfg.cluster_host, cfg.cluster_port)
+    authkey = cluster_authkey(cfg)
+
+    data = None
+    if args.data: # loaded once here; forked processes share it
+        X_train, _, y_train, _ = load_and_preprocess(
+            args.data, cache_dir=cfg.dataset_cache_dir, chunk_rows=cfg.dataset_chunk_rows, dtype=cfg.dataset_dtype)
+        data = (X_train, y_train)
+
+    logger.info("Starting %d workers for %s:%d", args.processes, *address)
+    procs = [multiprocessing.Process(target=run_worker, args=(address, authkey, data, args.retry), name=f"worker-{i}")
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()